@@ -12,8 +12,6 @@ import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 
-import aiosqlite
-
 # Додаємо поточну директорію до шляху
 PROJECT_ROOT = Path(__file__).parent
 sys.path.insert(0, str(PROJECT_ROOT))
@@ -32,9 +30,18 @@ if not BOT_TOKEN:
 from src.bot.handlers import (
     start, registration, market, chat, logistics,
     admin_tools, subscriptions, offers_handlers, calculators,
-    advertisement_handler
+    advertisement_handler, alerts, paged_lists
 )
 
+from src.bot.db import db_connection, close_pool
+from src.bot.services.ban_list import ban_list
+from src.bot.services.standing_queries import standing_queries
+from src.bot.services.price_stats import price_stats_reconciler
+from src.bot.services.send_queue import send_queue
+from src.bot.services.chat_relay import album_buffer, chat_writer
+from src.bot.services.broadcasts import broadcast_runner
+from src.bot.services.ad_index import ad_index
+
 # Імпорт синхронізації
 from src.bot.middlewares.sync import SyncEventProcessor
 from src.bot.middlewares.ban_check import BanCheckMiddleware
@@ -63,17 +70,7 @@ async def _acquire_bot_lock(owner: str | None = None) -> bool:
     owner = owner or _LOCK_OWNER
     now = datetime.utcnow()
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS bot_runtime_locks (
-                lock_name TEXT PRIMARY KEY,
-                owner TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-            """
-        )
-
+    async with db_connection() as db:
         cur = await db.execute(
             "SELECT owner, updated_at FROM bot_runtime_locks WHERE lock_name = ?",
             (_LOCK_NAME,),
@@ -105,7 +102,7 @@ async def _acquire_bot_lock(owner: str | None = None) -> bool:
 
 async def _refresh_bot_lock(owner: str | None = None) -> None:
     owner = owner or _LOCK_OWNER
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             "UPDATE bot_runtime_locks SET updated_at = ? WHERE lock_name = ? AND owner = ?",
             (datetime.utcnow().isoformat(), _LOCK_NAME, owner),
@@ -115,7 +112,7 @@ async def _refresh_bot_lock(owner: str | None = None) -> None:
 
 async def _release_bot_lock(owner: str | None = None) -> None:
     owner = owner or _LOCK_OWNER
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             "DELETE FROM bot_runtime_locks WHERE lock_name = ? AND owner = ?",
             (_LOCK_NAME, owner),
@@ -134,8 +131,8 @@ def run_migration():
     try:
         from src.database.migrate import migrate
         logger.info("🔧 Запуск міграції бази даних...")
-        migrate(DB_FILE, verbose=False)
-        logger.info("✅ Міграція завершена успішно")
+        version = migrate(DB_FILE, verbose=False)
+        logger.info(f"✅ Схема БД актуальна (версія {version})")
     except ImportError:
         logger.warning("⚠️  Модуль міграції не знайдено, пропускаємо")
     except Exception as e:
@@ -181,11 +178,13 @@ async def main():
     dp.include_router(registration.router)
     dp.include_router(calculators.router)
     dp.include_router(market.router)
+    dp.include_router(alerts.router)
     dp.include_router(offers_handlers.router)
     dp.include_router(chat.router)
     dp.include_router(logistics.router)
     dp.include_router(admin_tools.router)
     dp.include_router(advertisement_handler.router)
+    dp.include_router(paged_lists.router)
     dp.include_router(start.router)       # ← ОСТАННІЙ (catch-all всередині)
 
     logger.info("🌾 Agro Marketplace Bot запущено!")
@@ -197,6 +196,20 @@ async def main():
         # Видалення webhook (якщо був)
         await bot.delete_webhook(drop_pending_updates=True)
 
+        # Множина забанених для BanCheckMiddleware
+        await ban_list.start()
+        # Індекс активної реклами для AdvertisementMiddleware
+        await ad_index.start()
+
+        # Черга вихідних повідомлень — до сервісів, що в неї пишуть
+        await send_queue.start(bot)
+        await chat_writer.start()
+
+        # Цінові сповіщення і збережені пошуки
+        await standing_queries.start()
+        await price_stats_reconciler.start()
+        await broadcast_runner.start()
+
         # Запуск sync processor
         await sync_processor.start()
 
@@ -217,6 +230,14 @@ async def main():
 
         # Зупинка sync processor
         await sync_processor.stop()
+        await broadcast_runner.stop()
+        await price_stats_reconciler.stop()
+        await standing_queries.stop()
+        await ban_list.stop()
+        album_buffer.flush_all()
+        await send_queue.stop()
+        await chat_writer.stop()
+        await close_pool()
         await bot.session.close()
 
 
@@ -6,8 +6,11 @@ import asyncio
 import logging
 import multiprocessing as mp
 import os
+import shutil
 import signal
+import socket
 import sys
+import tempfile
 import time
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -90,6 +93,20 @@ def run_bot_server():
         sys.exit(1)
 
 
+def setup_sync_wakeup() -> str | None:
+    """Шлях до Unix-сокета, яким веб-панель будить бота (SYNC_WAKEUP_SOCKET).
+
+    Директорію створює лаунчер, сокет у ній — бот при старті.
+    Повертає директорію для прибирання або None.
+    """
+    if os.getenv("SYNC_WAKEUP_SOCKET") or not hasattr(socket, "AF_UNIX"):
+        return None
+    wakeup_dir = tempfile.mkdtemp(prefix="agro_sync_")
+    os.environ["SYNC_WAKEUP_SOCKET"] = os.path.join(wakeup_dir, "wakeup.sock")
+    logger.info("🔔 Sync wakeup socket: %s", os.environ["SYNC_WAKEUP_SOCKET"])
+    return wakeup_dir
+
+
 def start_web() -> mp.Process:
     proc = mp.Process(target=run_web_server, name="WebServer", daemon=False)
     proc.start()
@@ -113,6 +130,8 @@ def main() -> int:
     logger.info("🌾 Agro Marketplace - Unified Launcher")
     logger.info("=" * 60)
 
+    wakeup_dir = setup_sync_wakeup()
+
     web_process = start_web()
     time.sleep(2)
     bot_process = start_bot()
@@ -133,6 +152,8 @@ def main() -> int:
     finally:
         terminate_process(bot_process, "Bot")
         terminate_process(web_process, "Web")
+        if wakeup_dir:
+            shutil.rmtree(wakeup_dir, ignore_errors=True)
 
     return 0
 
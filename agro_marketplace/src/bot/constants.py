@@ -70,6 +70,7 @@ CONTACT_REQUEST_REJECTED = "rejected"
 # Broadcast statuses
 BROADCAST_STATUS_DRAFT = "draft"
 BROADCAST_STATUS_SENDING = "sending"
+BROADCAST_STATUS_PAUSED = "paused"
 BROADCAST_STATUS_COMPLETED = "completed"
 BROADCAST_STATUS_FAILED = "failed"
 
@@ -5,10 +5,10 @@ from datetime import datetime
 from typing import Optional
 from sqlalchemy import (
     Integer, String, Float, Boolean, DateTime, Text, JSON,
-    ForeignKey, UniqueConstraint, Index, CheckConstraint
+    ForeignKey, UniqueConstraint, Index, CheckConstraint, Computed
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 
 class Base(DeclarativeBase):
@@ -28,6 +28,7 @@ class User(Base):
     company: Mapped[Optional[str]] = mapped_column(String(120))
     comment: Mapped[Optional[str]] = mapped_column(String(500))
     is_banned: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    bot_blocked: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # заблокував бота
     last_active: Mapped[Optional[datetime]] = mapped_column(DateTime)
     settings_json: Mapped[Optional[str]] = mapped_column(Text)  # JSON settings
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
@@ -64,7 +65,27 @@ class Lot(Base):
     region: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
     location: Mapped[Optional[str]] = mapped_column(String(100))  # City/village
     quality_json: Mapped[str] = mapped_column(JSON, nullable=False)  # moisture, trash, etc.
+    # Generated from quality_json (migration 13)
+    quality_moisture: Mapped[Optional[float]] = mapped_column(
+        Float,
+        Computed(
+            "CASE WHEN json_valid(quality_json) "
+            "THEN CAST(json_extract(quality_json, '$.moisture') AS REAL) END",
+            persisted=False,
+        )
+    )
+    quality_trash: Mapped[Optional[float]] = mapped_column(
+        Float,
+        Computed(
+            "CASE WHEN json_valid(quality_json) "
+            "THEN CAST(json_extract(quality_json, '$.trash') AS REAL) END",
+            persisted=False,
+        )
+    )
     price: Mapped[str] = mapped_column(String(50), nullable=False)  # Price or "договірна"
+    # Numeric price (NULL — no price) and "договірна" flag (migration 12)
+    price_value: Mapped[Optional[float]] = mapped_column(Float)
+    price_negotiable: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     comment: Mapped[Optional[str]] = mapped_column(String(700))
     photos_json: Mapped[Optional[str]] = mapped_column(Text)  # JSON array of file_ids
     owner_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -81,6 +102,7 @@ class Lot(Base):
     __table_args__ = (
         CheckConstraint('volume_tons > 0', name='check_volume_positive'),
         Index('idx_lots_active', 'status', 'type', 'crop', 'region'),
+        Index('idx_lots_price_value', 'crop', 'type', 'price_value', sqlite_where=text("status = 'active'")),
     )
     
     def __repr__(self):
@@ -135,6 +157,10 @@ class ChatSession(Base):
     
     __table_args__ = (
         Index('idx_chat_sessions_users', 'user1_id', 'user2_id', 'status'),
+        # Одна активна сесія на пару (user1_id < user2_id) і контекст — міграція 15
+        Index('ux_chat_sessions_pair', 'user1_id', 'user2_id',
+              text('COALESCE(lot_id, 0)'), text('COALESCE(offer_id, 0)'),
+              unique=True, sqlite_where=text("status = 'active'")),
     )
     
     def __repr__(self):
@@ -146,15 +172,21 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    session_id: Mapped[int] = mapped_column(Integer, ForeignKey("chat_sessions.id"), nullable=False, index=True)
+    session_id: Mapped[int] = mapped_column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     sender_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     message_type: Mapped[str] = mapped_column(String(20), default="text", nullable=False)
     content: Mapped[Optional[str]] = mapped_column(Text)  # Text or file_id
+    media_json: Mapped[Optional[str]] = mapped_column(Text)  # альбом: [{"type", "file_id"}, ...]
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False, index=True)
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
     
+    __table_args__ = (
+        # Історія чату сторінками по id (keyset) — міграція 16
+        Index('idx_chat_messages_session', 'session_id', 'id'),
+    )
+    
     def __repr__(self):
         return f"<ChatMessage(id={self.id}, session={self.session_id}, type={self.message_type})>"
 
@@ -283,7 +315,7 @@ class Broadcast(Base):
     __tablename__ = "broadcasts"
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    admin_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    admin_user_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id"))  # NULL — з веб-панелі
     content: Mapped[str] = mapped_column(Text, nullable=False)
     media_type: Mapped[Optional[str]] = mapped_column(String(20))
     media_file_id: Mapped[Optional[str]] = mapped_column(String(200))
@@ -293,6 +325,9 @@ class Broadcast(Base):
     total_users: Mapped[int] = mapped_column(Integer, default=0)
     sent_count: Mapped[int] = mapped_column(Integer, default=0)
     failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    blocked_count: Mapped[int] = mapped_column(Integer, default=0)
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)  # курсор для продовження
+    error: Mapped[Optional[str]] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
     started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
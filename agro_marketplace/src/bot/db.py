@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import aiosqlite
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any, Tuple
 
+import logging
 import os
 from pathlib import Path
 
@@ -21,30 +25,127 @@ def _resolve_db_path() -> str:
 
 DB_FILE = _resolve_db_path()
 
+logger = logging.getLogger(__name__)
 
-async def ensure_subscription_columns() -> None:
+
+# ══════════════════════ CONNECTION POOL ══════════════════════
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+# Застосовуються один раз на з'єднання, а не на кожен запит
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",      # ~20 МБ сторінкового кешу
+    "PRAGMA mmap_size=268435456",    # 256 МБ memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+)
+
+# (задача, з'єднання), взяте поточною asyncio-задачею
+_held: ContextVar[Optional[Tuple[asyncio.Task, aiosqlite.Connection]]] = ContextVar("db_held", default=None)
+
+
+class ConnectionPool:
     """
-    Додає колонки підписки в існуючу таблицю users, якщо їх ще немає.
-    Безпечно: не видаляє дані, просто ALTER TABLE якщо потрібно.
+    Пул довгоживучих aiosqlite-з'єднань на весь процес бота.
+    З'єднання відкриваються ліниво (не більше ``size``), row_factory = aiosqlite.Row.
     """
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("PRAGMA table_info(users)")
-        cols = [row[1] for row in await cur.fetchall()]
 
-        if "subscription_plan" not in cols:
-            await db.execute("ALTER TABLE users ADD COLUMN subscription_plan TEXT DEFAULT 'free'")
-        if "subscription_until" not in cols:
-            await db.execute("ALTER TABLE users ADD COLUMN subscription_until TEXT")
-
-        await db.commit()
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle: list[aiosqlite.Connection] = []
+        self._slots = asyncio.Semaphore(self.size)
+
+    async def _open(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Бере вільне з'єднання (або відкриває нове, поки не досягнуто size)."""
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return await self._open()
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def release(self, conn: aiosqlite.Connection) -> None:
+        """Повертає з'єднання в пул. Незакомічена транзакція відкочується."""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._idle.append(conn)
+        except Exception as e:
+            logger.warning("Pooled connection dropped: %s", e)
+            try:
+                await conn.close()
+            except Exception:
+                pass
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        ``async with pool.connection() as db`` — усередині однієї задачі
+        вкладені виклики отримують те саме з'єднання (один checkout).
+        """
+        task = asyncio.current_task()
+        held = _held.get()
+        if held is not None and held[0] is task:
+            yield held[1]
+            return
+
+        conn = await self.acquire()
+        token = _held.set((task, conn))
+        try:
+            yield conn
+        finally:
+            _held.reset(token)
+            await self.release(conn)
+
+    async def close(self) -> None:
+        while self._idle:
+            conn = self._idle.pop()
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+def get_pool() -> ConnectionPool:
+    """Глобальний пул процесу (створюється при першому зверненні)."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+
+def db_connection():
+    """Скорочення для ``get_pool().connection()``."""
+    return get_pool().connection()
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
 
 
 async def get_user(telegram_id: int) -> Optional[Dict[str, Any]]:
     """Повертає юзера словником (або None) з полями підписки."""
-    await ensure_subscription_columns()
-
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute(
             """
             SELECT
@@ -62,11 +163,9 @@ async def get_user(telegram_id: int) -> Optional[Dict[str, Any]]:
 
 async def activate_pro(telegram_id: int, until: datetime) -> None:
     """Активує PRO до дати until (UTC)."""
-    await ensure_subscription_columns()
-
     until_iso = until.replace(microsecond=0).isoformat()
 
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             """
             UPDATE users
@@ -98,22 +197,3 @@ async def is_pro_user(telegram_id: int) -> bool:
         return False
 
     return dt_until > datetime.utcnow()
-
-
-async def init_db():
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute("""
-                         CREATE TABLE IF NOT EXISTS counter_offers (
-                                                                       id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                                       lot_id INTEGER NOT NULL,
-                                                                       sender_user_id INTEGER NOT NULL,
-                                                                       offered_price REAL NOT NULL,
-                                                                       message TEXT,
-                                                                       status TEXT NOT NULL DEFAULT 'pending',
-                                                                       created_at TEXT DEFAULT (datetime('now'))
-                             )
-                         """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_counter_offers_lot ON counter_offers(lot_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_counter_offers_sender ON counter_offers(sender_user_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_counter_offers_status ON counter_offers(status)")
-        await db.commit()
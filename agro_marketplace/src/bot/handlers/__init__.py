@@ -9,6 +9,8 @@ from . import (
     offers_handlers,
     calculators,
     advertisement_handler,
+    alerts,
+    paged_lists,
 )
 
 __all__ = [
@@ -22,4 +24,6 @@ __all__ = [
     'offers_handlers',
     'calculators',
     'advertisement_handler',
+    'alerts',
+    'paged_lists',
 ]
@@ -4,9 +4,10 @@
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
-import aiosqlite
 import logging
 
+from src.bot.db import db_connection
+
 router = Router()
 logger = logging.getLogger(__name__)
 
@@ -29,8 +30,7 @@ async def click_ad(callback: CallbackQuery):
         ad_id = int(callback.data.split("_")[2])
         
         # Записуємо клік
-        from config.settings import DB_PATH
-        async with aiosqlite.connect(str(DB_PATH)) as db:
+        async with db_connection() as db:
             # Оновлюємо лічильник кліків
             await db.execute("""
                 UPDATE advertisements 
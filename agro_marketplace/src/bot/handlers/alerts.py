@@ -0,0 +1,186 @@
+"""
+🔔 Підписки: цінові сповіщення і збережені фільтри біржі.
+
+Список відкривається з «📈 Ціни», нове цінове сповіщення — культура → умова →
+поріг → область. Збережені фільтри додаються кнопкою «💾 Зберегти пошук»
+у біржових пропозиціях (market.py). Перевірку лотів робить
+services.standing_queries.
+"""
+from __future__ import annotations
+
+import logging
+
+from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.bot.handlers.market import CROPS
+from src.bot.services.identity import get_identity
+from src.bot.services.standing_queries import ALERT, MAX_SUBSCRIPTIONS, SEARCH, standing_queries
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+
+class AlertCreate(StatesGroup):
+    threshold = State()
+
+
+# ---------- Keyboards ----------
+
+def kb_subscriptions(subs):
+    kb = InlineKeyboardBuilder()
+    for i, sub in enumerate(subs, start=1):
+        code = "a" if sub.kind == ALERT else "s"
+        kb.button(text=f"❌ {i}", callback_data=f"alerts:del:{code}:{sub.id}")
+    kb.button(text="➕ Цінове сповіщення", callback_data="alerts:new")
+    kb.adjust(*([5] * (len(subs) // 5)), *([len(subs) % 5] if len(subs) % 5 else []), 1)
+    return kb.as_markup()
+
+
+def kb_alert_crops():
+    kb = InlineKeyboardBuilder()
+    for i, (name, _) in enumerate(CROPS):
+        kb.button(text=name, callback_data=f"alerts:crop:{i}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+def kb_alert_condition():
+    kb = InlineKeyboardBuilder()
+    kb.button(text="📉 Продають нижче", callback_data="alerts:cond:below")
+    kb.button(text="📈 Купують вище", callback_data="alerts:cond:above")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def kb_alert_region(region):
+    kb = InlineKeyboardBuilder()
+    if region:
+        kb.button(text=f"📍 {region}", callback_data="alerts:reg:my")
+    kb.button(text="🇺🇦 Вся Україна", callback_data="alerts:reg:any")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def format_subscriptions(subs) -> str:
+    if not subs:
+        return (
+            "🔔 <b>Мої сповіщення</b>\n\n"
+            "Підписок ще немає.\n\n"
+            "💡 Додайте цінове сповіщення або збережіть фільтр у «💰 Біржові пропозиції»."
+        )
+    lines = []
+    for i, sub in enumerate(subs, start=1):
+        icon = "💰" if sub.kind == ALERT else "💾"
+        lines.append(f"{i}. {icon} {sub.title}")
+    return (
+        f"🔔 <b>Мої сповіщення</b> ({len(subs)}/{MAX_SUBSCRIPTIONS})\n\n"
+        + "\n".join(lines)
+        + "\n\n❌ — видалити підписку"
+    )
+
+
+# ---------- Handlers ----------
+
+async def _render_list(cb: CallbackQuery, user_id: int):
+    subs = standing_queries.user_subscriptions(user_id)
+    await cb.message.edit_text(format_subscriptions(subs), reply_markup=kb_subscriptions(subs))
+
+
+@router.callback_query(F.data == "alerts:list")
+async def alerts_list(cb: CallbackQuery, state: FSMContext):
+    await state.clear()
+    u = await get_identity(cb.from_user.id)
+    if not u:
+        await cb.answer("Спочатку зареєструйтесь: /start", show_alert=True)
+        return
+    subs = standing_queries.user_subscriptions(u["id"])
+    await cb.message.answer(format_subscriptions(subs), reply_markup=kb_subscriptions(subs))
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("alerts:del:"))
+async def alerts_delete(cb: CallbackQuery):
+    _, _, code, sub_id = cb.data.split(":")
+    u = await get_identity(cb.from_user.id)
+    if not u or not sub_id.isdigit():
+        await cb.answer()
+        return
+    kind = ALERT if code == "a" else SEARCH
+    removed = await standing_queries.remove(u["id"], kind, int(sub_id))
+    await _render_list(cb, u["id"])
+    await cb.answer("🗑 Видалено" if removed else "Підписку не знайдено")
+
+
+@router.callback_query(F.data == "alerts:new")
+async def alerts_new(cb: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await cb.message.edit_text("💰 <b>Цінове сповіщення</b>\n\nОберіть культуру:",
+                               reply_markup=kb_alert_crops())
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("alerts:crop:"))
+async def alerts_crop(cb: CallbackQuery, state: FSMContext):
+    idx = cb.data.split(":")[2]
+    if not idx.isdigit() or int(idx) >= len(CROPS):
+        await cb.answer()
+        return
+    crop = CROPS[int(idx)][0]
+    await state.update_data(alert_crop=crop)
+    await cb.message.edit_text(f"💰 <b>{crop}</b>\n\nКоли повідомляти?", reply_markup=kb_alert_condition())
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("alerts:cond:"))
+async def alerts_condition(cb: CallbackQuery, state: FSMContext):
+    condition = cb.data.split(":")[2]
+    data = await state.get_data()
+    if condition not in ("below", "above") or not data.get("alert_crop"):
+        await cb.answer()
+        return
+    await state.update_data(alert_condition=condition)
+    await state.set_state(AlertCreate.threshold)
+    await cb.message.edit_text(
+        f"💰 <b>{data['alert_crop']}</b>\n\nВведіть поріг ціни, грн/т (наприклад 8500):"
+    )
+    await cb.answer()
+
+
+@router.message(AlertCreate.threshold)
+async def alerts_threshold(message: Message, state: FSMContext):
+    text = (message.text or "").replace(" ", "").replace(",", ".")
+    try:
+        threshold = float(text)
+    except ValueError:
+        threshold = 0
+    if threshold <= 0:
+        await message.answer("❌ Введіть число, наприклад 8500")
+        return
+    await state.update_data(alert_threshold=threshold)
+    await state.set_state(None)
+    u = await get_identity(message.from_user.id)
+    await message.answer("📍 Для якої області?", reply_markup=kb_alert_region(u["region"] if u else None))
+
+
+@router.callback_query(F.data.startswith("alerts:reg:"))
+async def alerts_region(cb: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    u = await get_identity(cb.from_user.id)
+    if not u or not data.get("alert_threshold"):
+        await cb.answer()
+        return
+    region = u["region"] if cb.data.endswith(":my") else None
+    sub_id = await standing_queries.add_alert(
+        u["id"], data["alert_crop"], region, data["alert_threshold"], data["alert_condition"]
+    )
+    await state.clear()
+    if sub_id is None:
+        await cb.answer(f"Максимум {MAX_SUBSCRIPTIONS} підписок — видаліть зайві", show_alert=True)
+        return
+    await _render_list(cb, u["id"])
+    await cb.answer("✅ Сповіщення створено")
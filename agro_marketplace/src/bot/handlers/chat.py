@@ -6,12 +6,13 @@
 """
 from __future__ import annotations
 
+import html
 import os
 import logging
 from typing import Optional
 
-import aiosqlite
 from aiogram import Router, F, Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import (
@@ -20,16 +21,15 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.db import db_connection
+from src.bot.services.chat_relay import AlbumItem, album_buffer, chat_routes, chat_writer, open_session
+from src.bot.services.identity import get_identity_by_user_id, get_telegram_id, get_user_id
+from src.bot.services.send_queue import PRIORITY_CHAT, send_queue
 from src.bot.keyboards.main import main_menu
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-try:
-    from config.settings import DB_PATH as _DB
-    DB_FILE = str(_DB)
-except Exception:
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
 
 
 # ══════════════════════ FSM ══════════════════════
@@ -38,78 +38,24 @@ class ChatState(StatesGroup):
     chatting = State()
 
 
-# ══════════════════════ DB INIT ══════════════════════
-
-async def _ensure_tables():
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS chat_sessions (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                user1_id    INTEGER NOT NULL,
-                user2_id    INTEGER NOT NULL,
-                lot_id      INTEGER,
-                status      TEXT NOT NULL DEFAULT 'active',
-                created_at  TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at  TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id              INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id      INTEGER NOT NULL,
-                sender_user_id  INTEGER NOT NULL,
-                content         TEXT NOT NULL,
-                created_at      TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS contacts (
-                id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id          INTEGER NOT NULL,
-                contact_user_id  INTEGER NOT NULL,
-                status           TEXT NOT NULL DEFAULT 'pending',
-                created_at       TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, contact_user_id)
-            )
-        """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_cs_u1 ON chat_sessions(user1_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_cs_u2 ON chat_sessions(user2_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_cm_s  ON chat_messages(session_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_co_u  ON contacts(user_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_co_c  ON contacts(contact_user_id)")
-        await db.commit()
-
-
 # ══════════════════════ DB HELPERS ══════════════════════
 
 async def _get_user_id(telegram_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT id FROM users WHERE telegram_id=?", (telegram_id,))
-        row = await cur.fetchone()
-        return row[0] if row else None
+    return await get_user_id(telegram_id)
 
 
 async def _get_user_full(user_id: int) -> Optional[dict]:
     """Повертає всі дані юзера: telegram_id, role, region, phone, company"""
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT id, telegram_id, role, region, phone, company FROM users WHERE id=?",
-            (user_id,)
-        )
-        row = await cur.fetchone()
-        return dict(row) if row else None
+    record = await get_identity_by_user_id(user_id)
+    return dict(record) if record else None
 
 
 async def _get_telegram_id(user_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT telegram_id FROM users WHERE id=?", (user_id,))
-        row = await cur.fetchone()
-        return row[0] if row else None
+    return await get_telegram_id(user_id)
 
 
 async def _get_lot_owner(lot_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         cur = await db.execute("SELECT owner_user_id FROM lots WHERE id=?", (lot_id,))
         row = await cur.fetchone()
         return row[0] if row else None
@@ -117,7 +63,7 @@ async def _get_lot_owner(lot_id: int) -> Optional[int]:
 
 async def _contact_status(from_id: int, to_id: int) -> str:
     """none | pending | accepted"""
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         cur = await db.execute(
             "SELECT status FROM contacts WHERE user_id=? AND contact_user_id=?",
             (from_id, to_id)
@@ -127,24 +73,7 @@ async def _contact_status(from_id: int, to_id: int) -> str:
 
 
 async def _get_or_create_session(u1: int, u2: int, lot_id: Optional[int]) -> int:
-    a, b = sorted([u1, u2])
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            """SELECT id FROM chat_sessions
-               WHERE user1_id=? AND user2_id=? AND COALESCE(lot_id,0)=COALESCE(?,0)
-               AND status='active'""",
-            (a, b, lot_id)
-        )
-        row = await cur.fetchone()
-        if row:
-            return row["id"]
-        cur = await db.execute(
-            "INSERT INTO chat_sessions(user1_id,user2_id,lot_id) VALUES(?,?,?)",
-            (a, b, lot_id)
-        )
-        await db.commit()
-        return cur.lastrowid
+    return await open_session(u1, u2, lot_id=lot_id)
 
 
 # ══════════════════════ KEYBOARDS ══════════════════════
@@ -225,32 +154,30 @@ async def _send_contact_card(bot: Bot, to_telegram_id: int, user_info: dict,
     )
 
     # Пробуємо надіслати фото профілю
-    sent_photo = False
+    file_id = None
     try:
         photos = await bot.get_user_profile_photos(tg_id, limit=1)
         if photos.total_count > 0:
             file_id = photos.photos[0][-1].file_id
-            await bot.send_photo(to_telegram_id, photo=file_id, caption=text)
-            sent_photo = True
     except Exception:
         pass
 
-    if not sent_photo:
-        await bot.send_message(to_telegram_id, text)
+    if file_id:
+        send_queue.enqueue("send_photo", to_telegram_id, photo=file_id, caption=text)
+    else:
+        send_queue.send_message(to_telegram_id, text)
 
 
 # ══════════════════════ 💬 МОЇ ЧАТИ ══════════════════════
 
 @router.message(F.text == "💬 Мої чати")
 async def my_chats(message: Message):
-    await _ensure_tables()
     user_id = await _get_user_id(message.from_user.id)
     if not user_id:
         await message.answer("Спочатку пройдіть реєстрацію: /start")
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute(
             """SELECT cs.id, cs.user1_id, cs.user2_id, cs.lot_id, cs.status,
                       u1.company as c1, u2.company as c2,
@@ -288,14 +215,12 @@ async def my_chats(message: Message):
 
 @router.message(F.text == "📇 Мої контакти")
 async def my_contacts(message: Message):
-    await _ensure_tables()
     user_id = await _get_user_id(message.from_user.id)
     if not user_id:
         await message.answer("Спочатку пройдіть реєстрацію: /start")
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
 
         # Прийняті контакти
         cur = await db.execute(
@@ -388,49 +313,31 @@ async def my_contacts(message: Message):
 
 @router.callback_query(F.data.startswith("chat:open:"))
 async def open_chat(cb: CallbackQuery, state: FSMContext):
-    await _ensure_tables()
     session_id = int(cb.data.split(":")[-1])
     user_id = await _get_user_id(cb.from_user.id)
     if not user_id:
         await cb.answer("Спочатку /start", show_alert=True)
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT id,user1_id,user2_id,status FROM chat_sessions WHERE id=?",
-            (session_id,)
-        )
-        sess = await cur.fetchone()
-
-    if not sess or sess["status"] != "active":
+    # Свіжий маршрут з БД — далі relay_message бере його з пам'яті
+    route = await chat_routes.load(session_id)
+    if not route or not route.active:
         await cb.answer("Чат не активний", show_alert=True)
         return
-    if user_id not in (sess["user1_id"], sess["user2_id"]):
+    if user_id not in (route.user1_id, route.user2_id):
         await cb.answer("Немає доступу", show_alert=True)
         return
 
-    # Показуємо останні 10 повідомлень
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            """SELECT m.content, m.sender_user_id, m.created_at,
-                      u.company, u.telegram_id
-               FROM chat_messages m LEFT JOIN users u ON m.sender_user_id=u.id
-               WHERE m.session_id=? ORDER BY m.id DESC LIMIT 10""",
-            (session_id,)
-        )
-        msgs = list(reversed(await cur.fetchall()))
-
     await state.update_data(chat_session_id=session_id)
     await state.set_state(ChatState.chatting)
 
-    if msgs:
-        history = "📜 <b>Останні повідомлення:</b>\n\n"
-        for m in msgs:
-            me = "→ Ви" if m["sender_user_id"] == user_id else f"← {m['company'] or 'Співрозмовник'}"
-            history += f"<i>{m['created_at'][:16]}</i> <b>{me}:</b>\n{m['content']}\n\n"
-        await cb.message.answer(history)
+    # Останні повідомлення (разом з ще не записаними) — одним повідомленням з «⬆ Старіші»
+    await chat_writer.flush()
+    page = await _history_page(session_id)
+    if page[0]:
+        other_id = route.user2_id if route.user1_id == user_id else route.user1_id
+        text, markup = await _render_history(session_id, user_id, other_id, *page)
+        await cb.message.answer(text, reply_markup=markup)
 
     await cb.message.answer(
         "💬 <b>Чат відкрито.</b> Пишіть повідомлення — вони надходять співрозмовнику.\n\n"
@@ -440,11 +347,111 @@ async def open_chat(cb: CallbackQuery, state: FSMContext):
     await cb.answer()
 
 
+# ══════════════════════ ІСТОРІЯ ЧАТУ ══════════════════════
+# Сторінки по id (keyset, idx_chat_messages_session): «⬆ Старіші» — id < першого
+# показаного, «⬇ Новіші» — id > останнього. Сторінка редагує те саме повідомлення.
+
+CHAT_HISTORY_PAGE = int(os.getenv("CHAT_HISTORY_PAGE", "10"))
+_HISTORY_TEXT_LIMIT = 3800   # запас до ліміту Telegram 4096
+_HISTORY_ITEM_LIMIT = 500    # довгі повідомлення в історії обрізаються
+
+
+async def _history_page(session_id: int, before: Optional[int] = None,
+                        after: Optional[int] = None):
+    """(повідомлення за зростанням id, є старіші, є новіші)."""
+    n = CHAT_HISTORY_PAGE
+    if after is not None:
+        sql = ("SELECT id, sender_user_id, content, created_at FROM chat_messages "
+               "WHERE session_id=? AND id>? ORDER BY id LIMIT ?")
+        params = (session_id, after, n + 1)
+    elif before is not None:
+        sql = ("SELECT id, sender_user_id, content, created_at FROM chat_messages "
+               "WHERE session_id=? AND id<? ORDER BY id DESC LIMIT ?")
+        params = (session_id, before, n + 1)
+    else:
+        sql = ("SELECT id, sender_user_id, content, created_at FROM chat_messages "
+               "WHERE session_id=? ORDER BY id DESC LIMIT ?")
+        params = (session_id, n + 1)
+    async with db_connection() as db:
+        cur = await db.execute(sql, params)
+        rows = [dict(r) for r in await cur.fetchall()]
+    more = len(rows) > n
+    rows = rows[:n]
+    if after is not None:
+        return rows, True, more
+    rows.reverse()
+    return rows, more, before is not None
+
+
+async def _render_history(session_id: int, user_id: int, other_id: int,
+                          msgs: list, has_older: bool, has_newer: bool):
+    other = await _get_user_full(other_id)
+    other_name = html.escape((other or {}).get("company") or "Співрозмовник")
+    # Від найновіших назад, поки вміщається в одне повідомлення
+    blocks = []
+    size = 0
+    for m in reversed(msgs):
+        who = "→ Ви" if m["sender_user_id"] == user_id else f"← {other_name}"
+        content = m["content"] or ""
+        if len(content) > _HISTORY_ITEM_LIMIT:
+            content = content[:_HISTORY_ITEM_LIMIT] + "…"
+        block = f"<i>{(m['created_at'] or '')[:16]}</i> <b>{who}:</b>\n{html.escape(content)}"
+        if blocks and size + len(block) > _HISTORY_TEXT_LIMIT:
+            has_older = True
+            break
+        blocks.append(block)
+        size += len(block) + 2
+    blocks.reverse()
+    shown = msgs[len(msgs) - len(blocks):]
+
+    title = "📜 <b>Останні повідомлення:</b>" if not has_newer else "📜 <b>Історія чату:</b>"
+    text = title + "\n\n" + "\n\n".join(blocks)
+
+    kb = InlineKeyboardBuilder()
+    if has_older:
+        kb.button(text="⬆ Старіші", callback_data=f"chat:hist:{session_id}:o:{shown[0]['id']}")
+    if has_newer:
+        kb.button(text="⬇ Новіші", callback_data=f"chat:hist:{session_id}:n:{shown[-1]['id']}")
+    kb.adjust(2)
+    return text, kb.as_markup()
+
+
+@router.callback_query(F.data.startswith("chat:hist:"))
+async def chat_history_page(cb: CallbackQuery):
+    try:
+        _, _, session_id, direction, cursor = cb.data.split(":")
+        session_id, cursor = int(session_id), int(cursor)
+    except ValueError:
+        await cb.answer()
+        return
+    user_id = await _get_user_id(cb.from_user.id)
+    route = await chat_routes.get(session_id)
+    if not user_id or not route or user_id not in (route.user1_id, route.user2_id):
+        await cb.answer("Немає доступу", show_alert=True)
+        return
+
+    if direction == "n":
+        await chat_writer.flush()
+        page = await _history_page(session_id, after=cursor)
+    else:
+        page = await _history_page(session_id, before=cursor)
+    if not page[0]:
+        await cb.answer()
+        return
+    other_id = route.user2_id if route.user1_id == user_id else route.user1_id
+    text, markup = await _render_history(session_id, user_id, other_id, *page)
+    try:
+        await cb.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    await cb.answer()
+
+
 # ══════════════════════ НАПИСАТИ КОНТАКТУ ══════════════════════
 
 @router.callback_query(F.data.startswith("contact:chat:"))
 async def chat_with_contact(cb: CallbackQuery, state: FSMContext):
-    await _ensure_tables()
     contact_user_id = int(cb.data.split(":")[-1])
     my_id = await _get_user_id(cb.from_user.id)
     if not my_id:
@@ -470,7 +477,6 @@ async def chat_with_contact(cb: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data.startswith("chat:start:lot:"))
 async def start_chat_from_lot(cb: CallbackQuery, state: FSMContext):
-    await _ensure_tables()
     lot_id = int(cb.data.split(":")[-1])
     me = await _get_user_id(cb.from_user.id)
     if not me:
@@ -522,7 +528,6 @@ async def start_chat_from_lot(cb: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data.startswith("contact:request:"))
 async def send_contact_request(cb: CallbackQuery):
-    await _ensure_tables()
     parts = cb.data.split(":")
     to_user_id = int(parts[2])
     # lot_id опційний (contact:request:{uid}:lot:{lid})
@@ -543,7 +548,7 @@ async def send_contact_request(cb: CallbackQuery):
         return
 
     # Створюємо запит
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             "INSERT OR IGNORE INTO contacts(user_id,contact_user_id,status) VALUES(?,?,'pending')",
             (from_id, to_user_id)
@@ -568,7 +573,7 @@ async def send_contact_request(cb: CallbackQuery):
             kb.button(text="✅ Прийняти і відкрити чат", callback_data=f"contact:accept:{from_id}")
             kb.button(text="❌ Відхилити", callback_data=f"contact:decline:{from_id}")
             kb.adjust(1)
-            await cb.bot.send_message(
+            send_queue.send_message(
                 to_tg,
                 "Прийняти цей запит?",
                 reply_markup=kb.as_markup()
@@ -590,7 +595,6 @@ async def send_contact_request(cb: CallbackQuery):
 
 @router.callback_query(F.data.startswith("contact:accept:"))
 async def accept_contact(cb: CallbackQuery, state: FSMContext):
-    await _ensure_tables()
     from_user_id = int(cb.data.split(":")[-1])
     my_id = await _get_user_id(cb.from_user.id)
     if not my_id:
@@ -598,7 +602,7 @@ async def accept_contact(cb: CallbackQuery, state: FSMContext):
         return
 
     # Приймаємо: оновлюємо запит і створюємо зворотній
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             "UPDATE contacts SET status='accepted' WHERE user_id=? AND contact_user_id=?",
             (from_user_id, my_id)
@@ -623,7 +627,7 @@ async def accept_contact(cb: CallbackQuery, state: FSMContext):
             )
             # Кнопка відкрити чат
             session_id = await _get_or_create_session(my_id, from_user_id, None)
-            await cb.bot.send_message(
+            send_queue.send_message(
                 from_tg,
                 "Тепер ви можете спілкуватися в особистому чаті:",
                 reply_markup=kb_open_chat(session_id)
@@ -689,7 +693,7 @@ async def decline_contact(cb: CallbackQuery):
         await cb.answer("Помилка", show_alert=True)
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             "DELETE FROM contacts WHERE user_id=? AND contact_user_id=?",
             (from_user_id, my_id)
@@ -726,17 +730,12 @@ async def send_my_contact_in_chat(cb: CallbackQuery, state: FSMContext):
         await cb.answer("Помилка", show_alert=True)
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT user1_id,user2_id FROM chat_sessions WHERE id=?", (session_id,))
-        sess = await cur.fetchone()
-
-    if not sess:
+    route = await chat_routes.get(session_id)
+    if not route:
         await cb.answer("Чат не знайдено", show_alert=True)
         return
 
-    other_id = sess["user2_id"] if sess["user1_id"] == my_id else sess["user1_id"]
-    other_tg = await _get_telegram_id(other_id)
+    other_tg = route.tg2 if route.user1_id == my_id else route.tg1
     my_info = await _get_user_full(my_id)
 
     if other_tg:
@@ -774,6 +773,23 @@ async def exit_chat_btn(message: Message, state: FSMContext):
 
 # ══════════════════════ ПЕРЕСИЛАННЯ ПОВІДОМЛЕНЬ ══════════════════════
 
+def _album_item(message: Message) -> Optional[AlbumItem]:
+    """Елемент альбому, якщо повідомлення — частина media group підтримуваного типу."""
+    if not message.media_group_id:
+        return None
+    if message.photo:
+        kind, file_id = "photo", message.photo[-1].file_id
+    elif message.video:
+        kind, file_id = "video", message.video.file_id
+    elif message.document:
+        kind, file_id = "document", message.document.file_id
+    elif message.audio:
+        kind, file_id = "audio", message.audio.file_id
+    else:
+        return None
+    return AlbumItem(message.message_id, kind, file_id, message.caption)
+
+
 @router.message(ChatState.chatting)
 async def relay_message(message: Message, state: FSMContext):
     """Пересилає будь-яке повідомлення (текст/фото/файл/голос) співрозмовнику"""
@@ -784,86 +800,68 @@ async def relay_message(message: Message, state: FSMContext):
         await message.answer("Чат не знайдено. Поверніться до меню.")
         return
 
-    sender_id = await _get_user_id(message.from_user.id)
-    if not sender_id:
+    # Маршрут з пам'яті (chat_relay): жодних читань БД на шляху пересилання
+    route = await chat_routes.get(session_id)
+    if not route or not route.active:
         await state.clear()
+        await message.answer("Чат завершено.")
         return
-
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT user1_id,user2_id FROM chat_sessions WHERE id=? AND status='active'",
-            (session_id,)
-        )
-        sess = await cur.fetchone()
-
-    if not sess:
+    resolved = route.resolve(message.from_user.id)
+    if not resolved:
         await state.clear()
-        await message.answer("Чат завершено.")
         return
+    sender_id, _, other_tg = resolved
+
+    me = message.from_user
+    sender_label = f"💬 <b>{me.first_name or 'Користувач'}</b>"
+    if me.username:
+        sender_label += f" (@{me.username})"
+
+    sender_chat = message.chat.id
+
+    async def relay_failed(exc: Exception):
+        logger.error(f"Помилка пересилання: {exc}")
+        send_queue.send_message(sender_chat, "⚠️ Не вдалося надіслати повідомлення.", priority=PRIORITY_CHAT)
+
+    # Альбом: елементи збирає album_buffer і пересилає одним send_media_group
+    item = _album_item(message)
+    if item:
+        album_buffer.add(
+            message.media_group_id, item,
+            session_id=session_id, sender_id=sender_id, sender_chat=sender_chat,
+            other_tg=other_tg, label=sender_label, on_failure=relay_failed,
+        )
+        return
+    # Незавершений альбом відправника — раніше за це повідомлення
+    album_buffer.flush_chat(sender_chat)
 
-    other_id = sess["user2_id"] if sess["user1_id"] == sender_id else sess["user1_id"]
-    other_tg = await _get_telegram_id(other_id)
-
-    # Зберігаємо текст в БД
+    # Текст у БД пише фоновий chat_writer пачками
     content = message.text or message.caption or "[медіа]"
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            "INSERT INTO chat_messages(session_id,sender_user_id,content) VALUES(?,?,?)",
-            (session_id, sender_id, content)
-        )
-        await db.execute(
-            "UPDATE chat_sessions SET updated_at=datetime('now') WHERE id=?",
-            (session_id,)
-        )
-        await db.commit()
+    chat_writer.write(session_id, sender_id, content)
 
     if not other_tg:
         await message.answer("⚠️ Не вдалося надіслати — співрозмовника не знайдено.")
         return
 
-    # Пересилаємо повідомлення у будь-якому форматі
-    try:
-        me = message.from_user
-        sender_label = f"💬 <b>{me.first_name or 'Користувач'}</b>"
-        if me.username:
-            sender_label += f" (@{me.username})"
-
-        if message.text:
-            await message.bot.send_message(
-                other_tg,
-                f"{sender_label}:\n\n{message.text}"
-            )
-        elif message.photo:
-            await message.bot.send_photo(
-                other_tg,
-                message.photo[-1].file_id,
-                caption=f"{sender_label}:\n\n{message.caption or ''}"
-            )
-        elif message.document:
-            await message.bot.send_document(
-                other_tg,
-                message.document.file_id,
-                caption=f"{sender_label}:\n\n{message.caption or ''}"
-            )
-        elif message.voice:
-            await message.bot.send_voice(
-                other_tg,
-                message.voice.file_id,
-                caption=sender_label
-            )
-        elif message.video:
-            await message.bot.send_video(
-                other_tg,
-                message.video.file_id,
-                caption=f"{sender_label}:\n\n{message.caption or ''}"
-            )
-        elif message.sticker:
-            await message.bot.send_sticker(other_tg, message.sticker.file_id)
-        else:
-            await message.bot.forward_message(other_tg, message.chat.id, message.message_id)
-
-        await message.answer("✅")
-    except Exception as e:
-        logger.error(f"Помилка пересилання: {e}")
-        await message.answer("⚠️ Не вдалося надіслати повідомлення.")
+    # Пересилаємо повідомлення у будь-якому форматі — через чергу з пріоритетом чату
+    relay = dict(priority=PRIORITY_CHAT, on_failure=relay_failed)
+    if message.text:
+        send_queue.send_message(other_tg, f"{sender_label}:\n\n{message.text}", **relay)
+    elif message.photo:
+        send_queue.enqueue("send_photo", other_tg, photo=message.photo[-1].file_id,
+                           caption=f"{sender_label}:\n\n{message.caption or ''}", **relay)
+    elif message.document:
+        send_queue.enqueue("send_document", other_tg, document=message.document.file_id,
+                           caption=f"{sender_label}:\n\n{message.caption or ''}", **relay)
+    elif message.voice:
+        send_queue.enqueue("send_voice", other_tg, voice=message.voice.file_id, caption=sender_label, **relay)
+    elif message.video:
+        send_queue.enqueue("send_video", other_tg, video=message.video.file_id,
+                           caption=f"{sender_label}:\n\n{message.caption or ''}", **relay)
+    elif message.sticker:
+        send_queue.enqueue("send_sticker", other_tg, sticker=message.sticker.file_id, **relay)
+    else:
+        send_queue.enqueue("forward_message", other_tg, from_chat_id=sender_chat,
+                           message_id=message.message_id, **relay)
+
+    await message.answer("✅")
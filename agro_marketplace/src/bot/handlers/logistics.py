@@ -13,22 +13,21 @@ import json
 from datetime import datetime
 from typing import Optional
 
-import aiosqlite
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.db import db_connection
+from src.bot.handlers import paged_lists
+from src.bot.services.chat_relay import open_session
+from src.bot.services.identity import get_telegram_id, get_user_id
+from src.bot.services.send_queue import send_queue
+
 
 router = Router()
 
-try:
-    from config.settings import DB_PATH as _DB_PATH
-    DB_FILE = str(_DB_PATH)
-except Exception:
-    import os
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
 
 # --- Довідник областей (шаблон) ---
 OBLASTS = [
@@ -88,97 +87,6 @@ def kb_vehicle_type():
     return kb.as_markup()
 
 
-async def _ensure_tables():
-    """Створює таблиці, якщо їх ще немає.
-
-    ВАЖЛИВО: якщо у твоїй БД updated_at зроблено NOT NULL без DEFAULT,
-    то це НЕ виправляється CREATE TABLE. Тому ми в коді завжди передаємо updated_at в INSERT/UPDATE.
-    """
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS vehicles (
-                                                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                    owner_user_id INTEGER NOT NULL,
-                                                    body_type TEXT NOT NULL,
-                                                    capacity_tons REAL NOT NULL,
-                                                    count_units INTEGER NOT NULL DEFAULT 1,
-                                                    base_region TEXT NOT NULL,
-                                                    work_regions TEXT,
-                                                    status TEXT NOT NULL DEFAULT 'available',
-                                                    available_from TEXT,
-                                                    comment TEXT,
-                                                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                                                    updated_at TEXT
-            )
-            """
-        )
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS shipments (
-                                                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                     creator_user_id INTEGER NOT NULL,
-                                                     cargo_type TEXT NOT NULL,
-                                                     volume_tons REAL NOT NULL,
-                                                     from_region TEXT NOT NULL,
-                                                     from_location TEXT,
-                                                     to_region TEXT NOT NULL,
-                                                     to_location TEXT,
-                                                     date_from TEXT,
-                                                     date_to TEXT,
-                                                     required_body_types TEXT,
-                                                     comment TEXT,
-                                                     status TEXT NOT NULL DEFAULT 'active',
-                                                     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                                                     updated_at TEXT
-            )
-            """
-        )
-        await db.commit()
-
-async def _ensure_chat_tables():
-    """Таблиці анонімного чату (використовує app/handlers/chat.py)."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS chat_sessions (
-                                                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                         user1_id INTEGER NOT NULL,
-                                                         user2_id INTEGER NOT NULL,
-                                                         lot_id INTEGER,
-                                                         offer_id INTEGER,
-                                                         status TEXT NOT NULL DEFAULT 'active',
-                                                         created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                                                         updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                                                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                         session_id INTEGER NOT NULL,
-                                                         sender_user_id INTEGER NOT NULL,
-                                                         message_type TEXT,
-                                                         content TEXT NOT NULL,
-                                                         created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS contact_requests (
-                                                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                            session_id INTEGER NOT NULL,
-                                                            requester_user_id INTEGER NOT NULL,
-                                                            status TEXT NOT NULL DEFAULT 'pending',
-                                                            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        await db.commit()
-
-
 def kb_open_chat(session_id: int) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(text="💬 Відкрити чат", callback_data=f"chat:open:{session_id}")
@@ -187,63 +95,28 @@ def kb_open_chat(session_id: int) -> InlineKeyboardMarkup:
 
 
 async def _get_user_id_by_tg(tg_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT id FROM users WHERE telegram_id=?", (tg_id,))
-        row = await cur.fetchone()
-        return int(row[0]) if row else None
+    return await get_user_id(tg_id)
 
 
 async def _get_tg_by_user_id(user_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT telegram_id FROM users WHERE id=?", (user_id,))
-        row = await cur.fetchone()
-        return int(row[0]) if row else None
+    return await get_telegram_id(user_id)
 
 
 async def _get_shipment_creator(shipment_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         cur = await db.execute("SELECT creator_user_id FROM shipments WHERE id=?", (shipment_id,))
         row = await cur.fetchone()
         return int(row[0]) if row else None
 
 
 async def _get_or_create_chat_session(u1: int, u2: int, shipment_id: int) -> int:
-    """Створюємо чат між двома користувачами по заявці (shipment_id пишемо в offer_id)."""
-    a, b = (u1, u2) if u1 < u2 else (u2, u1)
-    now = datetime.now().isoformat(timespec="seconds")
-
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute(
-            """
-            SELECT id FROM chat_sessions
-            WHERE status='active'
-              AND user1_id=? AND user2_id=?
-              AND offer_id=?
-              AND lot_id IS NULL
-            ORDER BY id DESC
-                LIMIT 1
-            """,
-            (a, b, int(shipment_id)),
-        )
-        row = await cur.fetchone()
-        if row:
-            return int(row[0])
-
-        cur = await db.execute(
-            """
-            INSERT INTO chat_sessions (user1_id, user2_id, lot_id, offer_id, status, created_at, updated_at)
-            VALUES (?, ?, NULL, ?, 'active', ?, ?)
-            """,
-            (a, b, int(shipment_id), now, now),
-        )
-        await db.commit()
-        return int(cur.lastrowid)
+    """Чат між двома користувачами по заявці (shipment_id пишемо в offer_id)."""
+    return await open_session(u1, u2, offer_id=int(shipment_id))
 
 
 @router.callback_query(F.data.startswith("log:chat:ship:"))
 async def start_chat_from_shipment(cb: CallbackQuery):
     """Кнопка '💬 Звʼязатися' під заявкою/транспортом."""
-    await _ensure_chat_tables()
 
     try:
         shipment_id = int(cb.data.split(":")[-1])
@@ -275,7 +148,7 @@ async def start_chat_from_shipment(cb: CallbackQuery):
     # Сповіщаємо автора заявки
     owner_tg = await _get_tg_by_user_id(owner_user_id)
     if owner_tg:
-        await cb.bot.send_message(
+        send_queue.send_message(
             owner_tg,
             f"💬 Хтось хоче звʼязатися по вашій заявці <code>{shipment_id}</code>.\nНатисніть, щоб відкрити чат:",
             reply_markup=kb_open_chat(session_id),
@@ -291,28 +164,21 @@ def kb_shipment_chat(shipment_id: int) -> InlineKeyboardMarkup:
 
 
 async def _get_user_id(telegram_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT id FROM users WHERE telegram_id=?", (telegram_id,))
-        row = await cur.fetchone()
-        return int(row[0]) if row else None
+    return await get_user_id(telegram_id)
 
 
-def _vehicle_text(row: aiosqlite.Row) -> str:
+def _vehicle_line(row) -> str:
     bt = {"grain": "🌾 Зерновоз", "tipper": "🪨 Самоскид", "tarp": "🧵 Тент"}.get(row["body_type"], row["body_type"])
     return (
-        f"🚛 <b>{bt}</b> • 🆔 <code>{row['id']}</code>\n"
-        f"⚖️ Вантажопідйомність: <b>{row['capacity_tons']} т</b> • К-сть: <b>{row['count_units']}</b>\n"
-        f"📍 База: <b>{row['base_region']}</b>\n"
-        f"📝 {row['comment'] or '—'}\n"
+        f"<b>{bt}</b> • {row['capacity_tons']} т × {row['count_units']} • 📍 {row['base_region']}\n"
+        f"📝 {row['comment'] or '—'}"
     )
 
 
-def _shipment_text(row: aiosqlite.Row) -> str:
+def _shipment_line(row) -> str:
     return (
-        f"📦 <b>Заявка</b> • 🆔 <code>{row['id']}</code>\n"
-        f"🚚 Вантаж: <b>{row['cargo_type']}</b> • {row['volume_tons']} т\n"
-        f"📍 {row['from_region']} → {row['to_region']}\n"
-        f"📝 {row['comment'] or '—'}\n"
+        f"<b>{row['cargo_type']}</b> • {row['volume_tons']} т • 📍 {row['from_region']} → {row['to_region']}\n"
+        f"📝 {row['comment'] or '—'}"
     )
 
 
@@ -324,27 +190,19 @@ def _clean_optional_text(txt: str) -> Optional[str]:
 
 
 async def _get_telegram_id_by_user_id(user_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT telegram_id FROM users WHERE id=?", (int(user_id),))
-        row = await cur.fetchone()
-        if not row:
-            return None
-        try:
-            return int(row["telegram_id"])
-        except Exception:
-            return None
+    try:
+        return await get_telegram_id(int(user_id))
+    except Exception:
+        return None
 
 
 @router.message(F.text == "🚚 Логістика")
 async def logistics_menu(message: Message):
-    await _ensure_tables()
     await message.answer("🚚 <b>Логістика</b>", reply_markup=kb_logistics_menu())
 
 
 @router.message(F.text == "➕ Додати авто")
 async def add_vehicle(message: Message, state: FSMContext):
-    await _ensure_tables()
     await state.clear()
     await state.set_state(CreateVehicle.body_type)
     await message.answer("Оберіть тип кузова:", reply_markup=kb_vehicle_type())
@@ -441,7 +299,7 @@ async def vehicle_finish(message: Message, state: FSMContext):
         return
 
     now = datetime.now().isoformat(timespec="seconds")
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             """
             INSERT INTO vehicles (
@@ -470,7 +328,6 @@ async def vehicle_finish(message: Message, state: FSMContext):
 
 @router.message(F.text == "📦 Створити заявку")
 async def shipment_start(message: Message, state: FSMContext):
-    await _ensure_tables()
     await state.clear()
     await state.set_state(CreateShipment.cargo_type)
     kb = ReplyKeyboardBuilder()
@@ -596,7 +453,7 @@ async def shipment_finish(message: Message, state: FSMContext):
         return
 
     now = datetime.now().isoformat(timespec="seconds")
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             """
             INSERT INTO shipments (
@@ -624,44 +481,46 @@ async def shipment_finish(message: Message, state: FSMContext):
     await message.answer("✅ Заявку створено", reply_markup=kb_logistics_menu())
 
 
-@router.message(F.text == "🚛 Транспорт")
-async def list_vehicles(message: Message):
-    await _ensure_tables()
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT * FROM vehicles WHERE status='available' ORDER BY id DESC LIMIT 20"
-        )
-        rows = await cur.fetchall()
+VEHICLES_LIST = paged_lists.register(paged_lists.ListSpec(
+    key="veh",
+    title="🚛 <b>Доступний транспорт</b>",
+    empty="Поки немає доступного транспорту.",
+    sql="SELECT * FROM vehicles WHERE status='available' {keyset} ORDER BY {order} LIMIT ?",
+    keys=[("id", "id")],
+    line=_vehicle_line,
+    scope_params=0,
+))
 
-    if not rows:
-        await message.answer("Поки немає доступного транспорту.", reply_markup=kb_logistics_menu())
-        return
 
-    await message.answer("🚛 <b>Доступний транспорт</b> (20):", reply_markup=kb_logistics_menu())
-    for r in rows[:10]:
-        await message.answer(_vehicle_text(r), reply_markup=kb_logistics_menu())
+def _shipment_buttons(i: int, row, me_uid: Optional[int]):
+    # Чат — тільки з чужими заявками
+    if me_uid and int(row["creator_user_id"]) != int(me_uid):
+        return [(f"💬 {i}", f"log:chat:ship:{row['id']}")]
+    return []
 
 
-@router.message(F.text == "📨 Заявки")
-async def list_shipments(message: Message):
-    await _ensure_tables()
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT * FROM shipments WHERE status='active' ORDER BY id DESC LIMIT 20"
-        )
-        rows = await cur.fetchall()
+SHIPMENTS_LIST = paged_lists.register(paged_lists.ListSpec(
+    key="ship",
+    title="📨 <b>Активні заявки</b>",
+    empty="Поки немає активних заявок.",
+    sql="SELECT * FROM shipments WHERE status='active' {keyset} ORDER BY {order} LIMIT ?",
+    keys=[("id", "id")],
+    line=_shipment_line,
+    buttons=_shipment_buttons,
+    scope_params=0,
+    footer="💬 N — написати автору заявки",
+))
+
+
+@router.message(F.text == "🚛 Транспорт")
+async def list_vehicles(message: Message):
+    await paged_lists.send_list(message, VEHICLES_LIST.key, None)
 
-    if not rows:
-        await message.answer("Поки немає активних заявок.", reply_markup=kb_logistics_menu())
-        return
 
-    await message.answer("📨 <b>Активні заявки</b> (20):", reply_markup=kb_logistics_menu())
+@router.message(F.text == "📨 Заявки")
+async def list_shipments(message: Message):
     me_uid = await _get_user_id(message.from_user.id)
-    for r in rows[:10]:
-        mk = kb_shipment_chat(int(r["id"])) if (me_uid and int(r["creator_user_id"]) != int(me_uid)) else None
-        await message.answer(_shipment_text(r), reply_markup=mk)
+    await paged_lists.send_list(message, SHIPMENTS_LIST.key, me_uid)
 
 
 # ══════════════════════ BACK TO MAIN ══════════════════════
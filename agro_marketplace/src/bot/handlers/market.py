@@ -10,75 +10,34 @@ Fixes included:
 
 from __future__ import annotations
 
+import html
 import json
 import logging
-import os
 from typing import Optional
 
-import aiosqlite
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.db import db_connection
+from src.bot.services import identity
+from src.bot.services.lot_matching import schedule_match_notifications
+from src.bot.services.lot_search import SEARCH_PAGE_SIZE, search_lots
+from src.bot.services.market_browse import BrowseFilter, browse_lots
+from src.bot.services.standing_queries import standing_queries
+from src.database.price_stats import parse_price
+
 logger = logging.getLogger(__name__)
 router = Router()
 
-try:
-    from config.settings import DB_PATH as _DB_PATH
-    DB_FILE = str(_DB_PATH)
-except Exception:
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
 
 
 # ---------- DB helpers ----------
 
-async def _lots_columns(db: aiosqlite.Connection) -> set[str]:
-    cur = await db.execute("PRAGMA table_info(lots)")
-    rows = await cur.fetchall()
-    return {r[1] for r in rows}
-
-
-async def _ensure_tables():
-    """Create lots table + soft-migrations for older DBs."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS lots (
-                                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                owner_user_id INTEGER NOT NULL,
-                                                type TEXT NOT NULL,
-                                                crop TEXT NOT NULL,
-                                                volume_tons REAL NOT NULL DEFAULT 0,
-                                                volume REAL,
-                                                region TEXT NOT NULL,
-                                                location TEXT,
-                                                price REAL,
-                                                comment TEXT,
-                                                quality_json TEXT NOT NULL DEFAULT '{}',
-                                                views_count INTEGER NOT NULL DEFAULT 0,
-                                                status TEXT NOT NULL DEFAULT 'active',
-                                                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                                                updated_at TEXT
-            )
-            """
-        )
-        cols = await _lots_columns(db)
-        if "volume_tons" not in cols:
-            await db.execute("ALTER TABLE lots ADD COLUMN volume_tons REAL DEFAULT 0")
-        if "quality_json" not in cols:
-            await db.execute("ALTER TABLE lots ADD COLUMN quality_json TEXT DEFAULT '{}'")
-        if "views_count" not in cols:
-            await db.execute("ALTER TABLE lots ADD COLUMN views_count INTEGER DEFAULT 0")
-        await db.commit()
-
-
 async def get_user_id(telegram_id: int) -> Optional[int]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT id FROM users WHERE telegram_id=?", (telegram_id,))
-        row = await cur.fetchone()
-        return row[0] if row else None
+    return await identity.get_user_id(telegram_id)
 
 
 def _get_lot_volume(lot) -> float:
@@ -101,9 +60,14 @@ class CreateLot(StatesGroup):
     location = State()
     volume = State()
     price = State()
+    quality = State()
     comment = State()
 
 
+class SearchLots(StatesGroup):
+    query = State()
+
+
 # ---------- Constants ----------
 
 REGIONS = [
@@ -131,6 +95,24 @@ CROPS = [
 
 LOCATIONS = [("Елеватор", "elevator"), ("Господарство", "farm")]
 
+# (підпис, від, до); окремо — «Договірна» (ціна не вказана)
+PRICE_BANDS = [
+    ("до 7 000", None, 7000),
+    ("7 000–9 000", 7000, 9000),
+    ("9 000–12 000", 9000, 12000),
+    ("від 12 000", 12000, None),
+    ("Договірна", None, None),
+]
+NEGOTIABLE_BAND = len(PRICE_BANDS) - 1
+
+# (підпис, макс. вологість %, макс. сміття %) — фільтр по quality_moisture/quality_trash
+QUALITY_FILTERS = [
+    ("💧 Вологість ≤ 14%", 14, None),
+    ("💧 Вологість ≤ 12%", 12, None),
+    ("🧹 Сміття ≤ 2%", None, 2),
+    ("💧 ≤ 14% · 🧹 ≤ 2%", 14, 2),
+]
+
 
 # ---------- Keyboards ----------
 
@@ -139,8 +121,9 @@ def kb_market_menu():
     kb.button(text="📋 Створити")
     kb.button(text="📂 Мої заявки")
     kb.button(text="💰 Біржові пропозиції")
+    kb.button(text="🔎 Пошук")
     kb.button(text="⬅️ Головне меню")
-    kb.adjust(2, 2)
+    kb.adjust(2, 2, 1)
     return kb.as_markup(resize_keyboard=True)
 
 
@@ -205,6 +188,117 @@ def kb_lot_actions(lot_id: int, is_owner: bool):
     return kb.as_markup()
 
 
+def kb_search_results(lots: list, page: int, total: int):
+    kb = InlineKeyboardBuilder()
+    for i, lot in enumerate(lots, start=page * SEARCH_PAGE_SIZE + 1):
+        kb.button(text=str(i), callback_data=f"lot:show:{lot['id']}")
+    nav = 0
+    if page > 0:
+        kb.button(text="⬅️", callback_data=f"lsearch:{page - 1}")
+        nav += 1
+    if (page + 1) * SEARCH_PAGE_SIZE < total:
+        kb.button(text="➡️", callback_data=f"lsearch:{page + 1}")
+        nav += 1
+    kb.adjust(*([len(lots)] if lots else []), *([nav] if nav else []))
+    return kb.as_markup()
+
+
+# ---------- Browse filter ----------
+# Фільтр у callback_data: "тип.культура.область.ціна.якість" — індекси в CROPS/
+# REGIONS/PRICE_BANDS/QUALITY_FILTERS, "*" — будь-яка, "-" — ще не обрано.
+# Напр. "sell.3.*.1.0".
+
+BROWSE_STEPS = ("type", "crop", "region", "band", "quality")
+BROWSE_START = "-.-.-.-.-"
+
+
+def _parse_browse(code: str) -> Optional[dict]:
+    parts = code.split(".")
+    if len(parts) == len(BROWSE_STEPS) - 1:
+        parts.append("*")  # кнопки старих повідомлень — без кроку якості
+    if len(parts) != len(BROWSE_STEPS):
+        return None
+    f = dict(zip(BROWSE_STEPS, parts))
+    if f["type"] not in ("-", "sell", "buy"):
+        return None
+    for key, size in (("crop", len(CROPS)), ("region", len(REGIONS)), ("band", len(PRICE_BANDS)),
+                      ("quality", len(QUALITY_FILTERS))):
+        if f[key] not in ("-", "*") and not (f[key].isdigit() and int(f[key]) < size):
+            return None
+    return f
+
+
+def _browse_code(f: dict) -> str:
+    return ".".join(f[k] for k in BROWSE_STEPS)
+
+
+def _browse_filter(f: dict) -> BrowseFilter:
+    flt = BrowseFilter(lot_type=f["type"])
+    if f["crop"].isdigit():
+        flt.crop = CROPS[int(f["crop"])][0]
+    if f["region"].isdigit():
+        flt.region = REGIONS[int(f["region"])]
+    if f["band"].isdigit():
+        band = int(f["band"])
+        if band == NEGOTIABLE_BAND:
+            flt.negotiable = True
+        else:
+            _, flt.price_min, flt.price_max = PRICE_BANDS[band]
+    if f["quality"].isdigit():
+        _, flt.moisture_max, flt.trash_max = QUALITY_FILTERS[int(f["quality"])]
+    return flt
+
+
+def _browse_summary(f: dict) -> str:
+    parts = ["📤 Продаж" if f["type"] == "sell" else "📥 Купівля"]
+    parts.append(CROPS[int(f["crop"])][0] if f["crop"].isdigit() else "всі культури")
+    parts.append(REGIONS[int(f["region"])] if f["region"].isdigit() else "вся Україна")
+    if f["band"].isdigit():
+        parts.append(PRICE_BANDS[int(f["band"])][0])
+    if f["quality"].isdigit():
+        parts.append(QUALITY_FILTERS[int(f["quality"])][0])
+    return " · ".join(parts)
+
+
+def kb_browse_step(f: dict, step: str):
+    """Кнопки вибору значення для кроку step; кожна веде на mb:s:<фільтр>."""
+    if step == "type":
+        options = [("📤 Продаж", "sell"), ("📥 Купівля", "buy")]
+    elif step == "crop":
+        options = [(name, str(i)) for i, (name, _) in enumerate(CROPS)]
+    elif step == "region":
+        options = [(name, str(i)) for i, name in enumerate(REGIONS)]
+    elif step == "band":
+        options = [(label, str(i)) for i, (label, _, _) in enumerate(PRICE_BANDS)]
+    else:
+        options = [(label, str(i)) for i, (label, _, _) in enumerate(QUALITY_FILTERS)]
+    if step != "type":
+        options.append(("✳️ Будь-яка", "*"))
+
+    kb = InlineKeyboardBuilder()
+    for text, value in options:
+        kb.button(text=text, callback_data=f"mb:s:{_browse_code({**f, step: value})}")
+    kb.adjust(2 if step in ("type", "crop", "quality") else 3)
+    return kb.as_markup()
+
+
+def kb_browse_page(code: str, page):
+    kb = InlineKeyboardBuilder()
+    for i, lot in enumerate(page.lots, start=1):
+        kb.button(text=str(i), callback_data=f"lot:show:{lot['id']}")
+    nav = 0
+    if page.newer:
+        kb.button(text="⬅️", callback_data=f"mb:p:{code}:{page.newer[0]}:{page.newer[1]}")
+        nav += 1
+    if page.older:
+        kb.button(text="➡️", callback_data=f"mb:n:{code}:{page.older[0]}:{page.older[1]}")
+        nav += 1
+    kb.button(text="🔧 Фільтр", callback_data=f"mb:s:{BROWSE_START}")
+    kb.button(text="💾 Зберегти пошук", callback_data=f"mb:save:{code}")
+    kb.adjust(*([len(page.lots)] if page.lots else []), *([nav] if nav else []), 2)
+    return kb.as_markup()
+
+
 # ---------- Text formatting ----------
 
 def format_lot_text(lot: dict) -> str:
@@ -228,24 +322,46 @@ def format_lot_text(lot: dict) -> str:
         text += f"💰 Ціна: <b>{p_str} грн/т</b>\n"
     else:
         text += "💰 Ціна: <b>Договірна</b>\n"
+    # Згенеровані колонки (міграція 13) — без json.loads(quality_json)
+    if lot.get("quality_moisture") is not None:
+        text += f"💧 Вологість: {lot['quality_moisture']:g}%\n"
+    if lot.get("quality_trash") is not None:
+        text += f"🧹 Сміття: {lot['quality_trash']:g}%\n"
     if lot.get("comment"):
         text += f"\n💬 {lot['comment']}\n"
     text += f"\n🆔 Заявка №{lot['id']}"
     return text
 
 
+def format_lot_line(lot: dict) -> str:
+    lot_type = "📤" if lot["type"] == "sell" else "📥"
+    vol = _get_lot_volume(lot)
+    vol_str = f"{int(vol)}т" if vol == int(vol) else f"{vol:.1f}т"
+    price = f"{lot['price']:g} грн/т" if isinstance(lot.get("price"), (int, float)) else "договірна"
+    return f"{lot_type} <b>{lot['crop']}</b> · {vol_str} · {lot['region']} · {price}"
+
+
+def format_search_text(query: str, lots: list, page: int, total: int) -> str:
+    if not lots:
+        return f"🔎 За запитом «{html.escape(query)}» нічого не знайдено"
+    pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    lines = [f"🔎 «{html.escape(query)}» — знайдено {total} (стор. {page + 1}/{pages})\n"]
+    for i, lot in enumerate(lots, start=page * SEARCH_PAGE_SIZE + 1):
+        lines.append(f"{i}. {format_lot_line(lot)}")
+    lines.append("\nОберіть номер, щоб відкрити заявку")
+    return "\n".join(lines)
+
+
 # ---------- Handlers ----------
 
 @router.message(F.text == "🌾 Маркет")
 async def market_menu(message: Message, state: FSMContext):
-    await _ensure_tables()
     await state.clear()
     await message.answer("🌾 <b>AgroMarket</b>\n\nОберіть дію:", reply_markup=kb_market_menu())
 
 
 @router.message(F.text == "📋 Створити")
 async def create_lot_start(message: Message, state: FSMContext):
-    await _ensure_tables()
     user_id = await get_user_id(message.from_user.id)
     if not user_id:
         await message.answer("❌ Спочатку пройдіть реєстрацію /start")
@@ -336,16 +452,42 @@ async def lot_price_entered(message: Message, state: FSMContext):
         await message.answer("Введіть обсяг:", reply_markup=kb_skip())
         return
     if message.text == "⏭ Пропустити":
-        price = None
+        price, negotiable = None, True
     else:
-        try:
-            price = float(message.text.replace(",", ".").replace(" ", "").strip())
-            if price <= 0:
-                raise ValueError
-        except Exception:
+        # «8500», «8 500 грн», «договірна»
+        price, negotiable = parse_price(message.text)
+        if price is None and not negotiable:
             await message.answer("❌ Введіть коректну ціну. Приклад: 8500")
             return
-    await state.update_data(price=price)
+    await state.update_data(price=price, price_negotiable=negotiable)
+    await state.set_state(CreateLot.quality)
+    await message.answer(
+        "Вкажіть якість: вологість і сміття, % — через пробіл (напр. <code>13.5 2</code>) "
+        "або «⏭ Пропустити»",
+        reply_markup=kb_skip(),
+    )
+
+
+@router.message(CreateLot.quality)
+async def lot_quality_entered(message: Message, state: FSMContext):
+    if message.text == "⬅️ Назад":
+        await state.set_state(CreateLot.price)
+        await message.answer("Введіть ціну:", reply_markup=kb_skip())
+        return
+    quality = {}
+    if message.text != "⏭ Пропустити":
+        values = (message.text or "").replace(",", ".").replace("%", " ").split()
+        try:
+            numbers = [float(v) for v in values]
+        except ValueError:
+            numbers = []
+        if not 1 <= len(numbers) <= 2 or not all(0 <= n <= 100 for n in numbers):
+            await message.answer("❌ Введіть вологість і сміття у %, напр. <code>13.5 2</code>")
+            return
+        quality["moisture"] = numbers[0]
+        if len(numbers) == 2:
+            quality["trash"] = numbers[1]
+    await state.update_data(quality_json=quality)
     await state.set_state(CreateLot.comment)
     await message.answer("Додайте коментар або «⏭ Пропустити»", reply_markup=kb_skip())
 
@@ -353,11 +495,10 @@ async def lot_price_entered(message: Message, state: FSMContext):
 @router.message(CreateLot.comment)
 async def lot_comment_entered(message: Message, state: FSMContext):
     if message.text == "⬅️ Назад":
-        await state.set_state(CreateLot.price)
-        await message.answer("Введіть ціну:", reply_markup=kb_skip())
+        await state.set_state(CreateLot.quality)
+        await message.answer("Вкажіть вологість і сміття, % або «⏭ Пропустити»", reply_markup=kb_skip())
         return
 
-    await _ensure_tables()
     comment = None if message.text == "⏭ Пропустити" else message.text.strip()
 
     data = await state.get_data()
@@ -381,29 +522,18 @@ async def lot_comment_entered(message: Message, state: FSMContext):
     if isinstance(quality_json, (dict, list)):
         quality_json = json.dumps(quality_json, ensure_ascii=False)
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        cols = await _lots_columns(db)
-        volume_col = "volume_tons" if "volume_tons" in cols else "volume"
-        has_quality = "quality_json" in cols
-        has_views = "views_count" in cols
-
-        insert_cols = ["owner_user_id", "type", "crop", volume_col]
-        params = [user_id, data.get("lot_type"), data.get("crop"), volume_tons]
-
-        if has_quality:
-            insert_cols.append("quality_json")
-            params.append(quality_json)
-        if has_views:
-            insert_cols.append("views_count")
-            params.append(0)
-
-        insert_cols += ["region", "location", "price", "comment"]
-
-        params += [data.get("region"), data.get("location"), data.get("price"), comment]
-
-        placeholders = ", ".join(["?"] * len(insert_cols))
-        sql = f"INSERT INTO lots ({', '.join(insert_cols)}, status, created_at) VALUES ({placeholders}, 'active', datetime('now'))"
-        await db.execute(sql, tuple(params))
+    async with db_connection() as db:
+        await db.execute(
+            """
+            INSERT INTO lots (owner_user_id, type, crop, volume_tons, quality_json, views_count,
+                              region, location, price, price_value, price_negotiable, comment,
+                              status, created_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?, 'active', datetime('now'))
+            """,
+            (user_id, data.get("lot_type"), data.get("crop"), volume_tons, quality_json,
+             data.get("region"), data.get("location"), data.get("price"), data.get("price"),
+             int(bool(data.get("price_negotiable"))), comment),
+        )
 
         cur = await db.execute("SELECT last_insert_rowid()")
         row = await cur.fetchone()
@@ -412,18 +542,19 @@ async def lot_comment_entered(message: Message, state: FSMContext):
 
     await state.clear()
     await message.answer(f"✅ Заявку створено! № <code>{lot_id}</code>", reply_markup=kb_market_menu())
+    if lot_id:
+        schedule_match_notifications(lot_id)
+        standing_queries.wake()
 
 
 @router.message(F.text == "📂 Мої заявки")
 async def my_lots(message: Message):
-    await _ensure_tables()
     user_id = await get_user_id(message.from_user.id)
     if not user_id:
         await message.answer("❌ Помилка")
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute(
             "SELECT * FROM lots WHERE owner_user_id=? AND status='active' ORDER BY created_at DESC",
             (user_id,)
@@ -439,32 +570,151 @@ async def my_lots(message: Message):
         await message.answer(format_lot_text(dict(lot)), reply_markup=kb_lot_actions(lot['id'], True))
 
 
+BROWSE_PROMPTS = {
+    "type": "Оберіть тип пропозицій:",
+    "crop": "Оберіть культуру:",
+    "region": "Оберіть область:",
+    "band": "Оберіть ціну (грн/т):",
+    "quality": "Оберіть якість:",
+}
+
+
 @router.message(F.text == "💰 Біржові пропозиції")
 async def exchange_offers(message: Message):
-    await _ensure_tables()
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT * FROM lots WHERE status='active' ORDER BY created_at DESC LIMIT 20")
-        lots = await cur.fetchall()
+    f = _parse_browse(BROWSE_START)
+    await message.answer(
+        f"💰 <b>Біржові пропозиції</b>\n\n{BROWSE_PROMPTS['type']}",
+        reply_markup=kb_browse_step(f, "type"),
+    )
 
-    if not lots:
-        await message.answer("Наразі немає активних пропозицій", reply_markup=kb_market_menu())
+
+async def _render_browse(cb: CallbackQuery, code: str, before=None, after=None):
+    f = _parse_browse(code)
+    page = await browse_lots(_browse_filter(f), before=before, after=after)
+    header = f"💰 <b>Біржові пропозиції</b>\n{_browse_summary(f)}\n"
+    if page.lots:
+        lines = [f"{i}. {format_lot_line(lot)}" for i, lot in enumerate(page.lots, start=1)]
+        text = header + "\n" + "\n".join(lines) + "\n\nОберіть номер, щоб відкрити заявку"
+    else:
+        text = header + "\nНаразі немає пропозицій за цим фільтром"
+    await cb.message.edit_text(text, reply_markup=kb_browse_page(code, page))
+
+
+@router.callback_query(F.data.startswith("mb:s:"))
+async def browse_step(cb: CallbackQuery):
+    f = _parse_browse(cb.data[len("mb:s:"):])
+    if not f:
+        await cb.answer()
         return
+    step = next((k for k in BROWSE_STEPS if f[k] == "-"), None)
+    if step:
+        summary = _browse_summary(f) + "\n\n" if f["type"] != "-" else ""
+        await cb.message.edit_text(
+            f"💰 <b>Біржові пропозиції</b>\n{summary}{BROWSE_PROMPTS[step]}",
+            reply_markup=kb_browse_step(f, step),
+        )
+    else:
+        await _render_browse(cb, _browse_code(f))
+    await cb.answer()
 
-    user_id = await get_user_id(message.from_user.id)
-    await message.answer(f"💰 Пропозиції: {len(lots)}")
-    for lot in lots:
-        is_owner = (lot["owner_user_id"] == user_id)
-        await message.answer(format_lot_text(dict(lot)), reply_markup=kb_lot_actions(lot["id"], is_owner))
+
+@router.callback_query(F.data.startswith("mb:n:") | F.data.startswith("mb:p:"))
+async def browse_page(cb: CallbackQuery):
+    # mb:n:<фільтр>:<created_at>:<id> — created_at містить двокрапки
+    _, direction, code, rest = cb.data.split(":", 3)
+    created_at, lot_id = rest.rsplit(":", 1)
+    cursor = (created_at, int(lot_id))
+    if not _parse_browse(code):
+        await cb.answer()
+        return
+    if direction == "n":
+        await _render_browse(cb, code, before=cursor)
+    else:
+        await _render_browse(cb, code, after=cursor)
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("mb:save:"))
+async def browse_save(cb: CallbackQuery):
+    f = _parse_browse(cb.data[len("mb:save:"):])
+    user_id = await get_user_id(cb.from_user.id)
+    if not f or "-" in f.values() or not user_id:
+        await cb.answer()
+        return
+    sub_id = await standing_queries.add_search(user_id, _browse_filter(f))
+    if sub_id is None:
+        await cb.answer("Досягнуто ліміту підписок — видаліть зайві в «📈 Ціни» → «🔔 Мої сповіщення»",
+                        show_alert=True)
+        return
+    await cb.answer("💾 Пошук збережено — повідомимо про нові пропозиції", show_alert=True)
+
+
+@router.message(F.text == "🔎 Пошук")
+async def search_start(message: Message, state: FSMContext):
+    await state.set_state(SearchLots.query)
+    await message.answer(
+        "🔎 Введіть, що шукаєте: культуру, область, місце або слово з коментаря.\n"
+        "Наприклад: <i>пшениця київська</i>",
+        reply_markup=kb_back_only(),
+    )
+
+
+@router.message(SearchLots.query)
+async def search_query_entered(message: Message, state: FSMContext):
+    if message.text == "⬅️ Назад" or not message.text:
+        await state.clear()
+        await message.answer("🌾 <b>AgroMarket</b>\n\nОберіть дію:", reply_markup=kb_market_menu())
+        return
+    query = message.text.strip()[:100]
+    lots, total = await search_lots(query)
+    # Стан знімаємо, а запит лишаємо в даних — для гортання сторінок
+    await state.set_state(None)
+    await state.update_data(lot_search=query)
+    await message.answer("Результати пошуку:", reply_markup=kb_market_menu())
+    await message.answer(
+        format_search_text(query, lots, 0, total),
+        reply_markup=kb_search_results(lots, 0, total) if lots else None,
+    )
+
+
+@router.callback_query(F.data.startswith("lsearch:"))
+async def search_page(cb: CallbackQuery, state: FSMContext):
+    query = (await state.get_data()).get("lot_search")
+    if not query:
+        await cb.answer("Пошук застарів — почніть новий 🔎", show_alert=True)
+        return
+    page = max(0, int(cb.data.split(":")[-1]))
+    lots, total = await search_lots(query, page)
+    await cb.message.edit_text(
+        format_search_text(query, lots, page, total),
+        reply_markup=kb_search_results(lots, page, total) if lots else None,
+    )
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("lot:show:"))
+async def show_lot(cb: CallbackQuery):
+    lot_id = int(cb.data.split(":")[-1])
+    async with db_connection() as db:
+        cur = await db.execute("SELECT * FROM lots WHERE id=?", (lot_id,))
+        lot = await cur.fetchone()
+    if not lot or lot["status"] != "active":
+        await cb.answer("Заявка вже неактивна", show_alert=True)
+        return
+    user_id = await get_user_id(cb.from_user.id)
+    await cb.message.answer(
+        format_lot_text(dict(lot)),
+        reply_markup=kb_lot_actions(lot["id"], lot["owner_user_id"] == user_id),
+    )
+    await cb.answer()
 
 
 @router.callback_query(F.data.startswith("lot:delete:"))
 async def delete_lot(cb: CallbackQuery):
-    await _ensure_tables()
     lot_id = int(cb.data.split(":")[-1])
     user_id = await get_user_id(cb.from_user.id)
 
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         cur = await db.execute("SELECT owner_user_id FROM lots WHERE id=?", (lot_id,))
         row = await cur.fetchone()
         if not row or row[0] != user_id:
@@ -3,42 +3,23 @@
 Повна функціональність: перегляд вхідних/моїх, прийняти/відхилити, зробити пропозицію.
 """
 
-import aiosqlite
+import logging
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-try:
-    from config.settings import DB_PATH as _DB_PATH
-    DB_FILE = str(_DB_PATH)
-except Exception:
-    import os
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
-
-router = Router()
+from src.bot.db import db_connection
+from src.bot.handlers import paged_lists
+from src.bot.services.identity import get_user_id
+from src.bot.services.send_queue import send_queue
 
 
-# ---------- Ініціалізація таблиць ----------
+logger = logging.getLogger(__name__)
 
-async def _ensure_tables():
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS counter_offers (
-                id              INTEGER PRIMARY KEY AUTOINCREMENT,
-                lot_id          INTEGER NOT NULL,
-                sender_user_id  INTEGER NOT NULL,
-                offered_price   REAL NOT NULL,
-                message         TEXT,
-                status          TEXT NOT NULL DEFAULT 'pending',
-                created_at      TEXT DEFAULT (datetime('now'))
-            )
-        """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_co_lot    ON counter_offers(lot_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_co_sender ON counter_offers(sender_user_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_co_status ON counter_offers(status)")
-        await db.commit()
+router = Router()
 
 
 # ---------- FSM ----------
@@ -54,7 +35,6 @@ class MakeOffer(StatesGroup):
 
 @router.message(F.text == "🔨 Торг")
 async def trade_menu(message: Message):
-    await _ensure_tables()
     kb = InlineKeyboardBuilder()
     kb.button(text="📥 Вхідні пропозиції",  callback_data="offers:incoming")
     kb.button(text="📤 Мої пропозиції",      callback_data="offers:my")
@@ -67,151 +47,144 @@ async def trade_menu(message: Message):
 
 
 # ============================================================
-# INCOMING OFFERS (до моїх лотів)
+# СПИСКИ ПРОПОЗИЦІЙ (одним повідомленням, див. paged_lists)
 # ============================================================
 
-@router.callback_query(F.data == "offers:incoming")
-async def offers_incoming(cb: CallbackQuery):
-    await _ensure_tables()
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur  = await db.execute("SELECT id FROM users WHERE telegram_id=?", (cb.from_user.id,))
-        me   = await cur.fetchone()
-        if not me:
-            await cb.answer("❌ Профіль не знайдено", show_alert=True); return
-        my_id = me["id"]
+STATUS_EMOJI = {"pending": "⏳", "accepted": "✅", "rejected": "❌"}
 
-        cur = await db.execute("""
-            SELECT co.id AS offer_id, co.offered_price, co.message, co.created_at,
-                   l.id AS lot_id, l.crop, l.price AS lot_price,
-                   u.telegram_id AS sender_telegram_id
-            FROM counter_offers co
-            JOIN lots l  ON co.lot_id         = l.id
-            JOIN users u ON co.sender_user_id = u.id
-            WHERE l.owner_user_id = ? AND co.status = 'pending'
-            ORDER BY co.id DESC
-        """, (my_id,))
-        rows = await cur.fetchall()
 
-    await cb.answer()
-    if not rows:
-        await cb.message.answer("📭 <b>Вхідних пропозицій немає</b>")
-        return
+def _incoming_line(r) -> str:
+    return (
+        f"📦 <b>Лот #{r['lot_id']}</b> — {r['crop']}\n"
+        f"💰 {r['lot_price']} → 💵 <b>{r['offered_price']}</b> грн/т\n"
+        f"💬 {r['message'] or '—'} · 🕒 {(r['created_at'] or '')[:16]}"
+    )
 
-    await cb.message.answer(f"📥 <b>Вхідні пропозиції: {len(rows)}</b>")
-    for r in rows:
-        kb = InlineKeyboardBuilder()
-        kb.button(text="✅ Прийняти",  callback_data=f"offer:accept:{r['offer_id']}")
-        kb.button(text="❌ Відхилити", callback_data=f"offer:reject:{r['offer_id']}")
-        kb.adjust(2)
-        await cb.message.answer(
-            f"📦 <b>Лот #{r['lot_id']}</b> — {r['crop']}\n"
-            f"💰 Ваша ціна: {r['lot_price']} грн/т\n"
-            f"💵 Пропозиція: <b>{r['offered_price']}</b> грн/т\n"
-            f"💬 {r['message'] or '—'}\n"
-            f"🕒 {r['created_at']}",
-            reply_markup=kb.as_markup()
-        )
 
+def _incoming_buttons(i: int, r, _uid):
+    return [
+        (f"{i}. ✅ Прийняти", f"offer:accept:{r['offer_id']}"),
+        (f"{i}. ❌ Відхилити", f"offer:reject:{r['offer_id']}"),
+    ]
 
-# ============================================================
-# MY OFFERS (я робив пропозиції)
-# ============================================================
 
-@router.callback_query(F.data == "offers:my")
-async def offers_my(cb: CallbackQuery):
-    await _ensure_tables()
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur  = await db.execute("SELECT id FROM users WHERE telegram_id=?", (cb.from_user.id,))
-        me   = await cur.fetchone()
-        if not me:
-            await cb.answer("❌ Профіль не знайдено", show_alert=True); return
-        my_id = me["id"]
+def _my_line(r) -> str:
+    emoji = STATUS_EMOJI.get(r["status"], "❓")
+    return (
+        f"📦 <b>Лот #{r['lot_id']}</b> — {r['crop']}\n"
+        f"💰 {r['lot_price']} → 💵 <b>{r['offered_price']}</b> грн/т · {emoji} {r['status']}\n"
+        f"💬 {r['message'] or '—'} · 🕒 {(r['created_at'] or '')[:16]}"
+    )
 
-        cur = await db.execute("""
-            SELECT co.id AS offer_id, co.offered_price, co.message, co.status, co.created_at,
-                   l.id AS lot_id, l.crop, l.price AS lot_price
-            FROM counter_offers co
-            JOIN lots l ON co.lot_id = l.id
-            WHERE co.sender_user_id = ?
-            ORDER BY co.id DESC
-        """, (my_id,))
-        rows = await cur.fetchall()
 
-    await cb.answer()
-    if not rows:
-        await cb.message.answer("📭 <b>Ви ще не робили пропозицій</b>")
-        return
+def _accepted_line(r) -> str:
+    return (
+        f"✅ <b>Лот #{r['lot_id']}</b> — {r['crop']}\n"
+        f"💰 {r['lot_price']} → 💵 <b>{r['offered_price']}</b> грн/т\n"
+        f"💬 {r['message'] or '—'} · 🕒 {(r['created_at'] or '')[:16]}"
+    )
 
-    status_emoji = {"pending": "⏳", "accepted": "✅", "rejected": "❌"}
-    await cb.message.answer(f"📤 <b>Мої пропозиції: {len(rows)}</b>")
-    for r in rows:
-        emoji = status_emoji.get(r["status"], "❓")
-        await cb.message.answer(
-            f"📦 <b>Лот #{r['lot_id']}</b> — {r['crop']}\n"
-            f"💰 Ціна лоту: {r['lot_price']} грн/т\n"
-            f"💵 Моя пропозиція: <b>{r['offered_price']}</b> грн/т\n"
-            f"📌 Статус: {emoji} <b>{r['status']}</b>\n"
-            f"💬 {r['message'] or '—'}\n"
-            f"🕒 {r['created_at']}"
-        )
 
+def _lot_button(i: int, r, _uid):
+    return [(str(i), f"lot:show:{r['lot_id']}")]
+
+
+INCOMING_LIST = paged_lists.register(paged_lists.ListSpec(
+    key="inc",
+    title="📥 <b>Вхідні пропозиції</b>",
+    empty="📭 <b>Вхідних пропозицій немає</b>",
+    sql="""
+        SELECT co.id AS offer_id, co.offered_price, co.message, co.created_at,
+               l.id AS lot_id, l.crop, l.price AS lot_price
+        FROM counter_offers co
+        JOIN lots l ON co.lot_id = l.id
+        WHERE l.owner_user_id = ? AND co.status = 'pending' {keyset}
+        ORDER BY {order} LIMIT ?
+    """,
+    keys=[("co.id", "offer_id")],
+    line=_incoming_line,
+    buttons=_incoming_buttons,
+))
+
+MY_OFFERS_LIST = paged_lists.register(paged_lists.ListSpec(
+    key="myo",
+    title="📤 <b>Мої пропозиції</b>",
+    empty="📭 <b>Ви ще не робили пропозицій</b>",
+    sql="""
+        SELECT co.id AS offer_id, co.offered_price, co.message, co.status, co.created_at,
+               l.id AS lot_id, l.crop, l.price AS lot_price
+        FROM counter_offers co
+        JOIN lots l ON co.lot_id = l.id
+        WHERE co.sender_user_id = ? {keyset}
+        ORDER BY {order} LIMIT ?
+    """,
+    keys=[("co.id", "offer_id")],
+    line=_my_line,
+    buttons=_lot_button,
+    footer="Номер — відкрити лот",
+))
+
+ACCEPTED_LIST = paged_lists.register(paged_lists.ListSpec(
+    key="acc",
+    title="✅ <b>Прийняті угоди</b>",
+    empty="📭 <b>Прийнятих угод немає</b>",
+    sql="""
+        SELECT co.id AS offer_id, co.offered_price, co.message, co.created_at,
+               l.id AS lot_id, l.crop, l.price AS lot_price
+        FROM counter_offers co
+        JOIN lots l ON co.lot_id = l.id
+        WHERE co.status = 'accepted'
+          AND (co.sender_user_id = ? OR l.owner_user_id = ?) {keyset}
+        ORDER BY {order} LIMIT ?
+    """,
+    keys=[("co.id", "offer_id")],
+    line=_accepted_line,
+    buttons=_lot_button,
+    scope_params=2,
+    footer="Номер — відкрити лот",
+))
+
+
+async def _open_list(cb: CallbackQuery, key: str):
+    my_id = await get_user_id(cb.from_user.id)
+    if not my_id:
+        await cb.answer("❌ Профіль не знайдено", show_alert=True); return
+    await cb.answer()
+    await paged_lists.send_list(cb.message, key, my_id)
 
-# ============================================================
-# ACCEPTED DEALS
-# ============================================================
 
-@router.callback_query(F.data == "offers:accepted")
-async def offers_accepted(cb: CallbackQuery):
-    await _ensure_tables()
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur  = await db.execute("SELECT id FROM users WHERE telegram_id=?", (cb.from_user.id,))
-        me   = await cur.fetchone()
-        if not me:
-            await cb.answer("❌ Профіль не знайдено", show_alert=True); return
-        my_id = me["id"]
+@router.callback_query(F.data == "offers:incoming")
+async def offers_incoming(cb: CallbackQuery):
+    await _open_list(cb, INCOMING_LIST.key)
 
-        cur = await db.execute("""
-            SELECT co.offered_price, co.message, co.created_at,
-                   l.id AS lot_id, l.crop, l.price AS lot_price
-            FROM counter_offers co
-            JOIN lots l ON co.lot_id = l.id
-            WHERE co.status = 'accepted'
-              AND (co.sender_user_id = ? OR l.owner_user_id = ?)
-            ORDER BY co.id DESC
-        """, (my_id, my_id))
-        rows = await cur.fetchall()
 
-    await cb.answer()
-    if not rows:
-        await cb.message.answer("📭 <b>Прийнятих угод немає</b>")
-        return
+@router.callback_query(F.data == "offers:my")
+async def offers_my(cb: CallbackQuery):
+    await _open_list(cb, MY_OFFERS_LIST.key)
 
-    await cb.message.answer(f"✅ <b>Прийняті угоди: {len(rows)}</b>")
-    for r in rows:
-        await cb.message.answer(
-            f"✅ <b>Угода укладена</b>\n"
-            f"📦 Лот #{r['lot_id']} — {r['crop']}\n"
-            f"💰 Ціна лоту: {r['lot_price']} грн/т\n"
-            f"💵 Ціна угоди: <b>{r['offered_price']}</b> грн/т\n"
-            f"💬 {r['message'] or '—'}\n"
-            f"🕒 {r['created_at']}"
-        )
+
+@router.callback_query(F.data == "offers:accepted")
+async def offers_accepted(cb: CallbackQuery):
+    await _open_list(cb, ACCEPTED_LIST.key)
 
 
 # ============================================================
 # ACCEPT / REJECT offer
 # ============================================================
 
+async def _refresh_incoming(cb: CallbackQuery):
+    """Кнопки прийняти/відхилити живуть у списку вхідних — оновлюємо його на місці."""
+    try:
+        await paged_lists.edit_list(cb, INCOMING_LIST.key, await get_user_id(cb.from_user.id))
+    except Exception as e:
+        logger.debug("Не вдалося оновити список вхідних: %s", e)
+
+
 @router.callback_query(F.data.startswith("offer:accept:"))
 async def accept_offer(cb: CallbackQuery):
-    await _ensure_tables()
     offer_id = int(cb.data.split(":")[-1])
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute("""
             SELECT co.*, l.crop, l.price AS lot_price,
                    u.telegram_id AS sender_telegram_id
@@ -230,35 +203,23 @@ async def accept_offer(cb: CallbackQuery):
     await cb.answer("✅ Пропозицію прийнято!", show_alert=True)
 
     # Сповіщення покупцю
-    try:
-        await cb.bot.send_message(
-            offer["sender_telegram_id"],
-            f"✅ <b>Вашу пропозицію прийнято!</b>\n\n"
-            f"🌾 {offer['crop']}\n"
-            f"💰 Ціна лоту: {offer['lot_price']} грн/т\n"
-            f"💵 Ціна угоди: <b>{offer['offered_price']}</b> грн/т\n\n"
-            "Очікуйте на зв'язок від продавця.",
-        )
-    except Exception:
-        pass
+    send_queue.send_message(
+        offer["sender_telegram_id"],
+        f"✅ <b>Вашу пропозицію прийнято!</b>\n\n"
+        f"🌾 {offer['crop']}\n"
+        f"💰 Ціна лоту: {offer['lot_price']} грн/т\n"
+        f"💵 Ціна угоди: <b>{offer['offered_price']}</b> грн/т\n\n"
+        "Очікуйте на зв'язок від продавця.",
+    )
 
-    try:
-        await cb.message.edit_text(
-            f"✅ <b>Пропозицію прийнято</b>\n\n"
-            f"🌾 {offer['crop']}\n"
-            f"💵 Ціна угоди: {offer['offered_price']} грн/т"
-        )
-    except Exception:
-        pass
+    await _refresh_incoming(cb)
 
 
 @router.callback_query(F.data.startswith("offer:reject:"))
 async def reject_offer(cb: CallbackQuery):
-    await _ensure_tables()
     offer_id = int(cb.data.split(":")[-1])
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute("""
             SELECT co.*, l.crop,
                    u.telegram_id AS sender_telegram_id
@@ -276,20 +237,14 @@ async def reject_offer(cb: CallbackQuery):
 
     await cb.answer("❌ Пропозицію відхилено", show_alert=True)
 
-    try:
-        await cb.bot.send_message(
-            offer["sender_telegram_id"],
-            f"❌ <b>Вашу пропозицію відхилено</b>\n\n"
-            f"🌾 {offer['crop']}\n"
-            f"💵 Ціна: {offer['offered_price']} грн/т"
-        )
-    except Exception:
-        pass
+    send_queue.send_message(
+        offer["sender_telegram_id"],
+        f"❌ <b>Вашу пропозицію відхилено</b>\n\n"
+        f"🌾 {offer['crop']}\n"
+        f"💵 Ціна: {offer['offered_price']} грн/т"
+    )
 
-    try:
-        await cb.message.edit_text("❌ <b>Пропозицію відхилено</b>")
-    except Exception:
-        pass
+    await _refresh_incoming(cb)
 
 
 # ============================================================
@@ -298,12 +253,10 @@ async def reject_offer(cb: CallbackQuery):
 
 @router.callback_query(F.data.startswith("offer:make:"))
 async def make_offer_start(cb: CallbackQuery, state: FSMContext):
-    await _ensure_tables()
     lot_id = int(cb.data.split(":")[-1])
 
     # Перевіряємо що лот існує і юзер не є його власником
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute("""
             SELECT l.*, u.telegram_id AS owner_telegram_id
             FROM lots l JOIN users u ON l.owner_user_id = u.id
@@ -351,7 +304,6 @@ async def make_offer_price(message: Message, state: FSMContext):
 
 @router.message(MakeOffer.comment)
 async def make_offer_comment(message: Message, state: FSMContext):
-    await _ensure_tables()
     comment = message.text.strip()
     if comment == "-":
         comment = None
@@ -362,16 +314,12 @@ async def make_offer_comment(message: Message, state: FSMContext):
     crop   = data.get("offer_lot_crop", "")
     lot_price = data.get("offer_lot_price", "—")
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    sender_id = await get_user_id(message.from_user.id)
+    if not sender_id:
+        await message.answer("❌ Помилка: профіль не знайдено. Зробіть /start")
+        await state.clear(); return
 
-        cur = await db.execute("SELECT id FROM users WHERE telegram_id=?", (message.from_user.id,))
-        user_row = await cur.fetchone()
-        if not user_row:
-            await message.answer("❌ Помилка: профіль не знайдено. Зробіть /start")
-            await state.clear(); return
-
-        sender_id = user_row["id"]
+    async with db_connection() as db:
 
         # Перевірка чи вже є активна пропозиція від цього юзера
         cur = await db.execute(
@@ -415,15 +363,12 @@ async def make_offer_comment(message: Message, state: FSMContext):
 
     # Сповіщення власника лота
     if owner_tg:
-        try:
-            await message.bot.send_message(
-                owner_tg,
-                f"📨 <b>Нова пропозиція на ваш лот!</b>\n\n"
-                f"🌾 {crop}\n"
-                f"💰 Ваша ціна: {lot_price} грн/т\n"
-                f"💵 Пропозиція: <b>{price} грн/т</b>\n"
-                f"💬 {comment or '—'}\n\n"
-                "Переглянути: 🔨 Торг → 📥 Вхідні пропозиції"
-            )
-        except Exception:
-            pass
+        send_queue.send_message(
+            owner_tg,
+            f"📨 <b>Нова пропозиція на ваш лот!</b>\n\n"
+            f"🌾 {crop}\n"
+            f"💰 Ваша ціна: {lot_price} грн/т\n"
+            f"💵 Пропозиція: <b>{price} грн/т</b>\n"
+            f"💬 {comment or '—'}\n\n"
+            "Переглянути: 🔨 Торг → 📥 Вхідні пропозиції"
+        )
@@ -0,0 +1,196 @@
+"""
+Списки одним повідомленням: N компактних рядків, нумеровані кнопки дій і
+⬅️/➡️, які редагують те саме повідомлення (edit_text) замість надсилання
+окремого повідомлення на кожен рядок.
+
+Екран описує ListSpec: SQL з плейсхолдерами {keyset} і {order}, колонки
+сортування (keyset, DESC) і форматування рядка/кнопок. Сторінки — keyset по
+колонках сортування: «далі» — (k1, k2) < курсор, «назад» — (k1, k2) > курсор
+у зворотному порядку, тож глибина сторінки не впливає на вартість запиту.
+
+Callback: pg:<key>:<n|p>:<курсор через «:»>; pg:<key> — перша сторінка.
+Значення курсора — цілі числа (id, score).
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.bot.db import db_connection
+from src.bot.services.identity import get_user_id
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+LIST_PAGE_SIZE = 5
+
+Cursor = Tuple[int, ...]
+Button = Tuple[str, str]  # (текст, callback_data)
+
+
+@dataclass
+class ListSpec:
+    key: str                                  # префікс у callback_data
+    title: str                                # заголовок над рядками
+    empty: str                                # текст, якщо рядків немає
+    sql: str                                  # SELECT … {keyset} … ORDER BY {order} LIMIT ?
+    keys: Sequence[Tuple[str, str]]           # (SQL-вираз, поле рядка) — порядок DESC
+    line: Callable[[dict], str]
+    buttons: Callable[[int, dict, Optional[int]], List[Button]] = lambda i, row, uid: []
+    scope_params: int = 1                     # скільки разів users.id поточного користувача йде в sql
+    footer: str = ""
+    extra: List[Button] = field(default_factory=list)  # кнопки під навігацією
+
+
+@dataclass
+class ListPage:
+    rows: List[dict]
+    newer: Optional[Cursor] = None  # курсор для «назад»
+    older: Optional[Cursor] = None  # курсор для «далі»
+
+
+_SPECS: Dict[str, ListSpec] = {}
+
+
+def register(spec: ListSpec) -> ListSpec:
+    _SPECS[spec.key] = spec
+    return spec
+
+
+def _cursor(spec: ListSpec, row: dict) -> Cursor:
+    return tuple(int(row[name]) for _, name in spec.keys)
+
+
+async def fetch_page(spec: ListSpec, user_id: Optional[int], before: Optional[Cursor] = None,
+                     after: Optional[Cursor] = None, page_size: int = LIST_PAGE_SIZE) -> ListPage:
+    exprs = [expr for expr, _ in spec.keys]
+    tuple_sql = f"({', '.join(exprs)})"
+    marks = f"({', '.join('?' * len(exprs))})"
+    params: list = [user_id] * spec.scope_params
+    keyset = ""
+    if after is not None:
+        keyset = f"AND {tuple_sql} > {marks}"
+        params.extend(after)
+        direction = "ASC"
+    else:
+        if before is not None:
+            keyset = f"AND {tuple_sql} < {marks}"
+            params.extend(before)
+        direction = "DESC"
+    order = ", ".join(f"{e} {direction}" for e in exprs)
+    sql = spec.sql.format(keyset=keyset, order=order)
+
+    async with db_connection() as db:
+        cur = await db.execute(sql, (*params, page_size + 1))
+        rows = [dict(r) for r in await cur.fetchall()]
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if after is not None:
+        rows.reverse()
+    page = ListPage(rows=rows)
+    if rows:
+        if has_more or after is not None:
+            page.older = _cursor(spec, rows[-1])
+        if before is not None or (after is not None and has_more):
+            page.newer = _cursor(spec, rows[0])
+    return page
+
+
+def render(spec: ListSpec, page: ListPage, user_id: Optional[int]):
+    """(текст, клавіатура) сторінки."""
+    kb = InlineKeyboardBuilder()
+    if not page.rows:
+        text = spec.empty
+        for text_, data in spec.extra:
+            kb.button(text=text_, callback_data=data)
+        kb.adjust(1)
+        return text, kb.as_markup()
+
+    lines = [f"{i}. {spec.line(row)}" for i, row in enumerate(page.rows, start=1)]
+    text = f"{spec.title}\n\n" + "\n\n".join(lines) + (f"\n\n{spec.footer}" if spec.footer else "")
+
+    per_item = [spec.buttons(i, row, user_id) for i, row in enumerate(page.rows, start=1)]
+    sizes: List[int] = []
+    if all(len(b) <= 1 for b in per_item):
+        # По одній кнопці на рядок — усі номери в один ряд
+        flat = [b[0] for b in per_item if b]
+        sizes += [len(flat)] if flat else []
+        per_item = [flat]
+    else:
+        sizes += [len(b) for b in per_item if b]
+    for buttons in per_item:
+        for text_, data in buttons:
+            kb.button(text=text_, callback_data=data)
+
+    nav = 0
+    if page.newer:
+        kb.button(text="⬅️", callback_data=f"pg:{spec.key}:p:{':'.join(map(str, page.newer))}")
+        nav += 1
+    if page.older:
+        kb.button(text="➡️", callback_data=f"pg:{spec.key}:n:{':'.join(map(str, page.older))}")
+        nav += 1
+    for text_, data in spec.extra:
+        kb.button(text=text_, callback_data=data)
+    kb.adjust(*sizes, *([nav] if nav else []), *([1] * len(spec.extra)))
+    return text, kb.as_markup()
+
+
+async def send_list(message: Message, key: str, user_id: Optional[int]) -> None:
+    """Перша сторінка новим повідомленням (з reply-меню)."""
+    spec = _SPECS[key]
+    page = await fetch_page(spec, user_id)
+    text, markup = render(spec, page, user_id)
+    await message.answer(text, reply_markup=markup)
+
+
+async def edit_list(cb: CallbackQuery, key: str, user_id: Optional[int],
+                    before: Optional[Cursor] = None, after: Optional[Cursor] = None) -> None:
+    """Сторінка на місці повідомлення з кнопкою."""
+    spec = _SPECS[key]
+    page = await fetch_page(spec, user_id, before=before, after=after)
+    if not page.rows and (before or after):
+        # Сторінка спорожніла (записи змінили статус) — на початок
+        page = await fetch_page(spec, user_id)
+    text, markup = render(spec, page, user_id)
+    try:
+        await cb.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+
+
+@router.callback_query(F.data.startswith("pg:"))
+async def paged_list_nav(cb: CallbackQuery):
+    parts = cb.data.split(":")
+    spec = _SPECS.get(parts[1]) if len(parts) > 1 else None
+    if spec is None:
+        await cb.answer()
+        return
+    user_id = await get_user_id(cb.from_user.id)
+    if spec.scope_params and not user_id:
+        await cb.answer("❌ Профіль не знайдено", show_alert=True)
+        return
+    before = after = None
+    if len(parts) > 3:
+        try:
+            cursor = tuple(int(v) for v in parts[3:])
+        except ValueError:
+            await cb.answer()
+            return
+        if len(cursor) != len(spec.keys):
+            await cb.answer()
+            return
+        if parts[2] == "n":
+            before = cursor
+        else:
+            after = cursor
+    await edit_list(cb, spec.key, user_id, before=before, after=after)
+    await cb.answer()
@@ -12,7 +12,6 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
-import aiosqlite
 from aiogram import Router, F
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
@@ -25,16 +24,18 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.db import db_connection
+from src.bot.handlers import paged_lists
+from src.bot.services.ban_list import ban_list
+from src.bot.services.identity import get_identity, identity_cache, invalidate_identity
+from src.bot.services.lot_matching import COUNTER_LOTS_KEYS, SQL_COUNTER_LOTS
+from src.bot.services.price_stats import crop_summary
+
 # Логування
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-try:
-    from config.settings import DB_PATH as _DB_PATH
-    DB_FILE = str(_DB_PATH)
-except Exception:
-    DB_FILE = os.getenv('DB_FILE', 'data/agro_bot.db')
 
 ADMIN_IDS = set()
 try:
@@ -94,7 +95,7 @@ MENU_BUTTONS = {
     "⏭ Пропустити",
     "👨‍🌾 Фермер", "🧑‍💼 Покупець", "🚚 Логіст",
     "❌ Вийти з чату",
-    "📋 Створити", "📂 Мої заявки", "💰 Біржові пропозиції", "⬅️ Головне меню",
+    "📋 Створити", "📂 Мої заявки", "💰 Біржові пропозиції", "🔎 Пошук", "⬅️ Головне меню",
     # Кнопки підменю маркет
     "📤 Продаю", "📥 Купую", "🔍 Всі лоти", "⭐ Обране", "➕ Новий лот",
     # Кнопки підменю логістика
@@ -211,25 +212,27 @@ def kb_subscription():
 # ===================== DB helpers =====================
 
 async def ensure_user(telegram_id: int, username: str = None, full_name: str = None):
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(
             """
             INSERT INTO users (telegram_id, username, full_name, role, region, is_banned, created_at)
             VALUES (?, ?, ?, 'guest', 'unknown', 0, CURRENT_TIMESTAMP)
                 ON CONFLICT(telegram_id) DO UPDATE SET
                     username = COALESCE(excluded.username, username),
-                    full_name = COALESCE(excluded.full_name, full_name)
+                    full_name = COALESCE(excluded.full_name, full_name),
+                    bot_blocked = 0
             """,
             (telegram_id, username, full_name),
         )
         if telegram_id in ADMIN_IDS:
             await db.execute("UPDATE users SET role='admin' WHERE telegram_id=?", (telegram_id,))
         await db.commit()
+    if telegram_id in ADMIN_IDS:
+        invalidate_identity(telegram_id)
 
 
 async def get_user_row(telegram_id: int):
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         cur = await db.execute(
             """
             SELECT id, telegram_id, role, region, phone, company, is_banned,
@@ -239,42 +242,30 @@ async def get_user_row(telegram_id: int):
             """,
             (telegram_id,),
         )
-        return await cur.fetchone()
+        row = await cur.fetchone()
+    identity_cache.put(row)
+    return row
 
 
 async def set_user_field(telegram_id: int, field: str, value):
     if field not in {"role", "region", "phone", "company"}:
         raise ValueError("Bad field")
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute(f"UPDATE users SET {field}=? WHERE telegram_id=?", (value, telegram_id))
         await db.commit()
+    invalidate_identity(telegram_id)
 
 
 async def set_ban(telegram_id: int, banned: int):
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         await db.execute("UPDATE users SET is_banned=? WHERE telegram_id=?", (banned, telegram_id))
         await db.commit()
-
-
-async def ensure_favorites_table() -> None:
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS favorites (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                lot_id INTEGER NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, lot_id)
-            )
-            """
-        )
-        await db.commit()
+    ban_list.set(telegram_id, bool(banned))
+    invalidate_identity(telegram_id)
 
 
 async def toggle_favorite_lot(user_id: int, lot_id: int) -> bool:
-    await ensure_favorites_table()
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with db_connection() as db:
         cur = await db.execute(
             "SELECT 1 FROM favorites WHERE user_id = ? AND lot_id = ?",
             (user_id, lot_id),
@@ -297,17 +288,17 @@ async def toggle_favorite_lot(user_id: int, lot_id: int) -> bool:
 
 async def is_admin(telegram_id: int) -> bool:
     await ensure_user(telegram_id)
-    u = await get_user_row(telegram_id)
+    u = await get_identity(telegram_id)
     return bool(u and u["role"] == "admin")
 
 
 async def is_registered(telegram_id: int) -> bool:
-    u = await get_user_row(telegram_id)
+    u = await get_identity(telegram_id)
     return bool(u and u["role"] not in ("guest", None))
 
 
 async def is_banned(telegram_id: int) -> bool:
-    u = await get_user_row(telegram_id)
+    u = await get_identity(telegram_id)
     return bool(u and u["is_banned"])
 
 
@@ -350,7 +341,7 @@ async def show_profile(message: Message, telegram_id: int):
 
 
 async def _send_main_menu(message: Message, telegram_id: int, text: str = "🏠 Головне меню"):
-    u = await get_user_row(telegram_id)
+    u = await get_identity(telegram_id)
     markup = kb_admin_menu() if u and u["role"] == "admin" else kb_main_menu()
     await message.answer(text, reply_markup=markup)
 
@@ -370,7 +361,7 @@ async def cmd_start(message: Message, state: FSMContext):
         await message.answer("⛔ Ваш акаунт заблоковано")
         return
 
-    u = await get_user_row(message.from_user.id)
+    u = await get_identity(message.from_user.id)
 
     if await is_registered(message.from_user.id):
         markup = kb_admin_menu() if u["role"] == "admin" else kb_main_menu()
@@ -512,7 +503,7 @@ async def reg_company(message: Message, state: FSMContext):
     await set_user_field(message.from_user.id, "company", company)
     await state.clear()
 
-    u = await get_user_row(message.from_user.id)
+    u = await get_identity(message.from_user.id)
     if not u:
         await message.answer("❌ Помилка завантаження профілю. Натисніть /start")
         return
@@ -649,7 +640,7 @@ async def buy_pro(message: Message):
 @router.message(F.text == "📅 Мій статус")
 async def my_status(message: Message):
     from src.bot.handlers.subscriptions import get_user_subscription, SUBSCRIPTION_PLANS, get_subscription_menu_kb
-    u = await get_user_row(message.from_user.id)
+    u = await get_identity(message.from_user.id)
     if not u:
         await message.answer("👋 Спочатку пройдіть реєстрацію. Натисніть /start")
         return
@@ -695,54 +686,48 @@ async def support(message: Message):
 
 # ===================== CATCH-ALL =====================
 
+def _counter_lot_line(lot) -> str:
+    lot_type = "📤 Продам" if lot["type"] == "sell" else "📥 Куплю"
+    vol = lot["volume_tons"] if lot["volume_tons"] else (lot["volume"] if lot["volume"] else "—")
+    price = lot["price"] if lot["price"] else "Договірна"
+    return (
+        f"{lot_type} <b>{lot['crop']}</b> · збіг {lot['score']}%\n"
+        f"📦 {vol} т · 💰 {price} грн/т · 📍 {lot['region']}\n"
+        f"🏢 {lot['company'] or 'Приватна особа'}"
+    )
+
+
+def _counter_lot_buttons(i: int, lot, _uid):
+    return [
+        (f"{i}. 💬", f"chat:start:lot:{lot['id']}"),
+        (f"{i}. 💰", f"offer:make:{lot['id']}"),
+        (f"{i}. ⭐", f"fav:toggle:lot:{lot['id']}"),
+    ]
+
+
+COUNTER_LOTS_LIST = paged_lists.register(paged_lists.ListSpec(
+    key="cnt",
+    title="🔁 <b>Зустрічні пропозиції</b>",
+    empty=(
+        "🔁 <b>Зустрічні пропозиції</b>\n\n"
+        "Наразі немає зустрічних пропозицій.\n\n"
+        "💡 Створіть лот, щоб система автоматично знаходила відповідні пропозиції!"
+    ),
+    sql=SQL_COUNTER_LOTS,
+    keys=COUNTER_LOTS_KEYS,
+    line=_counter_lot_line,
+    buttons=_counter_lot_buttons,
+    footer="💬 написати · 💰 запропонувати ціну · ⭐ в обране",
+))
+
+
 @router.message(F.text == "🔁 Зустрічні")
 async def counteroffers(message: Message):
-    u = await get_user_row(message.from_user.id)
+    u = await get_identity(message.from_user.id)
     if not u or u["role"] in ("guest", None):
         await message.answer("👋 Спочатку пройдіть реєстрацію. Натисніть /start")
         return
-    user_id = u["id"]
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            """
-            SELECT l.*, u.company
-            FROM lots l JOIN users u ON l.owner_user_id = u.id
-            WHERE l.status = 'active' AND l.owner_user_id != ?
-            AND EXISTS (
-                SELECT 1 FROM lots my_lot WHERE my_lot.owner_user_id = ?
-                AND my_lot.status = 'active' AND my_lot.type != l.type AND my_lot.crop = l.crop
-            )
-            ORDER BY l.created_at DESC LIMIT 10
-            """,
-            (user_id, user_id)
-        )
-        lots = await cur.fetchall()
-    if not lots:
-        await message.answer(
-            "🔁 <b>Зустрічні пропозиції</b>\n\n"
-            "Наразі немає зустрічних пропозицій.\n\n"
-            "💡 Створіть лот, щоб система автоматично знаходила відповідні пропозиції!"
-        )
-        return
-    await message.answer(f"🔁 <b>Знайдено {len(lots)} зустрічних пропозицій:</b>")
-    for lot in lots:
-        lot_type = "📤 Продам" if lot["type"] == "sell" else "📥 Куплю"
-        vol = lot["volume_tons"] if lot["volume_tons"] else (lot["volume"] if lot["volume"] else "—")
-        price = lot["price"] if lot["price"] else "Договірна"
-        text = (
-            f"{lot_type} <b>{lot['crop']}</b>\n"
-            f"📦 Обсяг: {vol} т\n"
-            f"💰 Ціна: {price} грн/т\n"
-            f"📍 {lot['region']}\n"
-            f"🏢 {lot['company'] or 'Приватна особа'}"
-        )
-        kb = InlineKeyboardBuilder()
-        kb.button(text="💬 Написати", callback_data=f"chat:start:lot:{lot['id']}")
-        kb.button(text="💰 Запропонувати ціну", callback_data=f"offer:make:{lot['id']}")
-        kb.button(text="⭐ В обране", callback_data=f"fav:toggle:lot:{lot['id']}")
-        kb.adjust(2, 1)
-        await message.answer(text, reply_markup=kb.as_markup())
+    await paged_lists.send_list(message, COUNTER_LOTS_LIST.key, u["id"])
 
 
 @router.callback_query(F.data.startswith("fav:toggle:lot:"))
@@ -756,7 +741,7 @@ async def favorite_toggle(cb: CallbackQuery):
     except ValueError:
         await cb.answer("Невірний ID", show_alert=True)
         return
-    u = await get_user_row(cb.from_user.id)
+    u = await get_identity(cb.from_user.id)
     if not u:
         await cb.answer("Спочатку завершіть реєстрацію", show_alert=True)
         return
@@ -770,26 +755,21 @@ async def favorite_toggle(cb: CallbackQuery):
 # 💬 Мої чати — handled by chat.py
 
 
+def kb_prices():
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔔 Мої сповіщення", callback_data="alerts:list")
+    return kb.as_markup()
+
+
 @router.message(F.text == "📈 Ціни")
 async def prices(message: Message):
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            """
-            SELECT crop, COUNT(*) as count,
-                   AVG(CAST(price AS REAL)) as avg_price,
-                   MIN(CAST(price AS REAL)) as min_price,
-                   MAX(CAST(price AS REAL)) as max_price
-            FROM lots WHERE status = 'active' AND price IS NOT NULL AND price != ''
-            GROUP BY crop ORDER BY count DESC LIMIT 10
-            """,
-        )
-        stats = await cur.fetchall()
+    stats = await crop_summary(limit=10)
     if not stats:
         await message.answer(
             "📈 <b>Ціни та аналітика</b>\n\n"
             "Недостатньо даних для аналізу.\n\n"
-            "💡 Створіть лоти, щоб отримати статистику цін!"
+            "💡 Створіть лоти, щоб отримати статистику цін!",
+            reply_markup=kb_prices(),
         )
         return
     text = "📈 <b>Аналітика цін</b>\n\n"
@@ -801,7 +781,7 @@ async def prices(message: Message):
             f"  📉 Мін: {stat['min_price']:.0f} грн/т\n"
             f"  📈 Макс: {stat['max_price']:.0f} грн/т\n\n"
         )
-    await message.answer(text)
+    await message.answer(text, reply_markup=kb_prices())
 
 
 # ===================== UNIVERSAL CATCH-ALL =====================
@@ -839,5 +819,5 @@ async def universal_catch_all(message: Message, state: FSMContext):
 
 
 async def _get_markup(telegram_id: int):
-    u = await get_user_row(telegram_id)
+    u = await get_identity(telegram_id)
     return kb_admin_menu() if u and u["role"] == "admin" else kb_main_menu()
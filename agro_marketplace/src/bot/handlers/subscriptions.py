@@ -6,19 +6,13 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from src.bot.keyboards.main import main_menu
-import aiosqlite
-import os
+from src.bot.db import db_connection
+from src.bot.services.identity import get_user_id
 from datetime import datetime, timedelta
 import json
 
 router = Router()
 
-try:
-    from config.settings import DB_PATH as _DB_PATH
-    DB_FILE = str(_DB_PATH)
-except Exception:
-    import os
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
 
 # Плани підписок (синхронізовано з веб-панеллю)
 SUBSCRIPTION_PLANS = {
@@ -87,54 +81,15 @@ class SubscriptionState(StatesGroup):
     confirming_payment = State()
 
 
-async def _ensure_subscription_table():
-    """Ensure user_subscriptions and payments tables exist."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                plan TEXT NOT NULL DEFAULT 'free',
-                started_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                expires_at TEXT,
-                is_active INTEGER DEFAULT 1,
-                payment_id TEXT
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                plan TEXT,
-                amount INTEGER NOT NULL DEFAULT 0,
-                currency TEXT DEFAULT 'UAH',
-                status TEXT DEFAULT 'pending',
-                provider TEXT DEFAULT 'manual',
-                provider_payment_id TEXT,
-                payment_method TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                paid_at TEXT
-            )
-        """)
-        await db.commit()
-
 # ==================== HELPERS ====================
 
 async def get_user_subscription(telegram_id: int):
     """Отримати підписку користувача"""
-    await _ensure_subscription_table()
-    async with aiosqlite.connect(DB_FILE) as db:
-        # Спочатку отримуємо user_id
-        user = await db.execute(
-            'SELECT id FROM users WHERE telegram_id = ?',
-            (telegram_id,)
-        )
-        user_row = await user.fetchone()
-        if not user_row:
-            return None
-
-        user_id = user_row[0]
+    user_id = await get_user_id(telegram_id)
+    if not user_id:
+        return None
 
+    async with db_connection() as db:
         # Отримуємо активну підписку
         cursor = await db.execute('''
                                   SELECT * FROM user_subscriptions
@@ -198,18 +153,14 @@ async def check_lot_limit(telegram_id: int) -> tuple[bool, int, int]:
     plan = SUBSCRIPTION_PLANS.get(subscription['plan'], SUBSCRIPTION_PLANS['free'])
     max_lots = plan['max_lots']
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        user = await db.execute(
-            'SELECT id FROM users WHERE telegram_id = ?',
-            (telegram_id,)
-        )
-        user_row = await user.fetchone()
-        if not user_row:
-            return False, 0, 0
+    user_id = await get_user_id(telegram_id)
+    if not user_id:
+        return False, 0, 0
 
+    async with db_connection() as db:
         current = await db.execute(
             'SELECT COUNT(*) FROM lots WHERE owner_user_id = ? AND status = "active"',
-            (user_row[0],)
+            (user_id,)
         )
         current_count = (await current.fetchone())[0]
 
@@ -401,18 +352,13 @@ async def process_payment(call: CallbackQuery):
     await call.answer()
 
     # Створюємо запис про платіж
-    await _ensure_subscription_table()
-    async with aiosqlite.connect(DB_FILE) as db:
-        user = await db.execute(
-            'SELECT id FROM users WHERE telegram_id = ?',
-            (call.from_user.id,)
-        )
-        user_row = await user.fetchone()
-        if user_row:
+    user_id = await get_user_id(call.from_user.id)
+    async with db_connection() as db:
+        if user_id:
             await db.execute('''
                              INSERT INTO payments (user_id, amount, currency, status, payment_method)
                              VALUES (?, ?, 'UAH', 'pending', 'online')
-                             ''', (user_row[0], plan['price']))
+                             ''', (user_id, plan['price']))
             await db.commit()
 
 @router.callback_query(F.data == "sub:buy")
@@ -1,6 +1,7 @@
 """
 Middleware для показу реклами користувачам
-Показує рекламу після N дій (повідомлення АБО натискань кнопок)
+Показує рекламу після N дій (повідомлення АБО натискань кнопок).
+Оголошення вибираються з ad_index (пам'ять), БД — лише запис перегляду.
 """
 
 import logging
@@ -8,7 +9,10 @@ from typing import Callable, Dict, Any, Awaitable, Optional
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-import aiosqlite
+
+from src.bot.db import db_connection
+from src.bot.services.ad_index import ad_index
+from src.bot.services.identity import get_identity
 
 logger = logging.getLogger(__name__)
 
@@ -45,15 +49,25 @@ class AdvertisementMiddleware(BaseMiddleware):
             if not user_id or not reply_target:
                 return result
 
-            # 2) Рахуємо "дію"
-            self.action_counter[user_id] = self.action_counter.get(user_id, 0) + 1
-
-            # 3) Беремо активну рекламу
-            ad = await self._get_active_ad()
+            # 2) Рахуємо "дію" — до порога більше нічого не робимо
+            count = self.action_counter.get(user_id, 0) + 1
+            self.action_counter[user_id] = count
+            if not ad_index.loaded:
+                await ad_index.refresh()
+            if ad_index.threshold is None or count < ad_index.threshold:
+                return result
 
-            # 4) Показуємо, якщо настав час
-            if ad and self._should_show_ad(user_id, int(ad.get('show_frequency') or 3)):
-                await self._show_ad(reply_target, user_id, ad)
+            # 3) Поріг досягнуто — вибір з індексу в пам'яті з урахуванням таргетингу
+            identity = await get_identity(user_id)
+            ad = ad_index.pick(
+                count,
+                role=identity["role"] if identity else None,
+                region=identity["region"] if identity else None,
+            )
+
+            # 4) Показуємо
+            if ad:
+                await self._show_ad(reply_target, user_id, ad.row)
                 self.action_counter[user_id] = 0
 
         except Exception as e:
@@ -61,27 +75,6 @@ class AdvertisementMiddleware(BaseMiddleware):
 
         return result
 
-    def _should_show_ad(self, user_id: int, frequency: int) -> bool:
-        return self.action_counter.get(user_id, 0) >= max(1, frequency)
-
-    async def _get_active_ad(self) -> Optional[dict]:
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    """
-                    SELECT * FROM advertisements
-                    WHERE is_active = 1
-                    ORDER BY RANDOM()
-                    LIMIT 1
-                    """
-                )
-                row = await cursor.fetchone()
-                return dict(row) if row else None
-        except Exception as e:
-            logger.error(f"Error getting ad: {e}")
-            return None
-
     async def _show_ad(self, message: Message, user_id: int, ad: dict):
         try:
             await self._record_view(int(ad['id']), user_id)
@@ -110,7 +103,7 @@ class AdvertisementMiddleware(BaseMiddleware):
 
     async def _record_view(self, ad_id: int, user_id: int):
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with db_connection() as db:
                 await db.execute(
                     "INSERT INTO advertisement_views (ad_id, user_id) VALUES (?, ?)",
                     (ad_id, user_id),
@@ -8,21 +8,14 @@ Middleware для перевірки статусу бану користува
 from __future__ import annotations
 
 from typing import Callable, Dict, Any, Awaitable, Optional
-import aiosqlite
 import logging
-import os
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 
-logger = logging.getLogger(__name__)
+from src.bot.services.ban_list import ban_list
 
-# Отримуємо шлях до БД з конфігурації/ENV
-try:
-    from config.settings import DB_PATH  # type: ignore
-    DB_FILE = str(DB_PATH)
-except Exception:
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
+logger = logging.getLogger(__name__)
 
 
 class BanCheckMiddleware(BaseMiddleware):
@@ -51,16 +44,9 @@ class BanCheckMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        # Перевірка бану в БД
+        # Перевірка бану — O(1) пошук у множині BanList
         try:
-            async with aiosqlite.connect(DB_FILE) as db:
-                cursor = await db.execute(
-                    "SELECT is_banned FROM users WHERE telegram_id = ?",
-                    (user.id,),
-                )
-                row = await cursor.fetchone()
-
-            if row and int(row[0]) == 1:
+            if ban_list.is_banned(user.id):
                 logger.info("Blocked access attempt from banned user %s", user.id)
 
                 if reply_message:
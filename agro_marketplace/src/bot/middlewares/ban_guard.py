@@ -1,15 +1,9 @@
 from __future__ import annotations
 
-import aiosqlite
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 
-import os
-try:
-    from config.settings import DB_PATH  # type: ignore
-    DB_FILE = str(DB_PATH)
-except Exception:
-    DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
+from src.bot.services.identity import get_identity
 
 
 class BanGuardMiddleware(BaseMiddleware):
@@ -20,13 +14,7 @@ class BanGuardMiddleware(BaseMiddleware):
 
         user_id = user.id
 
-        async with aiosqlite.connect(DB_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            cur = await db.execute(
-                "SELECT is_banned FROM users WHERE telegram_id=?",
-                (user_id,),
-            )
-            row = await cur.fetchone()
+        row = await get_identity(user_id)
 
         if row and row["is_banned"]:
             if isinstance(event, Message):
@@ -1,20 +1,41 @@
 """
 Sync Middleware — обробка подій синхронізації від веб-панелі.
-SyncEventProcessor читає JSON-файл кожні 2 секунди і:
-  - сповіщає забанених/розбанених користувачів у Telegram
+SyncEventProcessor читає нові події з таблиці sync_outbox (пачками, id > курсор)
+одразу після сигналу веб-панелі через wakeup-сокет (SYNC_WAKEUP_SOCKET),
+а без сокета — опитуванням кожні 2 секунди, і:
+  - оновлює множину забанених (BanList) і сповіщає забанених/розбанених у Telegram
   - сповіщає власників лотів при зміні статусу
 """
 import asyncio
+import json
 import logging
+import os
+import time
 from typing import Any, Callable, Awaitable, Dict
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 
 try:
-    from src.bot.services.sync_service import FileBasedSync
+    from src.bot.db import db_connection
+    from src.bot.services.sync_service import SyncOutbox, open_wakeup_listener
+    from src.bot.services.identity import invalidate_identity
+    from src.bot.services.ban_list import ban_list
+    from src.bot.services.lot_matching import schedule_match_notifications
+    from src.bot.services.standing_queries import standing_queries
+    from src.bot.services.send_queue import send_queue
+    from src.bot.services.broadcasts import broadcast_runner
+    from src.bot.services.ad_index import ad_index
 except ImportError:
-    from ..services.sync_service import FileBasedSync
+    from ..db import db_connection
+    from ..services.sync_service import SyncOutbox, open_wakeup_listener
+    from ..services.identity import invalidate_identity
+    from ..services.ban_list import ban_list
+    from ..services.lot_matching import schedule_match_notifications
+    from ..services.standing_queries import standing_queries
+    from ..services.send_queue import send_queue
+    from ..services.broadcasts import broadcast_runner
+    from ..services.ad_index import ad_index
 
 logger = logging.getLogger(__name__)
 
@@ -22,17 +43,28 @@ logger = logging.getLogger(__name__)
 class SyncEventProcessor:
     """Читає події від веб-панелі і надсилає Telegram-повідомлення."""
 
+    COMPACT_INTERVAL = 3600  # секунд між очищеннями старих оброблених подій
+    # Опитування без wakeup-сокета / страхувальне опитування з ним
+    POLL_INTERVAL = float(os.getenv("SYNC_POLL_INTERVAL", "2"))
+    IDLE_POLL_INTERVAL = float(os.getenv("SYNC_IDLE_POLL_INTERVAL", "60"))
+
     def __init__(self, bot):
         self.bot = bot
         self.is_running = False
         self._task = None
+        self._last_compact = 0.0
+        self._wakeup = None
 
     async def start(self):
         if self.is_running:
             return
         self.is_running = True
+        self._wakeup = open_wakeup_listener()
         self._task = asyncio.create_task(self._loop())
-        logger.info("✅ SyncEventProcessor запущено (перевірка кожні 2с)")
+        if self._wakeup is not None:
+            logger.info("✅ SyncEventProcessor запущено (wakeup-сокет)")
+        else:
+            logger.info("✅ SyncEventProcessor запущено (перевірка кожні %sс)", self.POLL_INTERVAL)
 
     async def stop(self):
         self.is_running = False
@@ -42,6 +74,14 @@ class SyncEventProcessor:
                 await self._task
             except asyncio.CancelledError:
                 pass
+        if self._wakeup is not None:
+            path = self._wakeup.getsockname()
+            self._wakeup.close()
+            self._wakeup = None
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
         logger.info("⏹ SyncEventProcessor зупинено")
 
     async def _loop(self):
@@ -50,71 +90,126 @@ class SyncEventProcessor:
                 await self._process_events()
             except Exception as e:
                 logger.error("Помилка в SyncEventProcessor: %s", e)
-            await asyncio.sleep(2)
+            await self._wait_for_events()
 
-    async def _process_events(self):
-        # ✅ Читаємо ПОВНИЙ список подій (з реальними індексами для mark_event_processed)
-        events = FileBasedSync.read_all_events()
-        if not events:
+    async def _wait_for_events(self):
+        """Чекає сигналу від веб-панелі; без сокета — просто інтервал опитування."""
+        if self._wakeup is None:
+            await asyncio.sleep(self.POLL_INTERVAL)
             return
-
-        for idx, event in enumerate(events):
-            # Пропускаємо вже оброблені події
-            if event.get("processed", False):
-                continue
-
-            event_type = event.get("event_type")
-            data = event.get("data", {})
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.sock_recv(self._wakeup, 64), self.IDLE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            return
+        except OSError as e:
+            logger.warning("Wakeup-сокет недоступний, повертаємось до опитування: %s", e)
+            self._wakeup.close()
+            self._wakeup = None
+            return
+        # Кілька сигналів поспіль обробляємо одним проходом
+        while True:
             try:
-                if event_type == "user_banned":
-                    await self._on_user_banned(data)
-                elif event_type == "user_unbanned":
-                    await self._on_user_unbanned(data)
-                elif event_type == "lot_status_changed":
-                    await self._on_lot_status_changed(data)
-                elif event_type == "settings_changed":
-                    logger.info("Налаштування змінено через веб-панель")
-                # ✅ idx тепер відповідає реальному індексу у файлі
-                FileBasedSync.mark_event_processed(idx)
-            except Exception as e:
-                logger.error("Помилка обробки події %s: %s", event_type, e)
+                self._wakeup.recv(64)
+            except OSError:
+                break
+
+    async def _process_events(self):
+        # Читаємо пачками, поки є нові події; курсор зсуваємо один раз на пачку
+        while True:
+            async with db_connection() as db:
+                cur = await db.execute(
+                    SyncOutbox.SQL_READ_BATCH, (SyncOutbox.CONSUMER, SyncOutbox.BATCH_SIZE)
+                )
+                rows = await cur.fetchall()
+            if not rows:
+                break
+
+            for row in rows:
+                event_type = row["event_type"]
+                try:
+                    data = json.loads(row["payload"] or "{}")
+                except ValueError:
+                    data = {}
+                try:
+                    if event_type == "user_banned":
+                        await self._on_user_banned(data)
+                    elif event_type == "user_unbanned":
+                        await self._on_user_unbanned(data)
+                    elif event_type == "lot_status_changed":
+                        await self._on_lot_status_changed(data)
+                    elif event_type == "broadcast_started":
+                        broadcast_runner.wake()
+                    elif event_type == "ads_changed":
+                        await ad_index.refresh()
+                    elif event_type == "settings_changed":
+                        logger.info("Налаштування змінено через веб-панель")
+                except Exception as e:
+                    # Подію не повторюємо — інакше вона блокуватиме чергу
+                    logger.error("Помилка обробки події %s #%s: %s", event_type, row["id"], e)
+
+            async with db_connection() as db:
+                await db.execute(SyncOutbox.SQL_ADVANCE, (SyncOutbox.CONSUMER, rows[-1]["id"]))
+                await db.commit()
+
+            if len(rows) < SyncOutbox.BATCH_SIZE:
+                break
+
+        if time.monotonic() - self._last_compact > self.COMPACT_INTERVAL:
+            self._last_compact = time.monotonic()
+            await self._compact()
+
+    async def _compact(self):
+        """Видаляє оброблені події, старші за SyncOutbox.RETENTION_DAYS."""
+        async with db_connection() as db:
+            cur = await db.execute(
+                SyncOutbox.SQL_COMPACT, (f"-{SyncOutbox.RETENTION_DAYS} days",)
+            )
+            await db.commit()
+        if cur.rowcount:
+            logger.info("sync_outbox: видалено %s старих подій", cur.rowcount)
 
     async def _on_user_banned(self, data: dict):
         tg_id = data.get("telegram_id")
         if not tg_id:
             return
-        try:
-            await self.bot.send_message(
-                tg_id,
-                "⛔️ <b>Ваш акаунт заблоковано адміністратором</b>\n\n"
-                "Ви більше не можете користуватися ботом.\n"
-                "Якщо вважаєте, що це помилка — зверніться до підтримки.",
-                parse_mode="HTML",
-            )
-            logger.info("Сповіщення про бан надіслано: telegram_id=%s", tg_id)
-        except Exception as e:
-            logger.warning("Не вдалося надіслати сповіщення про бан %s: %s", tg_id, e)
+        ban_list.ban(tg_id)
+        invalidate_identity(tg_id)
+        # Бан і розбан з одним ключем: якщо обидва ще в черзі — дійде останній
+        send_queue.send_message(
+            tg_id,
+            "⛔️ <b>Ваш акаунт заблоковано адміністратором</b>\n\n"
+            "Ви більше не можете користуватися ботом.\n"
+            "Якщо вважаєте, що це помилка — зверніться до підтримки.",
+            parse_mode="HTML",
+            coalesce_key=f"ban:{tg_id}",
+        )
+        logger.info("Сповіщення про бан у черзі: telegram_id=%s", tg_id)
 
     async def _on_user_unbanned(self, data: dict):
         tg_id = data.get("telegram_id")
         if not tg_id:
             return
-        try:
-            await self.bot.send_message(
-                tg_id,
-                "✅ <b>Ваш акаунт розблоковано!</b>\n\n"
-                "Ви знову можете користуватися всіма функціями бота.\n"
-                "Натисніть /start для продовження.",
-                parse_mode="HTML",
-            )
-            logger.info("Сповіщення про розбан надіслано: telegram_id=%s", tg_id)
-        except Exception as e:
-            logger.warning("Не вдалося надіслати сповіщення про розбан %s: %s", tg_id, e)
+        ban_list.unban(tg_id)
+        invalidate_identity(tg_id)
+        send_queue.send_message(
+            tg_id,
+            "✅ <b>Ваш акаунт розблоковано!</b>\n\n"
+            "Ви знову можете користуватися всіма функціями бота.\n"
+            "Натисніть /start для продовження.",
+            parse_mode="HTML",
+            coalesce_key=f"ban:{tg_id}",
+        )
+        logger.info("Сповіщення про розбан у черзі: telegram_id=%s", tg_id)
 
     async def _on_lot_status_changed(self, data: dict):
         lot_id = data.get("lot_id")
         new_status = data.get("new_status")
         tg_id = data.get("owner_telegram_id")
+        if lot_id and new_status == "active":
+            # Пари в lot_matches вже пораховані тригером — лише сповіщаємо
+            schedule_match_notifications(int(lot_id))
+            standing_queries.wake()
         if not all([lot_id, new_status, tg_id]):
             return
 
@@ -126,11 +221,8 @@ class SyncEventProcessor:
         }
         text = messages.get(new_status, f"ℹ️ Статус вашого лота #{lot_id} змінено: {new_status}")
 
-        try:
-            await self.bot.send_message(tg_id, text, parse_mode="HTML")
-            logger.info("Сповіщення про лот %s надіслано: telegram_id=%s", lot_id, tg_id)
-        except Exception as e:
-            logger.warning("Не вдалося надіслати сповіщення про лот %s: %s", lot_id, e)
+        send_queue.send_message(tg_id, text, parse_mode="HTML", coalesce_key=f"lot_status:{lot_id}")
+        logger.info("Сповіщення про лот %s у черзі: telegram_id=%s", lot_id, tg_id)
 
 
 class SyncMiddleware(BaseMiddleware):
@@ -0,0 +1,158 @@
+"""
+Індекс активної реклами в пам'яті бота.
+
+AdvertisementMiddleware рахує дії користувача і звертається сюди лише коли
+лічильник дійшов до порога (найменша show_frequency серед активних оголошень) —
+на звичайний апдейт реклама коштує одне збільшення лічильника в dict.
+
+- оголошення з is_active = 1 вантажаться один раз і перечитуються за подією
+  ads_changed з веб-панелі (створення/редагування/вмикання/видалення);
+- таргетинг: target_roles / target_regions (через кому, міграція 18) —
+  порожнє поле означає «всім»;
+- вибір — alias-метод (Vose) по weight лише серед оголошень, чия
+  show_frequency вже досягнута: для кожного сегмента (роль, область) і кожної
+  різної частоти f своя таблиця над оголошеннями з частотою ≤ f. Таблиці
+  будуються ліниво і живуть до наступного refresh; вибір — bisect + O(1).
+  Лічильник дій скидається після показу, тож оголошення з більшою частотою
+  конкурує лише тоді, коли користувач дійшов до неї без показу іншої реклами.
+"""
+from __future__ import annotations
+
+import logging
+import random
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.bot.db import db_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FREQUENCY = 3
+
+
+def parse_targets(raw: Optional[str]) -> frozenset:
+    """'farmer, buyer' → frozenset({'farmer', 'buyer'}); порожньо — без обмеження."""
+    return frozenset(p.strip() for p in (raw or "").split(",") if p.strip())
+
+
+class AliasTable:
+    """Вибір індексу з ймовірністю weights[i] / sum(weights) за O(1) (метод Vose)."""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        self.prob: List[float] = [1.0] * n
+        self.alias: List[int] = list(range(n))
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] -= 1.0 - scaled[s]
+            (small if scaled[g] < 1.0 else large).append(g)
+        # Залишки (похибка округлення) — ймовірність 1
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random = random) -> int:
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+@dataclass(frozen=True)
+class Ad:
+    id: int
+    row: dict
+    weight: int
+    frequency: int
+    roles: frozenset
+    regions: frozenset
+
+    def targets(self, role: Optional[str], region: Optional[str]) -> bool:
+        if self.roles and role not in self.roles:
+            return False
+        if self.regions and region not in self.regions:
+            return False
+        return True
+
+
+class _Segment:
+    """Оголошення сегмента за зростанням частоти і alias-таблиця на кожну різну частоту."""
+
+    def __init__(self, ads: List[Ad]):
+        self.ads = sorted(ads, key=lambda a: (a.frequency, a.id))
+        self.frequencies: List[int] = []
+        self.tables: List[AliasTable] = []
+        for n, ad in enumerate(self.ads, start=1):
+            if n == len(self.ads) or self.ads[n].frequency != ad.frequency:
+                # Таблиця над префіксом ads[:n] — усі оголошення з частотою ≤ ad.frequency
+                self.frequencies.append(ad.frequency)
+                self.tables.append(AliasTable([a.weight for a in self.ads[:n]]))
+
+    def pick(self, actions: int, rng: random.Random = random) -> Optional[Ad]:
+        i = bisect_right(self.frequencies, actions) - 1
+        if i < 0:
+            return None
+        return self.ads[self.tables[i].sample(rng)]
+
+
+class AdIndex:
+    def __init__(self):
+        self._ads: List[Ad] = []
+        self._segments: Dict[Tuple[Optional[str], Optional[str]], Optional[_Segment]] = {}
+        self.threshold: Optional[int] = None  # None — активної реклами немає
+        self.loaded = False
+
+    async def refresh(self) -> None:
+        async with db_connection() as db:
+            cur = await db.execute("SELECT * FROM advertisements WHERE is_active = 1 ORDER BY id")
+            rows = [dict(r) for r in await cur.fetchall()]
+        self.load_rows(rows)
+
+    def load_rows(self, rows: List[dict]) -> None:
+        """Перебудовує індекс з рядків активних оголошень advertisements."""
+        ads = []
+        for row in rows:
+            weight = int(row["weight"]) if row.get("weight") is not None else 1
+            if weight <= 0:
+                continue
+            ads.append(Ad(
+                id=int(row["id"]),
+                row=row,
+                weight=weight,
+                frequency=max(1, int(row.get("show_frequency") or DEFAULT_FREQUENCY)),
+                roles=parse_targets(row.get("target_roles")),
+                regions=parse_targets(row.get("target_regions")),
+            ))
+        self._ads = ads
+        self._segments = {}
+        self.threshold = min((a.frequency for a in ads), default=None)
+        self.loaded = True
+        logger.info("Реклама: активних оголошень %s, поріг %s", len(ads), self.threshold)
+
+    async def start(self) -> None:
+        await self.refresh()
+
+    def _segment(self, role: Optional[str], region: Optional[str]):
+        key = (role, region)
+        if key not in self._segments:
+            ads = [a for a in self._ads if a.targets(role, region)]
+            self._segments[key] = _Segment(ads) if ads else None
+        return self._segments[key]
+
+    def pick(self, actions: int, role: Optional[str] = None, region: Optional[str] = None,
+             rng: random.Random = random) -> Optional[Ad]:
+        """
+        Оголошення для користувача з actions діями від останнього показу, або None.
+        Вибір за вагою серед оголошень сегмента, чия частота вже досягнута.
+        """
+        segment = self._segment(role, region)
+        if segment is None:
+            return None
+        return segment.pick(actions, rng)
+
+
+ad_index = AdIndex()
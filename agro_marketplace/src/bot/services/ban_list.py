@@ -0,0 +1,84 @@
+"""
+Множина забанених telegram_id у пам'яті бота.
+
+BanCheckMiddleware викликається на кожне повідомлення і callback, тому
+перевірка бану — це O(1) пошук у множині. Множина завантажується при старті,
+оновлюється подіями user_banned/user_unbanned від веб-панелі та set_ban,
+а також періодично звіряється з БД (SELECT по забанених — дешевий запит).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Optional, Set
+
+from src.bot.db import db_connection
+
+logger = logging.getLogger(__name__)
+
+BAN_RECONCILE_INTERVAL = float(os.getenv("BAN_RECONCILE_INTERVAL", "60"))
+
+
+class BanList:
+    """Кеш забанених користувачів з фоновою звіркою."""
+
+    def __init__(self, reconcile_interval: float = BAN_RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._banned: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_banned(self, telegram_id: int) -> bool:
+        return telegram_id in self._banned
+
+    def ban(self, telegram_id: int) -> None:
+        self._banned.add(int(telegram_id))
+
+    def unban(self, telegram_id: int) -> None:
+        self._banned.discard(int(telegram_id))
+
+    def set(self, telegram_id: int, banned: bool) -> None:
+        if banned:
+            self.ban(telegram_id)
+        else:
+            self.unban(telegram_id)
+
+    async def load(self) -> None:
+        """Повністю перечитує множину з БД."""
+        async with db_connection() as db:
+            cur = await db.execute(
+                "SELECT telegram_id FROM users WHERE is_banned = 1 AND telegram_id IS NOT NULL"
+            )
+            rows = await cur.fetchall()
+        fresh = {int(r[0]) for r in rows}
+        if fresh != self._banned:
+            logger.info("BanList: %s забанених (було %s)", len(fresh), len(self._banned))
+        self._banned = fresh
+
+    async def start(self) -> None:
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error("Помилка звірки BanList: %s", e)
+
+    def __len__(self) -> int:
+        return len(self._banned)
+
+
+ban_list = BanList()
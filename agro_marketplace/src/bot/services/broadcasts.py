@@ -0,0 +1,260 @@
+"""
+Розсилки з веб-панелі (таблиця broadcasts, міграція 14).
+
+Адмін створює розсилку в панелі і натискає «Старт» — статус стає 'sending',
+панель пише подію broadcast_started, і BroadcastRunner її підхоплює (або
+знаходить при наступному опитуванні / після рестарту бота).
+
+- audience_filter компілюється в умову WHERE (src.database.audience), а
+  отримувачі читаються пачками по BROADCAST_CHUNK_SIZE за id > last_id —
+  список користувачів у пам'ять не вантажиться;
+- відправка йде через send_queue.submit з пріоритетом PROMO: швидкість
+  обмежує глобальний ліміт черги (30/с → 100k за ~55 хв), а чат-пересилання
+  і транзакційні повідомлення обганяють розсилку; одночасно в черзі не
+  більше BROADCAST_CONCURRENCY повідомлень;
+- кожні BROADCAST_CHECKPOINT_INTERVAL секунд у broadcasts пишуться лічильники
+  і last_user_id — найбільший id, до якого всі відправки завершено. Після
+  рестарту розсилка продовжується з нього (повторно можуть отримати не більше
+  BROADCAST_CONCURRENCY людей). Ці ж поля панель показує як прогрес;
+- хто заблокував бота (Forbidden / chat not found), позначається
+  users.bot_blocked = 1 і в наступні розсилки не потрапляє;
+- статус 'paused' з панелі зупиняє розсилку на найближчому чекпоінті.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.bot.db import db_connection
+from src.bot.services.send_queue import PRIORITY_PROMO, send_queue
+from src.database.audience import compile_audience, count_sql, recipients_sql
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "500"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "30"))
+BROADCAST_CHECKPOINT_INTERVAL = float(os.getenv("BROADCAST_CHECKPOINT_INTERVAL", "2"))
+BROADCAST_POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", "30"))
+
+SENDING = "sending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_MEDIA_METHODS = {"photo": "send_photo", "video": "send_video", "document": "send_document"}
+
+# Результати відправки одному отримувачу
+_SENT, _FAILED, _BLOCKED = "sent", "failed", "blocked"
+
+
+def build_payload(row) -> Tuple[str, Dict[str, Any]]:
+    """Рядок broadcasts → (метод бота, аргументи без chat_id)."""
+    kwargs: Dict[str, Any] = {}
+    buttons = json.loads(row["buttons_json"]) if row["buttons_json"] else []
+    if buttons:
+        kb = InlineKeyboardBuilder()
+        for b in buttons:
+            kb.button(text=b["text"], url=b["url"])
+        kb.adjust(1)
+        kwargs["reply_markup"] = kb.as_markup()
+    method = _MEDIA_METHODS.get(row["media_type"] or "")
+    if method and row["media_file_id"]:
+        kwargs[row["media_type"]] = row["media_file_id"]
+        kwargs["caption"] = row["content"]
+        return method, kwargs
+    kwargs["text"] = row["content"]
+    return "send_message", kwargs
+
+
+def _is_unreachable(exc: Exception) -> bool:
+    if isinstance(exc, TelegramForbiddenError):
+        return True
+    return isinstance(exc, TelegramBadRequest) and "chat not found" in str(exc).lower()
+
+
+class _Progress:
+    """Відправки в порядку id; голова черги — межа для last_user_id."""
+
+    def __init__(self, last_id: int):
+        self.last_id = last_id
+        self.window: Deque[Tuple[int, asyncio.Task]] = deque()
+        self.sent = self.failed = 0
+        self.blocked: List[int] = []
+
+    def advance(self) -> None:
+        while self.window and self.window[0][1].done():
+            user_id, task = self.window.popleft()
+            outcome = _FAILED if task.cancelled() else task.result()
+            if outcome == _SENT:
+                self.sent += 1
+            else:
+                self.failed += 1
+                if outcome == _BLOCKED:
+                    self.blocked.append(user_id)
+            self.last_id = user_id
+
+    def take(self) -> Tuple[int, int, List[int]]:
+        """Лічильники з попереднього чекпоінта (і скидання)."""
+        delta = (self.sent, self.failed, self.blocked)
+        self.sent = self.failed = 0
+        self.blocked = []
+        return delta
+
+
+class BroadcastRunner:
+    """Фонове виконання розсилок зі статусом 'sending', по одній."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                async with db_connection() as db:
+                    cur = await db.execute(
+                        "SELECT id FROM broadcasts WHERE status = ? ORDER BY id LIMIT 1", (SENDING,)
+                    )
+                    row = await cur.fetchone()
+                if row:
+                    await self.run(row["id"])
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Помилка розсилки: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), BROADCAST_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, broadcast_id: int) -> None:
+        """Виконує (або продовжує) розсилку до завершення чи паузи."""
+        async with db_connection() as db:
+            cur = await db.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+            row = await cur.fetchone()
+            if not row or row["status"] != SENDING:
+                return
+            try:
+                where, params = compile_audience(row["audience_filter"])
+                method, kwargs = build_payload(row)
+            except (ValueError, KeyError, TypeError) as e:
+                await db.execute(
+                    "UPDATE broadcasts SET status = ?, error = ?, completed_at = datetime('now') WHERE id = ?",
+                    (FAILED, str(e), broadcast_id),
+                )
+                await db.commit()
+                logger.error("Розсилка %s: некоректні дані — %s", broadcast_id, e)
+                return
+            if row["started_at"] is None:
+                cur = await db.execute(count_sql(where), params)
+                total = (await cur.fetchone())[0]
+                await db.execute(
+                    "UPDATE broadcasts SET started_at = datetime('now'), total_users = ? WHERE id = ?",
+                    (total, broadcast_id),
+                )
+                await db.commit()
+                logger.info("Розсилка %s: старт, отримувачів %s", broadcast_id, total)
+            else:
+                logger.info("Розсилка %s: продовження після id %s", broadcast_id, row["last_user_id"])
+
+        progress = _Progress(row["last_user_id"])
+        slots = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        sql = recipients_sql(where)
+        cursor = row["last_user_id"]
+        next_checkpoint = time.monotonic() + BROADCAST_CHECKPOINT_INTERVAL
+        status = SENDING
+        exhausted = False
+        try:
+            while status == SENDING:
+                async with db_connection() as db:
+                    cur = await db.execute(sql, (cursor, *params, BROADCAST_CHUNK_SIZE))
+                    chunk = await cur.fetchall()
+                if not chunk:
+                    exhausted = True
+                    break
+                for user_id, tg_id in chunk:
+                    await slots.acquire()
+                    task = asyncio.create_task(self._send_one(slots, tg_id, method, kwargs))
+                    progress.window.append((user_id, task))
+                    if time.monotonic() >= next_checkpoint:
+                        status = await self._checkpoint(broadcast_id, progress)
+                        next_checkpoint = time.monotonic() + BROADCAST_CHECKPOINT_INTERVAL
+                        if status != SENDING:
+                            logger.info("Розсилка %s: статус %s — зупинка", broadcast_id, status)
+                            break
+                cursor = chunk[-1][0]
+            # Дочікуємось відправок у польоті, щоб чекпоінт їх врахував
+            if progress.window:
+                await asyncio.wait([t for _, t in progress.window])
+        finally:
+            # При зупинці бота теж зберігаємо прогрес (shield — stop() скасовує цю задачу)
+            status = await asyncio.shield(self._checkpoint(broadcast_id, progress, finish=exhausted))
+        if status == COMPLETED:
+            logger.info("Розсилка %s завершена", broadcast_id)
+
+    async def _send_one(self, slots: asyncio.Semaphore, tg_id: int, method: str, kwargs: dict) -> str:
+        try:
+            await send_queue.submit(method, tg_id, priority=PRIORITY_PROMO, **kwargs)
+            return _SENT
+        except asyncio.CancelledError:
+            return _FAILED
+        except Exception as e:
+            if _is_unreachable(e):
+                return _BLOCKED
+            logger.debug("Розсилка → %s: %s", tg_id, e)
+            return _FAILED
+        finally:
+            slots.release()
+
+    async def _checkpoint(self, broadcast_id: int, progress: _Progress, finish: bool = False) -> str:
+        """Пише лічильники й курсор; finish — позначити завершеною. Повертає поточний статус."""
+        progress.advance()
+        if finish and progress.window:
+            finish = False  # щось ще в польоті (зупинка бота) — не завершуємо
+        sent, failed, blocked = progress.take()
+        async with db_connection() as db:
+            if blocked:
+                await db.executemany("UPDATE users SET bot_blocked = 1 WHERE id = ?", [(u,) for u in blocked])
+            cur = await db.execute(
+                """
+                UPDATE broadcasts
+                SET sent_count = sent_count + ?, failed_count = failed_count + ?,
+                    blocked_count = blocked_count + ?, last_user_id = ?,
+                    status = CASE WHEN ? AND status = 'sending' THEN 'completed' ELSE status END,
+                    completed_at = CASE WHEN ? AND status = 'sending' THEN datetime('now') ELSE completed_at END
+                WHERE id = ?
+                RETURNING status
+                """,
+                (sent, failed, len(blocked), progress.last_id, finish, finish, broadcast_id),
+            )
+            row = await cur.fetchone()
+            await db.commit()
+        return row["status"] if row else FAILED
+
+
+broadcast_runner = BroadcastRunner()
@@ -0,0 +1,361 @@
+"""
+Шлях пересилання чат-повідомлень без читань з БД.
+
+- ChatRoutes — маршрути сесій у пам'яті: session_id → обидва учасники
+  (users.id + telegram_id) і статус. Заповнюються, коли сесію відкривають
+  (open_chat, open_session), тож relay_message не читає БД зовсім;
+  промах (рестарт бота) — одне читання з JOIN на users. Хто змінює
+  chat_sessions.status, має викликати chat_routes.invalidate(session_id);
+  TTL обмежує застарілість для змін поза ботом (веб-панель).
+- open_session — створення/пошук сесії одним INSERT … ON CONFLICT … RETURNING
+  по UNIQUE-індексу впорядкованої пари учасників і контексту.
+- AlbumBuffer — альбом (media_group_id) приходить N окремими апдейтами;
+  буфер збирає їх CHAT_ALBUM_DEBOUNCE секунд після останнього і пересилає
+  одним send_media_group та одним рядком chat_messages (media_json з
+  file_id). Несумісні в одному альбомі типи (фото/відео, документи, аудіо)
+  йдуть окремими групами; група з одного елемента — звичайним send_*.
+- ChatMessageWriter — фоновий запис chat_messages пачками: relay кладе рядок у
+  чергу і одразу віддає повідомлення в send_queue, а writer раз на
+  CHAT_WRITE_INTERVAL пише все накопичене одним executemany + оновлює
+  chat_sessions.updated_at. Порядок у сесії зберігається (FIFO), created_at
+  фіксується в момент пересилання. При зупинці бота черга дописується.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
+
+from src.bot.db import db_connection
+from src.bot.services.identity import get_telegram_id
+from src.bot.services.send_queue import PRIORITY_CHAT, send_queue
+
+logger = logging.getLogger(__name__)
+
+CHAT_ROUTES_SIZE = int(os.getenv("CHAT_ROUTES_SIZE", "20000"))
+CHAT_ROUTES_TTL = float(os.getenv("CHAT_ROUTES_TTL", "900"))
+CHAT_WRITE_INTERVAL = float(os.getenv("CHAT_WRITE_INTERVAL", "0.5"))
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "200"))
+CHAT_ALBUM_DEBOUNCE = float(os.getenv("CHAT_ALBUM_DEBOUNCE", "0.8"))
+
+ALBUM_MAX_ITEMS = 10  # ліміт Telegram на одну медіагрупу
+
+_SELECT_ROUTE = """
+    SELECT cs.id, cs.status, cs.user1_id, cs.user2_id,
+           u1.telegram_id AS tg1, u2.telegram_id AS tg2
+    FROM chat_sessions cs
+    LEFT JOIN users u1 ON u1.id = cs.user1_id
+    LEFT JOIN users u2 ON u2.id = cs.user2_id
+    WHERE cs.id = ?
+"""
+
+# Одна активна сесія на (пара, контекст) — ux_chat_sessions_pair (міграція 15).
+# DO UPDATE без змін замість DO NOTHING: так RETURNING віддає id і наявної
+# сесії — відкриття чату один запит по індексу.
+_UPSERT_SESSION = """
+    INSERT INTO chat_sessions(user1_id, user2_id, lot_id, offer_id) VALUES(?, ?, ?, ?)
+    ON CONFLICT(user1_id, user2_id, COALESCE(lot_id, 0), COALESCE(offer_id, 0)) WHERE status = 'active'
+    DO UPDATE SET status = status
+    RETURNING id
+"""
+
+
+@dataclass(frozen=True)
+class ChatRoute:
+    session_id: int
+    user1_id: int
+    user2_id: int
+    tg1: Optional[int]
+    tg2: Optional[int]
+    status: str = "active"
+
+    @property
+    def active(self) -> bool:
+        return self.status == "active"
+
+    def resolve(self, sender_tg: int) -> Optional[Tuple[int, int, Optional[int]]]:
+        """telegram_id відправника → (його users.id, users.id співрозмовника, telegram_id співрозмовника)."""
+        if sender_tg == self.tg1:
+            return self.user1_id, self.user2_id, self.tg2
+        if sender_tg == self.tg2:
+            return self.user2_id, self.user1_id, self.tg1
+        return None
+
+
+class ChatRoutes:
+    """LRU-кеш маршрутів сесій з TTL."""
+
+    def __init__(self, max_size: int = CHAT_ROUTES_SIZE, ttl: float = CHAT_ROUTES_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._routes: "OrderedDict[int, Tuple[float, ChatRoute]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, route: ChatRoute) -> ChatRoute:
+        self._routes.pop(route.session_id, None)
+        self._routes[route.session_id] = (time.monotonic() + self.ttl, route)
+        while len(self._routes) > self.max_size:
+            self._routes.popitem(last=False)
+        return route
+
+    def put_row(self, row) -> Optional[ChatRoute]:
+        """Рядок _SELECT_ROUTE (id, status, user1_id, user2_id, tg1, tg2) → маршрут у кеші."""
+        if row is None:
+            return None
+        return self.put(ChatRoute(
+            session_id=int(row["id"]),
+            user1_id=int(row["user1_id"]),
+            user2_id=int(row["user2_id"]),
+            tg1=int(row["tg1"]) if row["tg1"] is not None else None,
+            tg2=int(row["tg2"]) if row["tg2"] is not None else None,
+            status=row["status"],
+        ))
+
+    def peek(self, session_id: int) -> Optional[ChatRoute]:
+        item = self._routes.get(session_id)
+        if item is None:
+            return None
+        expires_at, route = item
+        if expires_at < time.monotonic():
+            self._routes.pop(session_id, None)
+            return None
+        self._routes.move_to_end(session_id)
+        return route
+
+    async def get(self, session_id: int) -> Optional[ChatRoute]:
+        route = self.peek(session_id)
+        if route is not None:
+            self.hits += 1
+            return route
+        self.misses += 1
+        return await self.load(session_id)
+
+    async def load(self, session_id: int) -> Optional[ChatRoute]:
+        """Свіжий маршрут з БД (і в кеш); None — сесії немає."""
+        async with db_connection() as db:
+            cur = await db.execute(_SELECT_ROUTE, (session_id,))
+            row = await cur.fetchone()
+        if row is None:
+            self.invalidate(session_id)
+        return self.put_row(row)
+
+    def invalidate(self, session_id: int) -> None:
+        self._routes.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+
+async def open_session(u1: int, u2: int, lot_id: Optional[int] = None,
+                       offer_id: Optional[int] = None) -> int:
+    """Активна сесія між u1 і u2 у контексті лота/заявки (створює, якщо немає) + маршрут у кеш."""
+    a, b = sorted((int(u1), int(u2)))
+    async with db_connection() as db:
+        cur = await db.execute(_UPSERT_SESSION, (a, b, lot_id, offer_id))
+        session_id = (await cur.fetchone())[0]
+        await db.commit()
+    chat_routes.put(ChatRoute(session_id, a, b, await get_telegram_id(a), await get_telegram_id(b)))
+    return session_id
+
+# ══════════════════════ АЛЬБОМИ ══════════════════════
+
+# тип медіа → (InputMedia, група сумісності в одному send_media_group, одиночний метод)
+ALBUM_KINDS = {
+    "photo": (InputMediaPhoto, "visual", "send_photo"),
+    "video": (InputMediaVideo, "visual", "send_video"),
+    "document": (InputMediaDocument, "document", "send_document"),
+    "audio": (InputMediaAudio, "audio", "send_audio"),
+}
+
+
+@dataclass
+class AlbumItem:
+    message_id: int
+    kind: str          # ключ ALBUM_KINDS
+    file_id: str
+    caption: Optional[str] = None
+
+
+@dataclass
+class _Album:
+    session_id: int
+    sender_id: int
+    sender_chat: int
+    other_tg: Optional[int]
+    label: str
+    on_failure: Optional[Callable[[Exception], Awaitable[None]]]
+    items: List[AlbumItem] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class AlbumBuffer:
+    """Збирає апдейти одного media_group_id і пересилає їх разом."""
+
+    def __init__(self, debounce: float = CHAT_ALBUM_DEBOUNCE):
+        self.debounce = debounce
+        self._albums: Dict[Tuple[int, str], _Album] = {}
+        self.relayed = 0
+
+    def add(self, media_group_id: str, item: AlbumItem, *, session_id: int, sender_id: int,
+            sender_chat: int, other_tg: Optional[int], label: str,
+            on_failure: Optional[Callable[[Exception], Awaitable[None]]] = None) -> None:
+        key = (sender_chat, media_group_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = _Album(session_id, sender_id, sender_chat, other_tg, label, on_failure)
+        album.items.append(item)
+        # Debounce: таймер відраховується від останнього елемента
+        if album.timer:
+            album.timer.cancel()
+        album.timer = asyncio.get_running_loop().call_later(self.debounce, self._flush, key)
+
+    def flush_chat(self, sender_chat: int) -> None:
+        """Пересилає незавершені альбоми відправника — перед його наступним повідомленням."""
+        for key in [k for k in self._albums if k[0] == sender_chat]:
+            self._flush(key)
+
+    def flush_all(self) -> None:
+        for key in list(self._albums):
+            self._flush(key)
+
+    def _flush(self, key: Tuple[int, str]) -> None:
+        album = self._albums.pop(key, None)
+        if album is None:
+            return
+        if album.timer:
+            album.timer.cancel()
+        try:
+            self._relay(album)
+        except Exception as e:
+            logger.error("Помилка пересилання альбому: %s", e)
+
+    def _relay(self, album: _Album) -> None:
+        items = sorted(album.items, key=lambda i: i.message_id)
+        caption = next((i.caption for i in items if i.caption), None)
+        chat_writer.write(
+            album.session_id, album.sender_id, caption or f"[альбом: {len(items)}]",
+            message_type="album",
+            media=[{"type": i.kind, "file_id": i.file_id} for i in items],
+        )
+        if not album.other_tg:
+            send_queue.send_message(album.sender_chat, "⚠️ Не вдалося надіслати — співрозмовника не знайдено.",
+                                    priority=PRIORITY_CHAT)
+            return
+
+        relay = dict(priority=PRIORITY_CHAT, on_failure=album.on_failure)
+        groups: Dict[str, List[AlbumItem]] = {}
+        for item in items:
+            groups.setdefault(ALBUM_KINDS[item.kind][1], []).append(item)
+        first = True
+        for group in groups.values():
+            for start in range(0, len(group), ALBUM_MAX_ITEMS):
+                chunk = group[start:start + ALBUM_MAX_ITEMS]
+                # Підпис — на першому елементі групи (Telegram показує його під альбомом)
+                head = f"{album.label}:\n\n{caption}" if first and caption else album.label
+                first = False
+                if len(chunk) == 1:
+                    _, _, method = ALBUM_KINDS[chunk[0].kind]
+                    send_queue.enqueue(method, album.other_tg, caption=head,
+                                       **{chunk[0].kind: chunk[0].file_id}, **relay)
+                    continue
+                media = [
+                    ALBUM_KINDS[i.kind][0](media=i.file_id, caption=head if n == 0 else None)
+                    for n, i in enumerate(chunk)
+                ]
+                send_queue.enqueue("send_media_group", album.other_tg, media=media, **relay)
+        self.relayed += 1
+        send_queue.send_message(album.sender_chat, "✅", priority=PRIORITY_CHAT)
+
+
+class ChatMessageWriter:
+    """Пакетний запис chat_messages у фоні."""
+
+    def __init__(self):
+        self._pending: List[Tuple[int, int, str, Optional[str], Optional[str], str]] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.written = 0
+
+    def write(self, session_id: int, sender_user_id: int, content: str,
+              message_type: Optional[str] = None, media: Optional[list] = None) -> None:
+        """Ставить повідомлення в чергу на запис (без очікування БД)."""
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        media_json = json.dumps(media) if media else None
+        self._pending.append((session_id, sender_user_id, content, message_type, media_json, now))
+        if len(self._pending) >= CHAT_WRITE_BATCH:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Пише все накопичене; повертає к-сть рядків. Викликати перед читанням історії."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            sessions = {}
+            for session_id, *_, created_at in batch:
+                sessions[session_id] = created_at
+            try:
+                async with db_connection() as db:
+                    await db.executemany(
+                        "INSERT INTO chat_messages(session_id,sender_user_id,content,message_type,media_json,created_at) "
+                        "VALUES(?,?,?,?,?,?)",
+                        batch,
+                    )
+                    await db.executemany(
+                        "UPDATE chat_sessions SET updated_at=? WHERE id=?",
+                        [(ts, sid) for sid, ts in sessions.items()],
+                    )
+                    await db.commit()
+            except Exception:
+                # Повертаємо пачку на початок черги — допишемо наступного разу
+                self._pending[:0] = batch
+                raise
+            self.written += len(batch)
+            return len(batch)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Не вдалося дописати %s чат-повідомлень: %s", len(self._pending), e)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), CHAT_WRITE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # shield — stop() посеред запису не губить пачку, а дочекається її
+                await asyncio.shield(self.flush())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Помилка запису чат-повідомлень: %s", e)
+
+
+chat_routes = ChatRoutes()
+chat_writer = ChatMessageWriter()
+album_buffer = AlbumBuffer()
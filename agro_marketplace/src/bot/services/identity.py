@@ -0,0 +1,138 @@
+"""
+Кеш ідентичності користувачів: telegram_id ↔ users.id + role/region/company/is_banned.
+
+Хендлери на кожне повідомлення резолвлять telegram_id → users.id (і навпаки),
+тому записи тримаються в пам'яті процесу бота з обмеженим розміром (LRU) і TTL.
+Після запису в users (реєстрація, set_user_field, set_ban, події веб-панелі)
+запис треба інвалідувати через invalidate().
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.bot.db import db_connection
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "300"))
+
+IDENTITY_FIELDS = ("id", "telegram_id", "role", "region", "phone", "company", "is_banned")
+_SELECT = f"SELECT {', '.join(IDENTITY_FIELDS)} FROM users"
+
+
+class IdentityCache:
+    """Двонаправлений LRU-кеш з TTL. Зберігає dict з полями IDENTITY_FIELDS."""
+
+    def __init__(self, max_size: int = IDENTITY_CACHE_SIZE, ttl: float = IDENTITY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # telegram_id -> (expires_at, record)
+        self._by_tg: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # users.id -> telegram_id
+        self._tg_by_uid: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- internal ----------
+
+    def _lookup(self, tg_id: int) -> Optional[Dict[str, Any]]:
+        item = self._by_tg.get(tg_id)
+        if item is None:
+            return None
+        expires_at, record = item
+        if expires_at < time.monotonic():
+            self._drop(tg_id)
+            return None
+        self._by_tg.move_to_end(tg_id)
+        return record
+
+    def _drop(self, tg_id: int) -> None:
+        item = self._by_tg.pop(tg_id, None)
+        if item is not None:
+            self._tg_by_uid.pop(int(item[1]["id"]), None)
+
+    def put(self, row: Any) -> Optional[Dict[str, Any]]:
+        """Кладе в кеш рядок users (Row/dict з полями IDENTITY_FIELDS)."""
+        if row is None:
+            return None
+        record = {f: row[f] for f in IDENTITY_FIELDS}
+        tg_id = int(record["telegram_id"])
+        self._drop(tg_id)
+        self._by_tg[tg_id] = (time.monotonic() + self.ttl, record)
+        self._tg_by_uid[int(record["id"])] = tg_id
+        while len(self._by_tg) > self.max_size:
+            _, (_, evicted) = self._by_tg.popitem(last=False)
+            self._tg_by_uid.pop(int(evicted["id"]), None)
+        return record
+
+    async def _load(self, where: str, value: int) -> Optional[Dict[str, Any]]:
+        self.misses += 1
+        async with db_connection() as db:
+            cur = await db.execute(f"{_SELECT} WHERE {where} = ?", (value,))
+            row = await cur.fetchone()
+        return self.put(row)
+
+    # ---------- public ----------
+
+    async def by_telegram_id(self, tg_id: int) -> Optional[Dict[str, Any]]:
+        record = self._lookup(int(tg_id))
+        if record is not None:
+            self.hits += 1
+            return record
+        return await self._load("telegram_id", int(tg_id))
+
+    async def by_user_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        tg_id = self._tg_by_uid.get(int(user_id))
+        if tg_id is not None:
+            record = self._lookup(tg_id)
+            if record is not None:
+                self.hits += 1
+                return record
+        return await self._load("id", int(user_id))
+
+    def invalidate(self, telegram_id: Optional[int] = None, user_id: Optional[int] = None) -> None:
+        if telegram_id is None and user_id is not None:
+            telegram_id = self._tg_by_uid.get(int(user_id))
+        if telegram_id is not None:
+            self._drop(int(telegram_id))
+
+    def clear(self) -> None:
+        self._by_tg.clear()
+        self._tg_by_uid.clear()
+
+    def __len__(self) -> int:
+        return len(self._by_tg)
+
+
+identity_cache = IdentityCache()
+
+
+# ══════════════════════ HELPERS ══════════════════════
+
+async def get_identity(telegram_id: int) -> Optional[Dict[str, Any]]:
+    return await identity_cache.by_telegram_id(telegram_id)
+
+
+async def get_identity_by_user_id(user_id: int) -> Optional[Dict[str, Any]]:
+    return await identity_cache.by_user_id(user_id)
+
+
+async def get_user_id(telegram_id: int) -> Optional[int]:
+    """telegram_id → users.id"""
+    record = await identity_cache.by_telegram_id(telegram_id)
+    return int(record["id"]) if record else None
+
+
+async def get_telegram_id(user_id: int) -> Optional[int]:
+    """users.id → telegram_id"""
+    record = await identity_cache.by_user_id(user_id)
+    return int(record["telegram_id"]) if record else None
+
+
+def invalidate_identity(telegram_id: Optional[int] = None, user_id: Optional[int] = None) -> None:
+    identity_cache.invalidate(telegram_id=telegram_id, user_id=user_id)
@@ -0,0 +1,101 @@
+"""
+Зустрічні лоти з таблиці lot_matches (міграція 9).
+
+Пари «лот ↔ зустрічний лот» з оцінкою рахуються тригерами на lots у момент
+створення/зміни/закриття лота, тому екран «🔁 Зустрічні» — одне читання по
+індексу idx_lot_matches_owner, а сповіщення про новий зустрічний лот беруть
+адресатів з idx_lot_matches_match без повторного перебору лотів і йдуть
+через send_queue з найнижчим пріоритетом.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Set
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.bot.db import db_connection
+from src.bot.services.identity import get_telegram_id
+from src.bot.services.send_queue import PRIORITY_PROMO, send_queue
+
+logger = logging.getLogger(__name__)
+
+MATCH_NOTIFY_MIN_SCORE = int(os.getenv("MATCH_NOTIFY_MIN_SCORE", "60"))
+MATCH_NOTIFY_LIMIT = int(os.getenv("MATCH_NOTIFY_LIMIT", "20"))
+
+# Шаблон для paged_lists: keyset по (score, id) — у HAVING, бо score агрегат
+SQL_COUNTER_LOTS = """
+    SELECT l.*, u.company, MAX(m.score) AS score
+    FROM lot_matches m
+    JOIN lots l ON l.id = m.match_lot_id
+    LEFT JOIN users u ON u.id = l.owner_user_id
+    WHERE m.owner_user_id = ?
+    GROUP BY m.match_lot_id
+    HAVING 1 {keyset}
+    ORDER BY {order}
+    LIMIT ?
+"""
+COUNTER_LOTS_KEYS = [("MAX(m.score)", "score"), ("l.id", "id")]
+
+SQL_MATCH_RECIPIENTS = """
+    SELECT owner_user_id, MAX(score) AS score
+    FROM lot_matches
+    WHERE match_lot_id = ? AND score >= ?
+    GROUP BY owner_user_id
+    ORDER BY score DESC
+    LIMIT ?
+"""
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def _match_text(lot: dict, score: int) -> str:
+    lot_type = "📤 Продам" if lot["type"] == "sell" else "📥 Куплю"
+    vol = lot.get("volume_tons") or lot.get("volume") or "—"
+    price = lot["price"] if lot.get("price") else "Договірна"
+    return (
+        f"🔁 <b>Нова зустрічна пропозиція</b> (збіг {score}%)\n\n"
+        f"{lot_type} <b>{lot['crop']}</b>\n"
+        f"📦 Обсяг: {vol} т\n"
+        f"💰 Ціна: {price} грн/т\n"
+        f"📍 {lot['region']}"
+    )
+
+
+async def notify_new_matches(lot_id: int) -> int:
+    """Ставить у чергу сповіщення власникам лотів, для яких lot_id — новий зустрічний. Повертає к-сть."""
+    async with db_connection() as db:
+        cur = await db.execute("SELECT * FROM lots WHERE id = ? AND status = 'active'", (lot_id,))
+        lot = await cur.fetchone()
+        if not lot:
+            return 0
+        cur = await db.execute(SQL_MATCH_RECIPIENTS, (lot_id, MATCH_NOTIFY_MIN_SCORE, MATCH_NOTIFY_LIMIT))
+        recipients = await cur.fetchall()
+
+    lot = dict(lot)
+    kb = InlineKeyboardBuilder()
+    kb.button(text="💬 Написати", callback_data=f"chat:start:lot:{lot_id}")
+    kb.button(text="💰 Запропонувати ціну", callback_data=f"offer:make:{lot_id}")
+    kb.adjust(2)
+    markup = kb.as_markup()
+
+    sent = 0
+    for r in recipients:
+        tg_id = await get_telegram_id(r["owner_user_id"])
+        if not tg_id:
+            continue
+        send_queue.send_message(tg_id, _match_text(lot, r["score"]), reply_markup=markup,
+                                priority=PRIORITY_PROMO)
+        sent += 1
+    if sent:
+        logger.info("Лот %s: у черзі %s сповіщень власникам зустрічних лотів", lot_id, sent)
+    return sent
+
+
+def schedule_match_notifications(lot_id: int) -> None:
+    """Запускає notify_new_matches у фоні — відповідь автору лота не чекає вибірки адресатів."""
+    task = asyncio.create_task(notify_new_matches(lot_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
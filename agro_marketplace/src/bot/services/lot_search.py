@@ -0,0 +1,52 @@
+"""
+Повнотекстовий пошук активних лотів (🔎 Пошук у маркеті).
+
+Індекс lots_fts (міграція 7) містить лише активні лоти; текст crop/region/
+location/comment згорнутий fold_sql, запит будується folded_match_query.
+Результати ранжуються bm25 з вагами колонок (культура важить найбільше),
+при рівному ранзі — новіші вище. Запит іде по FTS5, лоти підтягуються по
+первинному ключу:
+
+    SCAN lots_fts VIRTUAL TABLE INDEX 0:M...
+    SEARCH l USING INTEGER PRIMARY KEY (rowid=?)
+"""
+from __future__ import annotations
+
+import logging
+from typing import List, Tuple
+
+from src.bot.db import db_connection
+from src.database.fts import folded_match_query
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 5
+
+# bm25: crop, region, location, comment
+_BM25 = "bm25(lots_fts, 5.0, 3.0, 1.0, 1.0)"
+
+SQL_SEARCH = f"""
+    SELECT l.*
+    FROM lots_fts
+    JOIN lots l ON l.id = lots_fts.rowid
+    WHERE lots_fts MATCH ?
+    ORDER BY {_BM25}, lots_fts.rowid DESC
+    LIMIT ? OFFSET ?
+"""
+SQL_COUNT = "SELECT COUNT(*) FROM lots_fts WHERE lots_fts MATCH ?"
+
+
+async def search_lots(text: str, page: int = 0,
+                      page_size: int = SEARCH_PAGE_SIZE) -> Tuple[List[dict], int]:
+    """(лоти сторінки page, загальна кількість збігів)."""
+    match = folded_match_query(text)
+    if not match:
+        return [], 0
+    async with db_connection() as db:
+        cur = await db.execute(SQL_COUNT, (match,))
+        total = (await cur.fetchone())[0]
+        if not total:
+            return [], 0
+        cur = await db.execute(SQL_SEARCH, (match, page_size, page * page_size))
+        rows = await cur.fetchall()
+    return [dict(r) for r in rows], total
@@ -0,0 +1,116 @@
+"""
+Перегляд біржових пропозицій з фільтрами і keyset-пагінацією.
+
+Фільтр: тип (обов'язковий), культура, область, ціновий діапазон. Сторінки йдуть
+по (created_at, id) DESC: «далі» — (created_at, id) < курсор, «назад» —
+(created_at, id) > курсор у зворотному порядку. Під кожну форму фільтра є
+частковий індекс WHERE status='active' (міграція 8):
+
+    type                  → idx_lots_browse_t   (type, created_at, id, price_value)
+    type + crop           → idx_lots_browse_tc  (type, crop, created_at, id, price_value)
+    type + region         → idx_lots_browse_tr  (type, region, created_at, id, price_value)
+    type + crop + region  → idx_lots_browse_tcr (type, crop, region, created_at, id, price_value)
+
+Діапазон ціни фільтрується по числовій price_value (міграція 12) прямо в
+індексі перегляду (міграція 22). Умови записані як +price_value: інакше
+планувальник бере idx_lots_price_value (crop, type, price_value) і сортує
+весь діапазон цін заради однієї сторінки (USE TEMP B-TREE FOR ORDER BY).
+Фільтри якості йдуть по згенерованих
+колонках quality_moisture/quality_trash (міграція 13) з частковими індексами
+(type, crop, quality_*).
+Запит містить status = 'active' літералом, інакше частковий індекс не застосовується.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from src.bot.db import db_connection
+
+logger = logging.getLogger(__name__)
+
+BROWSE_PAGE_SIZE = 5
+
+Cursor = Tuple[str, int]  # (created_at, id)
+
+
+@dataclass
+class BrowseFilter:
+    lot_type: str
+    crop: Optional[str] = None
+    region: Optional[str] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    negotiable: bool = False  # лише без ціни (price_value IS NULL)
+    moisture_max: Optional[float] = None  # quality_moisture ≤
+    trash_max: Optional[float] = None     # quality_trash ≤
+
+    def where(self) -> Tuple[List[str], list]:
+        where, params = ["status = 'active'", "type = ?"], [self.lot_type]
+        if self.crop:
+            where.append("crop = ?")
+            params.append(self.crop)
+        if self.region:
+            where.append("region = ?")
+            params.append(self.region)
+        if self.negotiable:
+            where.append("+price_value IS NULL")
+        else:
+            if self.price_min is not None:
+                where.append("+price_value >= ?")
+                params.append(self.price_min)
+            if self.price_max is not None:
+                where.append("+price_value < ?")
+                params.append(self.price_max)
+        if self.moisture_max is not None:
+            where.append("quality_moisture <= ?")
+            params.append(self.moisture_max)
+        if self.trash_max is not None:
+            where.append("quality_trash <= ?")
+            params.append(self.trash_max)
+        return where, params
+
+
+@dataclass
+class BrowsePage:
+    lots: List[dict]
+    newer: Optional[Cursor] = None  # курсор для «назад»
+    older: Optional[Cursor] = None  # курсор для «далі»
+
+
+async def browse_lots(flt: BrowseFilter, before: Optional[Cursor] = None,
+                      after: Optional[Cursor] = None,
+                      page_size: int = BROWSE_PAGE_SIZE) -> BrowsePage:
+    where, params = flt.where()
+    if after is not None:
+        where.append("(created_at, id) > (?, ?)")
+        params.extend(after)
+        order = "ASC"
+    else:
+        if before is not None:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+        order = "DESC"
+
+    sql = (
+        f"SELECT * FROM lots WHERE {' AND '.join(where)} "
+        f"ORDER BY created_at {order}, id {order} LIMIT ?"
+    )
+    async with db_connection() as db:
+        cur = await db.execute(sql, (*params, page_size + 1))
+        rows = [dict(r) for r in await cur.fetchall()]
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if after is not None:
+        rows.reverse()
+
+    page = BrowsePage(lots=rows)
+    if rows:
+        first, last = rows[0], rows[-1]
+        if (has_more if after is None else True) and last["created_at"] is not None:
+            page.older = (last["created_at"], last["id"])
+        if before is not None or (after is not None and has_more):
+            page.newer = (first["created_at"], first["id"])
+    return page
@@ -0,0 +1,100 @@
+"""
+Агрегати цін для «📈 Ціни».
+
+Таблиця price_stats (міграція 11) оновлюється тригерами на lots при кожній
+зміні лота, тож екран цін читає кілька рядків на культуру замість
+AVG/MIN/MAX по всіх активних лотах. Раз на PRICE_STATS_RECONCILE_INTERVAL
+секунд фонова звірка перераховує агрегати з lots і виправляє групи, що
+розійшлися (похибка суми float, правки БД в обхід тригерів).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from src.bot.db import db_connection
+from src.database.price_stats import AGGREGATE_SQL, CROP_SUMMARY_SQL
+
+logger = logging.getLogger(__name__)
+
+PRICE_STATS_RECONCILE_INTERVAL = float(os.getenv("PRICE_STATS_RECONCILE_INTERVAL", "3600"))
+
+_FIELDS = ("cnt", "sum_price", "min_price", "max_price")
+
+
+async def crop_summary(limit: int = 10) -> List[dict]:
+    """Кількість/середня/мін/макс ціни по культурах, найпопулярніші першими."""
+    async with db_connection() as db:
+        cur = await db.execute(CROP_SUMMARY_SQL, (limit,))
+        return [dict(r) for r in await cur.fetchall()]
+
+
+def _same(a: tuple, b: tuple) -> bool:
+    return a[0] == b[0] and all(abs((x or 0) - (y or 0)) < 1e-6 for x, y in zip(a[1:], b[1:]))
+
+
+class PriceStatsReconciler:
+    """Періодична звірка price_stats з lots."""
+
+    def __init__(self, interval: float = PRICE_STATS_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def reconcile(self) -> int:
+        """Виправляє розбіжності; повертає кількість виправлених груп."""
+        async with db_connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = await db.execute(AGGREGATE_SQL)
+                fresh = {(r["crop"], r["region"], r["type"]): tuple(r[f] for f in _FIELDS)
+                         for r in await cur.fetchall()}
+                cur = await db.execute(f"SELECT crop, region, type, {', '.join(_FIELDS)} FROM price_stats")
+                stored = {(r["crop"], r["region"], r["type"]): tuple(r[f] for f in _FIELDS)
+                          for r in await cur.fetchall()}
+
+                stale = [k for k in stored if k not in fresh]
+                changed = [(*k, *v) for k, v in fresh.items() if k not in stored or not _same(v, stored[k])]
+                if stale:
+                    await db.executemany(
+                        "DELETE FROM price_stats WHERE crop = ? AND region = ? AND type = ?", stale
+                    )
+                if changed:
+                    await db.executemany(
+                        "INSERT OR REPLACE INTO price_stats (crop, region, type, cnt, sum_price, min_price, max_price) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        changed,
+                    )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        fixed = len(stale) + len(changed)
+        if fixed:
+            logger.info("price_stats: виправлено %s груп із %s", fixed, len(fresh))
+        return fixed
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error("Помилка звірки price_stats: %s", e)
+
+
+price_stats_reconciler = PriceStatsReconciler()
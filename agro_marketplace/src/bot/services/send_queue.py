@@ -0,0 +1,361 @@
+"""
+Черга вихідних повідомлень бота.
+
+Хендлери і фонові сервіси не викликають bot.send_* напряму, а ставлять
+повідомлення в чергу й одразу повертаються. Один диспетчер відправляє їх з
+дотриманням лімітів Telegram:
+
+- глобальний token bucket (SEND_GLOBAL_RATE повідомлень/с) і окремий bucket
+  на кожен чат (SEND_PER_CHAT_RATE/с, сплеск до SEND_PER_CHAT_BURST);
+- класи пріоритету: CHAT (пересилання в чатах) > TRANSACTIONAL (пропозиції,
+  бан, статуси лотів) > PROMO (зустрічні лоти, підписки);
+- у межах чату порядок зберігається: поки повідомлення в польоті або чекає
+  повтору, наступні для того ж чату чекають;
+- coalesce_key: нове повідомлення з тим самим ключем замінює ще не
+  відправлене (напр. «бан» → «розбан» — доходить лише останнє);
+- TelegramRetryAfter призупиняє відправку на retry_after секунд, а
+  повідомлення повертається в чергу; мережеві/5xx помилки — повтор з
+  експоненційною затримкою.
+
+submit() — те саме, але з очікуванням результату: для масових розсилок, яким
+потрібен підсумок кожної відправки і зворотний тиск (services.broadcasts).
+
+stats() — глибина черги по пріоритетах, лічильники і затримка від постановки
+до відправки (середня, p95); раз на SEND_QUEUE_STATS_INTERVAL секунд
+знімок пишеться в лог, якщо черга працювала.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+logger = logging.getLogger(__name__)
+
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_PER_CHAT_RATE = float(os.getenv("SEND_PER_CHAT_RATE", "1"))
+SEND_PER_CHAT_BURST = float(os.getenv("SEND_PER_CHAT_BURST", "3"))
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "10"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+SEND_QUEUE_STATS_INTERVAL = float(os.getenv("SEND_QUEUE_STATS_INTERVAL", "60"))
+SEND_QUEUE_DRAIN_TIMEOUT = float(os.getenv("SEND_QUEUE_DRAIN_TIMEOUT", "5"))
+
+# Класи пріоритету — менше число відправляється раніше
+PRIORITY_CHAT = 0
+PRIORITY_TRANSACTIONAL = 1
+PRIORITY_PROMO = 2
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_TRANSACTIONAL: "transactional", PRIORITY_PROMO: "promo"}
+
+_LATENCY_WINDOW = 1000
+_BUCKET_IDLE_TTL = 300
+
+FailureCallback = Callable[[Exception], Awaitable[Any]]
+
+
+class TokenBucket:
+    """rate токенів/с, не більше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Бере токен і повертає 0, або повертає скільки чекати (токен не береться)."""
+        if now < self.updated:
+            return self.updated - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, until: float) -> None:
+        """Жодних токенів до моменту until (RetryAfter)."""
+        self.tokens = 0.0
+        self.updated = max(self.updated, until)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    method: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False)
+    coalesce_key: Optional[str] = field(default=None, compare=False)
+    on_failure: Optional[FailureCallback] = field(default=None, compare=False)
+    enqueued_at: float = field(default=0.0, compare=False)
+    attempts: int = field(default=0, compare=False)
+    future: Optional[asyncio.Future] = field(default=None, compare=False)
+
+
+class SendQueue:
+    """Пріоритетна черга відправки з token bucket лімітами."""
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        per_chat_rate: float = SEND_PER_CHAT_RATE,
+        per_chat_burst: float = SEND_PER_CHAT_BURST,
+        concurrency: int = SEND_CONCURRENCY,
+    ):
+        self.bot = None
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.concurrency = concurrency
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._ready: List[_Job] = []
+        self._delayed: List[Tuple[float, int, _Job]] = []
+        self._parked: Dict[int, Deque[_Job]] = {}
+        self._in_flight: Set[int] = set()
+        self._retrying: Dict[int, _Job] = {}  # чат → повідомлення, що чекає повтору
+        self._by_key: Dict[str, _Job] = {}
+        self._depth = {p: 0 for p in PRIORITY_NAMES}
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._sends: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stats_task: Optional[asyncio.Task] = None
+        self._latency: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._counters = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "coalesced": 0, "flood_waits": 0}
+        self._reported = 0
+
+    # ---------- Постановка в чергу ----------
+
+    def enqueue(
+        self,
+        method: str,
+        chat_id: int,
+        *,
+        priority: int = PRIORITY_TRANSACTIONAL,
+        coalesce_key: Optional[str] = None,
+        on_failure: Optional[FailureCallback] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Ставить виклик bot.<method>(chat_id, **kwargs) у чергу й одразу повертається.
+        on_failure(exc) викликається, якщо повідомлення так і не вдалося надіслати.
+        """
+        now = time.monotonic()
+        self._counters["enqueued"] += 1
+        if coalesce_key is not None:
+            pending = self._by_key.get(coalesce_key)
+            if pending is not None and pending.chat_id == chat_id:
+                pending.method = method
+                pending.kwargs = kwargs
+                pending.on_failure = on_failure
+                self._counters["coalesced"] += 1
+                return
+        self._seq += 1
+        job = _Job(priority, self._seq, chat_id, method, kwargs, coalesce_key, on_failure, now)
+        if coalesce_key is not None:
+            self._by_key[coalesce_key] = job
+        self._push(job)
+
+    async def submit(self, method: str, chat_id: int, *, priority: int = PRIORITY_PROMO, **kwargs) -> Any:
+        """Ставить у чергу і чекає відправки; повертає результат bot.<method> або кидає помилку."""
+        self._counters["enqueued"] += 1
+        self._seq += 1
+        future = asyncio.get_running_loop().create_future()
+        self._push(_Job(priority, self._seq, chat_id, method, kwargs, enqueued_at=time.monotonic(), future=future))
+        return await future
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.enqueue("send_message", chat_id, text=text, **kwargs)
+
+    def _push(self, job: _Job, delay: float = 0.0) -> None:
+        self._depth[job.priority] += 1
+        self._idle.clear()
+        if delay > 0:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, job.seq, job))
+        else:
+            heapq.heappush(self._ready, job)
+        self._wakeup.set()
+
+    # ---------- Метрики ----------
+
+    def depth(self) -> int:
+        return sum(self._depth.values())
+
+    def stats(self) -> dict:
+        latency = sorted(self._latency)
+        return {
+            "depth": self.depth(),
+            "depth_by_priority": {PRIORITY_NAMES[p]: n for p, n in self._depth.items()},
+            "in_flight": len(self._in_flight),
+            **self._counters,
+            "latency_avg_ms": round(sum(latency) / len(latency) * 1000, 1) if latency else 0.0,
+            "latency_p95_ms": round(latency[min(len(latency) - 1, int(len(latency) * 0.95))] * 1000, 1)
+            if latency else 0.0,
+        }
+
+    # ---------- Життєвий цикл ----------
+
+    async def start(self, bot) -> None:
+        self.bot = bot
+        if self._task is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._loop())
+            self._stats_task = asyncio.create_task(self._stats_loop())
+
+    async def stop(self) -> None:
+        """Дочікується відправки черги (до SEND_QUEUE_DRAIN_TIMEOUT с) і зупиняється."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), SEND_QUEUE_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("send_queue: зупинка з %s невідправленими повідомленнями", self.depth())
+        for task in (self._task, self._stats_task, *self._sends):
+            task.cancel()
+        for task in (self._task, self._stats_task, *self._sends):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = self._stats_task = None
+        self._sends.clear()
+
+    # ---------- Диспетчер ----------
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    async def _next_job(self) -> _Job:
+        """Найпріоритетніше повідомлення, чий чат вільний і має токен."""
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                heapq.heappush(self._ready, heapq.heappop(self._delayed)[2])
+            while self._ready:
+                job = heapq.heappop(self._ready)
+                if job.chat_id in self._in_flight and self._retrying.get(job.chat_id) is not job:
+                    self._parked.setdefault(job.chat_id, deque()).append(job)
+                    continue
+                wait = self._chat_bucket(job.chat_id).reserve(now)
+                if wait > 0:
+                    heapq.heappush(self._delayed, (now + wait, job.seq, job))
+                    continue
+                return job
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _loop(self) -> None:
+        while True:
+            job = await self._next_job()
+            while True:
+                wait = self._global.reserve(time.monotonic())
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+            await self._slots.acquire()
+            self._depth[job.priority] -= 1
+            if job.coalesce_key is not None and self._by_key.get(job.coalesce_key) is job:
+                del self._by_key[job.coalesce_key]
+            self._retrying.pop(job.chat_id, None)
+            self._in_flight.add(job.chat_id)
+            task = asyncio.create_task(self._deliver(job))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _deliver(self, job: _Job) -> None:
+        try:
+            result = await getattr(self.bot, job.method)(job.chat_id, **job.kwargs)
+            self._counters["sent"] += 1
+            self._latency.append(time.monotonic() - job.enqueued_at)
+            if job.future is not None and not job.future.done():
+                job.future.set_result(result)
+        except TelegramRetryAfter as e:
+            self._counters["flood_waits"] += 1
+            until = time.monotonic() + e.retry_after
+            self._global.block(until)
+            self._chat_bucket(job.chat_id).block(until)
+            logger.warning("send_queue: flood control, пауза %s с", e.retry_after)
+            if not self._retry(job, 0.0):
+                await self._fail(job, e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if not self._retry(job, 2.0 ** job.attempts):
+                await self._fail(job, e)
+        except Exception as e:
+            await self._fail(job, e)
+        finally:
+            # Повідомлення чекає повтору — чат лишається зайнятим, наступні не обганяють його
+            if self._retrying.get(job.chat_id) is not job:
+                self._in_flight.discard(job.chat_id)
+                parked = self._parked.pop(job.chat_id, None)
+                if parked:
+                    for waiting in parked:
+                        heapq.heappush(self._ready, waiting)
+            self._slots.release()
+            self._wakeup.set()
+            if not self.depth() and not self._in_flight:
+                self._idle.set()
+
+    def _retry(self, job: _Job, delay: float) -> bool:
+        job.attempts += 1
+        if job.attempts > SEND_MAX_RETRIES:
+            return False
+        self._counters["retried"] += 1
+        # Чат лишається в _in_flight, доки повтор не піде в роботу (_loop)
+        self._retrying[job.chat_id] = job
+        self._push(job, delay)
+        return True
+
+    async def _fail(self, job: _Job, exc: Exception) -> None:
+        self._counters["failed"] += 1
+        if job.future is not None:
+            # Результат чекає викликач submit() — він і вирішує, що логувати
+            if not job.future.done():
+                job.future.set_exception(exc)
+            return
+        logger.warning("send_queue: %s → %s не надіслано: %s", job.method, job.chat_id, exc)
+        if job.on_failure is not None:
+            try:
+                await job.on_failure(exc)
+            except Exception as e:
+                logger.error("send_queue: помилка on_failure: %s", e)
+
+    async def _stats_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SEND_QUEUE_STATS_INTERVAL)
+            now = time.monotonic()
+            for chat_id in [c for c, b in self._chats.items()
+                            if c not in self._in_flight and b.updated < now - _BUCKET_IDLE_TTL and b.idle(now)]:
+                del self._chats[chat_id]
+            if self._counters["enqueued"] != self._reported:
+                self._reported = self._counters["enqueued"]
+                logger.info("send_queue: %s", self.stats())
+
+
+send_queue = SendQueue()
@@ -0,0 +1,518 @@
+"""
+Постійні запити: цінові сповіщення (price_alerts) і збережені фільтри біржі
+(saved_searches).
+
+Активні підписки тримаються в пам'яті, розкладені по кошиках:
+
+    сповіщення «нижче»  (культура, область|*) → [(поріг, id)] за зростанням — sell-лоти
+    сповіщення «вище»   (культура, область|*) → [(поріг, id)] за зростанням — buy-лоти
+    збережені фільтри   (тип, культура|*, область|*) → дерево інтервалів [від, до),
+                        окремо «будь-яка ціна» і «договірна»
+
+Лот перевіряється кількома пошуками в словнику, bisect у відсортованому
+списку порогів і спуском по дереву інтервалів — O(log n + k) замість
+перебору всіх підписок. Нові й змінені активні лоти потрапляють у
+lot_alert_queue тригерами (міграція 10), фоновий цикл розбирає чергу
+пачками: один UPDATE last_triggered на пачку, одне повідомлення на
+користувача (скільки б його підписок не спрацювало). Підписка спрацьовує не
+частіше ніж раз на ALERT_COOLDOWN секунд: лоти, що збіглися під час паузи,
+відкладаються в lot_alert_deferred (міграція 21) і приходять одним дайджестом,
+коли пауза мине. Створення лота цього не чекає.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.bot.db import db_connection
+from src.bot.services.identity import get_telegram_id
+from src.bot.services.market_browse import BrowseFilter
+from src.bot.services.send_queue import PRIORITY_PROMO, send_queue
+
+logger = logging.getLogger(__name__)
+
+ALERT_COOLDOWN = float(os.getenv("ALERT_COOLDOWN", "3600"))
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "500"))
+ALERT_POLL_INTERVAL = float(os.getenv("ALERT_POLL_INTERVAL", "5"))
+ALERT_RELOAD_INTERVAL = float(os.getenv("ALERT_RELOAD_INTERVAL", "600"))
+MAX_SUBSCRIPTIONS = 20  # на користувача
+MAX_LOTS_PER_MESSAGE = 5
+
+ALERT = "alert"
+SEARCH = "search"
+
+_INF = float("inf")
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Поля лота для match і тексту сповіщення (l — lots)
+_LOT_COLUMNS = ("l.owner_user_id, l.type, l.crop, l.region, l.price_value AS price, "
+                "l.volume_tons, l.status, l.quality_moisture, l.quality_trash")
+
+
+def _norm(value) -> Optional[str]:
+    return (value or "").strip().lower() or None
+
+
+def _price(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _epoch(value) -> float:
+    if not value:
+        return 0.0
+    try:
+        return datetime.strptime(str(value)[:19], _TS_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return 0.0
+
+
+@dataclass
+class Subscription:
+    kind: str  # ALERT | SEARCH
+    id: int
+    user_id: int
+    title: str
+    last_triggered: float = 0.0
+    moisture_max: Optional[float] = None  # лише збережені фільтри
+    trash_max: Optional[float] = None
+
+    def accepts_quality(self, lot) -> bool:
+        if self.moisture_max is not None and not (
+                lot["quality_moisture"] is not None and lot["quality_moisture"] <= self.moisture_max):
+            return False
+        if self.trash_max is not None and not (
+                lot["quality_trash"] is not None and lot["quality_trash"] <= self.trash_max):
+            return False
+        return True
+
+
+def alert_title(crop: str, region: Optional[str], threshold: float, condition: str) -> str:
+    sign = "≤" if condition == "below" else "≥"
+    return f"{crop} {sign} {threshold:.0f} грн/т · {region or 'вся Україна'}"
+
+
+def search_title(flt: BrowseFilter) -> str:
+    parts = ["📤 Продаж" if flt.lot_type == "sell" else "📥 Купівля",
+             flt.crop or "всі культури", flt.region or "вся Україна"]
+    if flt.negotiable:
+        parts.append("Договірна")
+    elif flt.price_min is not None or flt.price_max is not None:
+        low = f"{flt.price_min:.0f}" if flt.price_min is not None else "…"
+        high = f"{flt.price_max:.0f}" if flt.price_max is not None else "…"
+        parts.append(f"{low}–{high}")
+    if flt.moisture_max is not None:
+        parts.append(f"💧 ≤ {flt.moisture_max:g}%")
+    if flt.trash_max is not None:
+        parts.append(f"🧹 ≤ {flt.trash_max:g}%")
+    return " · ".join(parts)
+
+
+class IntervalTree:
+    """
+    Статичне центроване дерево напіввідкритих інтервалів [low, high) з id:
+    stab(x) — id усіх інтервалів, що містять x, за O(log n + k).
+    Центр вузла — «від» медіанного інтервалу, тож вузол ніколи не порожній.
+    """
+
+    __slots__ = ("center", "by_low", "by_high", "left", "right")
+
+    def __init__(self, intervals: List[Tuple[float, float, int]]):
+        intervals = sorted(intervals)
+        c = self.center = intervals[len(intervals) // 2][0]
+        here = [iv for iv in intervals if iv[0] <= c < iv[1]]
+        left = [iv for iv in intervals if iv[1] <= c]
+        right = [iv for iv in intervals if iv[0] > c]
+        self.by_low = here                                    # «від» за зростанням
+        self.by_high = sorted(here, key=lambda iv: -iv[1])    # «до» за спаданням
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def stab(self, x: float) -> List[int]:
+        hits: List[int] = []
+        node = self
+        while node is not None:
+            if x < node.center:
+                # «до» усіх інтервалів вузла > center > x — лишається «від» ≤ x
+                for low, _, i in node.by_low:
+                    if low > x:
+                        break
+                    hits.append(i)
+                node = node.left
+            else:
+                # «від» усіх інтервалів вузла ≤ center ≤ x — лишається «до» > x
+                for _, high, i in node.by_high:
+                    if high <= x:
+                        break
+                    hits.append(i)
+                node = node.right
+        return hits
+
+
+class StandingQueryIndex:
+    """Індекс активних підписок у пам'яті."""
+
+    def __init__(self):
+        self.subs: Dict[Tuple[str, int], Subscription] = {}
+        self._below: Dict[tuple, list] = defaultdict(list)
+        self._above: Dict[tuple, list] = defaultdict(list)
+        self._ranged: Dict[tuple, list] = defaultdict(list)
+        self._trees: Dict[tuple, IntervalTree] = {}  # будуються ліниво з _ranged
+        self._any_price: Dict[tuple, list] = defaultdict(list)
+        self._negotiable: Dict[tuple, list] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.subs)
+
+    def add_alert(self, row) -> None:
+        threshold = float(row["price_threshold"])
+        key = (_norm(row["crop"]), _norm(row["region"]))
+        target = self._below if row["condition"] == "below" else self._above
+        insort(target[key], (threshold, row["id"]))
+        self.subs[(ALERT, row["id"])] = Subscription(
+            ALERT, row["id"], row["user_id"],
+            alert_title(row["crop"], row["region"], threshold, row["condition"]),
+            _epoch(row["last_triggered"]),
+        )
+
+    def add_search(self, row) -> None:
+        key = (row["lot_type"], _norm(row["crop"]), _norm(row["region"]))
+        low, high = _price(row["price_min"]), _price(row["price_max"])
+        if row["negotiable"]:
+            self._negotiable[key].append(row["id"])
+        elif low is None and high is None:
+            self._any_price[key].append(row["id"])
+        else:
+            self._ranged[key].append((-_INF if low is None else low, _INF if high is None else high, row["id"]))
+            self._trees.pop(key, None)
+        flt = BrowseFilter(lot_type=row["lot_type"], crop=row["crop"], region=row["region"],
+                           price_min=low, price_max=high, negotiable=bool(row["negotiable"]),
+                           moisture_max=row["moisture_max"], trash_max=row["trash_max"])
+        self.subs[(SEARCH, row["id"])] = Subscription(
+            SEARCH, row["id"], row["user_id"], search_title(flt), _epoch(row["last_triggered"]),
+            flt.moisture_max, flt.trash_max,
+        )
+
+    def remove(self, kind: str, sub_id: int) -> None:
+        # Записи в кошиках лишаються до наступного перезавантаження — match їх пропускає
+        self.subs.pop((kind, sub_id), None)
+
+    def _tree(self, key: tuple) -> Optional[IntervalTree]:
+        tree = self._trees.get(key)
+        if tree is None and self._ranged.get(key):
+            tree = self._trees[key] = IntervalTree(self._ranged[key])
+        return tree
+
+    def match(self, lot) -> List[Subscription]:
+        """Підписки, яким відповідає лот."""
+        crop, region = _norm(lot["crop"]), _norm(lot["region"])
+        price = _price(lot["price"])
+        hits: List[Tuple[str, int]] = []
+
+        if price is not None:
+            for reg in (region, None):
+                if lot["type"] == "sell":
+                    # «нижче»: ціна ≤ порогу → пороги від price і вище
+                    entries = self._below.get((crop, reg))
+                    if entries:
+                        hits += [(ALERT, i) for _, i in entries[bisect_left(entries, (price, -_INF)):]]
+                else:
+                    # «вище»: ціна ≥ порогу → пороги до price включно
+                    entries = self._above.get((crop, reg))
+                    if entries:
+                        hits += [(ALERT, i) for _, i in entries[:bisect_right(entries, (price, _INF))]]
+
+        for c in (crop, None):
+            for reg in (region, None):
+                key = (lot["type"], c, reg)
+                hits += [(SEARCH, i) for i in self._any_price.get(key, ())]
+                if price is None:
+                    hits += [(SEARCH, i) for i in self._negotiable.get(key, ())]
+                    continue
+                tree = self._tree(key)
+                if tree is not None:
+                    hits += [(SEARCH, i) for i in tree.stab(price)]
+
+        # Умови якості в кошики не входять — перевіряються на вже знайдених
+        subs = [self.subs[h] for h in hits if h in self.subs]
+        return [s for s in subs if s.accepts_quality(lot)]
+
+
+class StandingQueryEngine:
+    """Фоновий розбір lot_alert_queue і розсилка сповіщень."""
+
+    def __init__(self):
+        self.index = StandingQueryIndex()
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._loaded_at = 0.0
+        # Лоти, що збіглися під час паузи підписки: (kind, id) → lot_id (дзеркало lot_alert_deferred)
+        self._deferred: Dict[Tuple[str, int], Set[int]] = defaultdict(set)
+
+    # ---------- Індекс ----------
+
+    async def load(self) -> None:
+        """Повністю перебудовує індекс з БД."""
+        index = StandingQueryIndex()
+        async with db_connection() as db:
+            cur = await db.execute("SELECT * FROM price_alerts WHERE active = 1")
+            for row in await cur.fetchall():
+                index.add_alert(row)
+            cur = await db.execute("SELECT * FROM saved_searches WHERE active = 1")
+            for row in await cur.fetchall():
+                index.add_search(row)
+            cur = await db.execute("SELECT kind, sub_id, lot_id FROM lot_alert_deferred")
+            deferred: Dict[Tuple[str, int], Set[int]] = defaultdict(set)
+            for kind, sub_id, lot_id in await cur.fetchall():
+                deferred[(kind, sub_id)].add(lot_id)
+        # Час спрацювання, ще не записаний у БД, не втрачаємо
+        for key, sub in index.subs.items():
+            old = self.index.subs.get(key)
+            if old:
+                sub.last_triggered = max(sub.last_triggered, old.last_triggered)
+        self.index = index
+        self._deferred = deferred
+        self._loaded_at = time.monotonic()
+        logger.info("StandingQueries: %s активних підписок", len(index))
+
+    # ---------- Підписки ----------
+
+    async def _count(self, db, user_id: int) -> int:
+        cur = await db.execute(
+            "SELECT (SELECT COUNT(*) FROM price_alerts WHERE user_id = ? AND active = 1)"
+            " + (SELECT COUNT(*) FROM saved_searches WHERE user_id = ? AND active = 1)",
+            (user_id, user_id),
+        )
+        return (await cur.fetchone())[0]
+
+    async def add_alert(self, user_id: int, crop: str, region: Optional[str],
+                        threshold: float, condition: str) -> Optional[int]:
+        """Нове цінове сповіщення; None — якщо вичерпано ліміт підписок."""
+        async with db_connection() as db:
+            if await self._count(db, user_id) >= MAX_SUBSCRIPTIONS:
+                return None
+            cur = await db.execute(
+                "INSERT INTO price_alerts (user_id, crop, region, price_threshold, condition) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, crop, region, threshold, condition),
+            )
+            await db.commit()
+            cur = await db.execute("SELECT * FROM price_alerts WHERE id = ?", (cur.lastrowid,))
+            row = await cur.fetchone()
+        self.index.add_alert(row)
+        return row["id"]
+
+    async def add_search(self, user_id: int, flt: BrowseFilter) -> Optional[int]:
+        """Зберігає фільтр біржі як підписку; None — якщо вичерпано ліміт."""
+        async with db_connection() as db:
+            if await self._count(db, user_id) >= MAX_SUBSCRIPTIONS:
+                return None
+            cur = await db.execute(
+                "INSERT INTO saved_searches (user_id, lot_type, crop, region, price_min, price_max, negotiable, "
+                "moisture_max, trash_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, flt.lot_type, flt.crop, flt.region, flt.price_min, flt.price_max, int(flt.negotiable),
+                 flt.moisture_max, flt.trash_max),
+            )
+            await db.commit()
+            cur = await db.execute("SELECT * FROM saved_searches WHERE id = ?", (cur.lastrowid,))
+            row = await cur.fetchone()
+        self.index.add_search(row)
+        return row["id"]
+
+    async def remove(self, user_id: int, kind: str, sub_id: int) -> bool:
+        table = "price_alerts" if kind == ALERT else "saved_searches"
+        async with db_connection() as db:
+            cur = await db.execute(f"DELETE FROM {table} WHERE id = ? AND user_id = ?", (sub_id, user_id))
+            if cur.rowcount:
+                await db.execute("DELETE FROM lot_alert_deferred WHERE kind = ? AND sub_id = ?", (kind, sub_id))
+            await db.commit()
+        self.index.remove(kind, sub_id)
+        if cur.rowcount:
+            self._deferred.pop((kind, sub_id), None)
+        return cur.rowcount > 0
+
+    def user_subscriptions(self, user_id: int) -> List[Subscription]:
+        subs = [s for s in self.index.subs.values() if s.user_id == user_id]
+        return sorted(subs, key=lambda s: (s.kind, s.id))
+
+    # ---------- Фоновий цикл ----------
+
+    def wake(self) -> None:
+        """Підштовхує розбір черги (після створення/активації лота)."""
+        self._wake.set()
+
+    async def start(self) -> None:
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), ALERT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if time.monotonic() - self._loaded_at > ALERT_RELOAD_INTERVAL:
+                    await self.load()
+                while await self.process_batch() >= ALERT_BATCH_SIZE:
+                    pass
+            except Exception as e:
+                logger.error("Помилка StandingQueries: %s", e)
+
+    async def process_batch(self) -> int:
+        """Розбирає одну пачку черги і відкладені лоти, чия пауза минула. Повертає кількість узятих лотів."""
+        async with db_connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = await db.execute(
+                    f"SELECT q.lot_id, {_LOT_COLUMNS} "
+                    "FROM lot_alert_queue q LEFT JOIN lots l ON l.id = q.lot_id "
+                    "ORDER BY q.lot_id LIMIT ?",
+                    (ALERT_BATCH_SIZE,),
+                )
+                lots = await cur.fetchall()
+                if lots:
+                    await db.executemany(
+                        "DELETE FROM lot_alert_queue WHERE lot_id = ?", [(r["lot_id"],) for r in lots]
+                    )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        if not len(self.index) or not (lots or self._deferred):
+            return len(lots)
+
+        now = time.time()
+        ready: Dict[Tuple[str, int], Dict[int, dict]] = defaultdict(dict)  # підписка → lot_id → лот
+        deferred_rows = []
+        for row in lots:
+            for sub, lot in self._matches(row):
+                key = (sub.kind, sub.id)
+                if now - sub.last_triggered < ALERT_COOLDOWN:
+                    if lot["lot_id"] not in self._deferred[key]:
+                        self._deferred[key].add(lot["lot_id"])
+                        deferred_rows.append((sub.kind, sub.id, lot["lot_id"]))
+                else:
+                    ready[key][lot["lot_id"]] = lot
+        await self._collect_deferred(now, ready)
+
+        stamp = datetime.fromtimestamp(now, timezone.utc).strftime(_TS_FORMAT)
+        fired = [self.index.subs[key] for key in ready]
+        for sub in fired:
+            sub.last_triggered = now
+        if fired or deferred_rows:
+            async with db_connection() as db:
+                await db.executemany(
+                    "UPDATE price_alerts SET last_triggered = ? WHERE id = ?",
+                    [(stamp, s.id) for s in fired if s.kind == ALERT],
+                )
+                await db.executemany(
+                    "UPDATE saved_searches SET last_triggered = ? WHERE id = ?",
+                    [(stamp, s.id) for s in fired if s.kind == SEARCH],
+                )
+                await db.executemany(
+                    "INSERT OR IGNORE INTO lot_alert_deferred (kind, sub_id, lot_id) VALUES (?, ?, ?)",
+                    deferred_rows,
+                )
+                await db.commit()
+
+        per_user: Dict[int, Dict[int, dict]] = defaultdict(dict)
+        titles: Dict[int, List[str]] = defaultdict(list)
+        for sub in fired:
+            titles[sub.user_id].append(sub.title)
+            per_user[sub.user_id].update(ready[(sub.kind, sub.id)])
+        for user_id, user_lots in per_user.items():
+            await self._notify(user_id, titles[user_id], list(user_lots.values()))
+        return len(lots)
+
+    def _matches(self, lot):
+        """(підписка, лот як dict) для активного лота — крім підписок його власника."""
+        if lot["status"] != "active":
+            return []
+        lot = dict(lot)
+        return [(sub, lot) for sub in self.index.match(lot) if sub.user_id != lot["owner_user_id"]]
+
+    async def _collect_deferred(self, now: float, ready: Dict[Tuple[str, int], Dict[int, dict]]) -> None:
+        """Додає в ready відкладені лоти підписок, чия пауза минула, і прибирає їх з lot_alert_deferred."""
+        due, gone = [], []
+        for key in list(self._deferred):
+            sub = self.index.subs.get(key)
+            if sub is None:
+                gone.append(key)  # підписку видалено або вимкнено
+            elif now - sub.last_triggered >= ALERT_COOLDOWN:
+                due.append(key)
+        if not due and not gone:
+            return
+        lot_ids = sorted({i for key in due for i in self._deferred[key]})
+        async with db_connection() as db:
+            lots = {}
+            for start in range(0, len(lot_ids), 500):
+                chunk = lot_ids[start:start + 500]
+                cur = await db.execute(
+                    f"SELECT l.id AS lot_id, {_LOT_COLUMNS} FROM lots l "
+                    f"WHERE l.id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                lots.update((r["lot_id"], r) for r in await cur.fetchall())
+            await db.executemany(
+                "DELETE FROM lot_alert_deferred WHERE kind = ? AND sub_id = ?", due + gone
+            )
+            await db.commit()
+        for key in gone:
+            del self._deferred[key]
+        # Лот міг закритись або змінитись за час паузи — лишаються ті, що досі підходять
+        for key in due:
+            for lot_id in self._deferred.pop(key):
+                if lot_id in lots:
+                    for sub, lot in self._matches(lots[lot_id]):
+                        if (sub.kind, sub.id) == key:
+                            ready[key][lot_id] = lot
+
+    async def _notify(self, user_id: int, titles: List[str], lots: List[dict]) -> None:
+        tg_id = await get_telegram_id(user_id)
+        if not tg_id:
+            return
+        shown = lots[:MAX_LOTS_PER_MESSAGE]
+        lines = []
+        for i, lot in enumerate(shown, start=1):
+            kind = "📤" if lot["type"] == "sell" else "📥"
+            price = f"{_price(lot['price']):.0f} грн/т" if _price(lot["price"]) is not None else "договірна"
+            vol = f"{lot['volume_tons']:g} т" if lot["volume_tons"] else "—"
+            lines.append(f"{i}. {kind} {lot['crop']} · {vol} · {price} · {lot['region']}")
+        if len(lots) > len(shown):
+            lines.append(f"…і ще {len(lots) - len(shown)}")
+        text = (
+            "🔔 <b>Нові пропозиції за вашими підписками</b>\n"
+            + "\n".join(f"• {t}" for t in titles)
+            + "\n\n" + "\n".join(lines)
+        )
+        kb = InlineKeyboardBuilder()
+        for i, lot in enumerate(shown, start=1):
+            kb.button(text=str(i), callback_data=f"lot:show:{lot['lot_id']}")
+        kb.adjust(len(shown))
+        send_queue.send_message(tg_id, text, reply_markup=kb.as_markup(), priority=PRIORITY_PROMO)
+
+
+standing_queries = StandingQueryEngine()
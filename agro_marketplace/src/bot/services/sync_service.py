@@ -3,9 +3,11 @@ Sync Service - Real-time synchronization between Web Panel and Telegram Bot
 """
 import asyncio
 import logging
+import os
+import socket
+import sqlite3
 from typing import Optional, Dict, Any
 from datetime import datetime
-from pathlib import Path
 import json
 
 logger = logging.getLogger(__name__)
@@ -138,92 +140,201 @@ class WebPanelSync:
         })
 
 
-class FileBasedSync:
-    """File-based synchronization for simpler setups"""
-    
-    SYNC_FILE = Path(__file__).parent.parent.parent / "web_panel" / "data" / "sync_events.json"
-    
+# ══════════════════════ WAKEUP CHANNEL ══════════════════════
+# run_unified.py задає шлях до Unix-сокета (datagram) у SYNC_WAKEUP_SOCKET.
+# Бот слухає його, веб-панель після commit нових подій шле один байт —
+# бот одразу читає sync_outbox замість чекати наступного опитування.
+
+WAKEUP_SOCKET_ENV = "SYNC_WAKEUP_SOCKET"
+
+_wakeup_sender: Optional[socket.socket] = None
+
+
+def wakeup_socket_path() -> Optional[str]:
+    path = os.getenv(WAKEUP_SOCKET_ENV, "").strip()
+    return path if path and hasattr(socket, "AF_UNIX") else None
+
+
+def send_wakeup() -> bool:
+    """Будить бота. Best-effort: якщо бот не слухає — він підхопить подію опитуванням."""
+    global _wakeup_sender
+    path = wakeup_socket_path()
+    if not path:
+        return False
+    try:
+        if _wakeup_sender is None:
+            _wakeup_sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _wakeup_sender.setblocking(False)
+        _wakeup_sender.sendto(b"1", path)
+        return True
+    except OSError:
+        # Немає слухача або буфер повний (бот і так буде розбуджений)
+        return False
+
+
+def open_wakeup_listener() -> Optional[socket.socket]:
+    """Створює неблокуючий сокет-слухач для бота (або None, якщо канал не налаштовано)."""
+    path = wakeup_socket_path()
+    if not path:
+        return None
+    try:
+        if os.path.exists(path):
+            os.unlink(path)  # залишок від попереднього запуску бота
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        return sock
+    except OSError as e:
+        logger.warning(f"Wakeup socket {path} недоступний: {e}")
+        return None
+
+
+class SyncOutbox:
+    """
+    Append-only черга подій web-панель → бот у таблиці sync_outbox.
+
+    Веб-панель додає рядки (INSERT, за можливості в тій самій транзакції, що й
+    зміна даних). Бот читає пачками id > курсор і зсуває курсор у sync_cursors
+    одним UPDATE на пачку. Оброблені події старші за RETENTION_DAYS видаляються
+    compact().
+    """
+
+    CONSUMER = "bot"
+    BATCH_SIZE = 100
+    RETENTION_DAYS = int(os.getenv("SYNC_OUTBOX_RETENTION_DAYS", "7"))
+
+    # SQL спільний для sync (веб) і async (бот) споживачів
+    SQL_INSERT = "INSERT INTO sync_outbox (event_type, payload) VALUES (?, ?)"
+    SQL_READ_BATCH = """
+        SELECT id, event_type, payload, created_at
+        FROM sync_outbox
+        WHERE id > COALESCE((SELECT last_id FROM sync_cursors WHERE consumer = ?), 0)
+        ORDER BY id
+        LIMIT ?
+    """
+    SQL_ADVANCE = """
+        INSERT INTO sync_cursors (consumer, last_id, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(consumer) DO UPDATE SET
+            last_id = MAX(last_id, excluded.last_id),
+            updated_at = excluded.updated_at
+    """
+    SQL_COMPACT = """
+        DELETE FROM sync_outbox
+        WHERE id <= COALESCE((SELECT MIN(last_id) FROM sync_cursors), 0)
+          AND created_at < datetime('now', ?)
+    """
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        from config.settings import DB_PATH
+        conn = sqlite3.connect(str(DB_PATH), timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def to_event(row) -> Dict[str, Any]:
+        """Рядок sync_outbox → словник у форматі старих подій (event_type/data/timestamp)."""
+        try:
+            data = json.loads(row["payload"] or "{}")
+        except (TypeError, ValueError):
+            data = {}
+        return {
+            "id": row["id"],
+            "event_type": row["event_type"],
+            "data": data,
+            "timestamp": row["created_at"],
+            "processed": False,
+        }
+
     @classmethod
-    def write_event(cls, event_type: str, data: Dict[str, Any]):
-        """Write synchronization event to file"""
+    def write_event(cls, event_type: str, data: Dict[str, Any],
+                    conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+        """
+        Додає подію. Якщо передано conn — пише в поточну транзакцію
+        (викликач робить commit, а потім notify()), інакше відкриває
+        власне з'єднання і одразу будить бота.
+        """
+        payload = json.dumps(data, ensure_ascii=False)
         try:
-            cls.SYNC_FILE.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Read existing events
-            events = []
-            if cls.SYNC_FILE.exists():
-                try:
-                    with open(cls.SYNC_FILE, 'r', encoding='utf-8') as f:
-                        events = json.load(f)
-                except json.JSONDecodeError:
-                    events = []
-            
-            # Add new event
-            events.append({
-                'event_type': event_type,
-                'data': data,
-                'timestamp': datetime.now().isoformat(),
-                'processed': False
-            })
-            
-            # Keep only last 1000 events
-            events = events[-1000:]
-            
-            # Write back
-            with open(cls.SYNC_FILE, 'w', encoding='utf-8') as f:
-                json.dump(events, f, ensure_ascii=False, indent=2)
-                
-            logger.debug(f"Sync event written: {event_type}")
-            
+            if conn is not None:
+                return conn.execute(cls.SQL_INSERT, (event_type, payload)).lastrowid
+            own = cls._connect()
+            try:
+                event_id = own.execute(cls.SQL_INSERT, (event_type, payload)).lastrowid
+                own.commit()
+            finally:
+                own.close()
+            cls.notify()
+            return event_id
         except Exception as e:
             logger.error(f"Error writing sync event: {e}")
-    
+            return None
+
+    @staticmethod
+    def notify() -> None:
+        """Сигнал боту, що в outbox є нові події (викликати після commit)."""
+        send_wakeup()
+
     @classmethod
-    def read_all_events(cls):
-        """Read ALL events from file (processed and unprocessed), preserving real indices"""
+    def read_pending(cls, consumer: str = CONSUMER, limit: int = 500):
+        """Ще не оброблені споживачем події (для сторінки /sync)."""
+        conn = cls._connect()
         try:
-            if not cls.SYNC_FILE.exists():
-                return []
-            with open(cls.SYNC_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            rows = conn.execute(cls.SQL_READ_BATCH, (consumer, limit)).fetchall()
+            return [cls.to_event(r) for r in rows]
         except Exception as e:
-            logger.error(f"Error reading all sync events: {e}")
+            logger.error(f"Error reading sync events: {e}")
             return []
+        finally:
+            conn.close()
 
     @classmethod
-    def read_unprocessed_events(cls):
-        """Read unprocessed events from file"""
+    def processed_count(cls, consumer: str = CONSUMER) -> int:
+        """Скільки збережених подій вже оброблено споживачем."""
+        conn = cls._connect()
         try:
-            if not cls.SYNC_FILE.exists():
-                return []
-            
-            with open(cls.SYNC_FILE, 'r', encoding='utf-8') as f:
-                events = json.load(f)
-            
-            return [e for e in events if not e.get('processed', False)]
-            
+            row = conn.execute(
+                "SELECT COUNT(*) FROM sync_outbox "
+                "WHERE id <= COALESCE((SELECT last_id FROM sync_cursors WHERE consumer = ?), 0)",
+                (consumer,),
+            ).fetchone()
+            return int(row[0]) if row else 0
         except Exception as e:
-            logger.error(f"Error reading sync events: {e}")
-            return []
-    
+            logger.error(f"Error counting sync events: {e}")
+            return 0
+        finally:
+            conn.close()
+
     @classmethod
-    def mark_event_processed(cls, event_index: int):
-        """Mark event as processed"""
+    def skip_pending(cls, consumer: str = CONSUMER) -> None:
+        """Позначає всі поточні події обробленими (зсуває курсор на MAX(id))."""
+        conn = cls._connect()
         try:
-            if not cls.SYNC_FILE.exists():
-                return
-            
-            with open(cls.SYNC_FILE, 'r', encoding='utf-8') as f:
-                events = json.load(f)
-            
-            if 0 <= event_index < len(events):
-                events[event_index]['processed'] = True
-            
-            with open(cls.SYNC_FILE, 'w', encoding='utf-8') as f:
-                json.dump(events, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            logger.error(f"Error marking event as processed: {e}")
+            row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sync_outbox").fetchone()
+            conn.execute(cls.SQL_ADVANCE, (consumer, int(row[0])))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class FileBasedSync:
+    """
+    Сумісність зі старим API (sync_events.json). Події тепер зберігаються
+    в sync_outbox — див. SyncOutbox.
+    """
+
+    @classmethod
+    def write_event(cls, event_type: str, data: Dict[str, Any]):
+        SyncOutbox.write_event(event_type, data)
+
+    @classmethod
+    def read_unprocessed_events(cls):
+        return SyncOutbox.read_pending()
+
+    @classmethod
+    def read_all_events(cls):
+        return SyncOutbox.read_pending()
 
 
 # Global sync service instance
@@ -8,13 +8,9 @@ from config.constants import DATE_FORMAT, PRICE_NEGOTIABLE
 
 def format_lot_card(lot: Lot, owner: User, show_full: bool = True) -> str:
     """Format lot as text card"""
-    import json
-    
     type_emoji = "📦" if lot.type == "sell" else "🛒"
     type_text = "ПРОДАМ" if lot.type == "sell" else "КУПЛЮ"
     
-    quality = json.loads(lot.quality_json) if isinstance(lot.quality_json, str) else lot.quality_json
-    
     text = f"{type_emoji} <b>{type_text}: {lot.crop}</b>\n\n"
     text += f"📊 Обсяг: {lot.volume_tons} тонн\n"
     text += f"📍 Регіон: {lot.region}"
@@ -28,10 +24,10 @@ def format_lot_card(lot: Lot, owner: User, show_full: bool = True) -> str:
         text += " грн/т"
     text += "\n\n"
     
-    if quality.get("moisture"):
-        text += f"🌡 Вологість: {quality['moisture']}%\n"
-    if quality.get("trash"):
-        text += f"🗑 Сміття: {quality['trash']}%\n"
+    if lot.quality_moisture is not None:
+        text += f"🌡 Вологість: {lot.quality_moisture:g}%\n"
+    if lot.quality_trash is not None:
+        text += f"🗑 Сміття: {lot.quality_trash:g}%\n"
     
     if lot.comment and show_full:
         text += f"\n💬 {lot.comment}\n"
@@ -0,0 +1,76 @@
+"""
+Аудиторія розсилки: broadcasts.audience_filter (JSON) → умова WHERE над users.
+Спільне для бота (розсилка) і веб-панелі (підрахунок отримувачів).
+
+Формат фільтра — усі ключі необов'язкові, порожній фільтр означає всіх:
+    {"roles": ["farmer", "buyer"], "regions": ["Київська"], "plans": ["premium"],
+     "registered_after": "2024-01-01", "registered_before": "2024-06-01"}
+
+Забанені і ті, хто заблокував бота (users.bot_blocked, міграція 14), розсилку
+не отримують ніколи. Отримувачі читаються по id (keyset), тож пам'ять не
+залежить від розміру аудиторії.
+"""
+import json
+import re
+from typing import Any, List, Tuple
+
+# ключ фільтра → колонка users (значення — список рядків)
+_LIST_KEYS = {
+    "roles": "role",
+    "regions": "region",
+    "plans": "subscription_plan",
+}
+# ключ фільтра → умова над created_at (значення — дата YYYY-MM-DD)
+_DATE_KEYS = {
+    "registered_after": "created_at >= ?",
+    "registered_before": "created_at < ?",
+}
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+REACHABLE_SQL = "telegram_id IS NOT NULL AND IFNULL(is_banned, 0) = 0 AND IFNULL(bot_blocked, 0) = 0"
+
+
+def parse_audience(raw) -> dict:
+    """audience_filter з БД (JSON-рядок, dict або None) → dict; ValueError якщо зіпсований."""
+    if raw is None or raw == "":
+        return {}
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"audience_filter — не JSON: {e}") from None
+    if not isinstance(raw, dict):
+        raise ValueError("audience_filter має бути JSON-об'єктом")
+    return raw
+
+
+def compile_audience(raw) -> Tuple[str, List[Any]]:
+    """Фільтр → (умова WHERE, параметри). Невідомі ключі і типи — ValueError."""
+    audience = parse_audience(raw)
+    clauses = [REACHABLE_SQL]
+    params: List[Any] = []
+    for key, value in audience.items():
+        if key in _LIST_KEYS:
+            if not isinstance(value, list) or not all(isinstance(v, str) and v for v in value):
+                raise ValueError(f"{key}: очікується список рядків")
+            if not value:
+                continue
+            clauses.append(f"{_LIST_KEYS[key]} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        elif key in _DATE_KEYS:
+            if not isinstance(value, str) or not _DATE.match(value):
+                raise ValueError(f"{key}: очікується дата YYYY-MM-DD")
+            clauses.append(_DATE_KEYS[key])
+            params.append(value)
+        else:
+            raise ValueError(f"Невідомий ключ audience_filter: {key}")
+    return " AND ".join(clauses), params
+
+
+def count_sql(where: str) -> str:
+    return f"SELECT COUNT(*) FROM users WHERE {where}"
+
+
+def recipients_sql(where: str) -> str:
+    """Наступна пачка отримувачів після id = ?; параметри: last_id, *params, limit."""
+    return f"SELECT id, telegram_id FROM users WHERE id > ? AND {where} ORDER BY id LIMIT ?"
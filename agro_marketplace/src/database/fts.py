@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Побудова запитів до FTS5-індексів (див. migrate._create_fts_index).
+
+Текст користувача розбивається на слова, кожне береться в лапки (жодних
+операторів FTS5 з вводу) і шукається за префіксом: "петр київ" →
+"петр"* "київ"*, тобто всі слова мають зустрітись. Регістр згортає
+токенізатор unicode61, апостроф розділяє слово так само, як при індексації.
+
+Для індексу лотів текст додатково «згортається» (fold) однаково при
+індексації (fold_sql у тригерах) і в запиті (fold_text): ї/й/и → і, є → е,
+ґ → г, апострофи прибираються. Латиниця в запиті транслітерується в
+кирилицю, а від слова відкидається відмінкове закінчення (легкий стемінг).
+Змінюючи FOLD_MAP, потрібно перебудувати індекси новою міграцією.
+"""
+import re
+
+FTS_MAX_TERMS = 8
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_terms(text: str) -> list:
+    return _WORD_RE.findall((text or "").casefold())[:FTS_MAX_TERMS]
+
+
+def fts_match_query(text: str, prefix: bool = True) -> str:
+    """Рядок для MATCH або "" якщо в тексті немає слів."""
+    star = "*" if prefix else ""
+    return " ".join(f'"{t}"{star}' for t in fts_terms(text))
+
+
+# ══════════════════════ FOLD / TRANSLIT ══════════════════════
+
+APOSTROPHES = "'ʼ’‘`´"
+
+# символ → заміна (верхній регістр теж, бо replace() в SQLite чутливий до регістру)
+FOLD_MAP = {
+    "ї": "і", "Ї": "і", "й": "і", "Й": "і", "и": "і", "И": "і",
+    "є": "е", "Є": "е", "ґ": "г", "Ґ": "г",
+    **{a: "" for a in APOSTROPHES},
+}
+
+_FOLD_TABLE = str.maketrans(FOLD_MAP)
+
+_TRANSLIT_DIGRAPHS = [
+    ("shch", "щ"), ("zh", "ж"), ("kh", "х"), ("ts", "ц"), ("ch", "ч"), ("sh", "ш"),
+    ("yu", "ю"), ("iu", "ю"), ("ya", "я"), ("ia", "я"), ("ye", "є"), ("ie", "є"),
+]
+_TRANSLIT_SINGLE = str.maketrans({
+    "a": "а", "b": "б", "v": "в", "w": "в", "h": "г", "g": "г", "d": "д", "e": "е",
+    "z": "з", "y": "и", "i": "і", "j": "й", "k": "к", "l": "л", "m": "м", "n": "н",
+    "o": "о", "p": "п", "r": "р", "s": "с", "t": "т", "u": "у", "f": "ф", "c": "ц",
+    "x": "кс", "q": "к",
+})
+_LATIN_RE = re.compile(r"^[a-z]+$")
+
+# Закінчення (вже згорнуті), що відкидаються від слів запиту довших за 4 літери
+_ENDINGS = sorted({
+    e.translate(_FOLD_TABLE) for e in (
+        "ами", "ями", "ого", "ому", "ими", "ій", "ий", "ої", "ою", "ею", "ів",
+        "ах", "ях", "ам", "ям", "ом", "ем", "а", "я", "і", "и", "у", "ю", "е", "о", "ї", "й",
+    )
+}, key=len, reverse=True)
+_STEM_MIN = 4
+
+
+def fold_sql(expr: str) -> str:
+    """SQL-вираз, що згортає expr так само, як fold_text()."""
+    out = f"COALESCE({expr}, '')"
+    for src, dst in FOLD_MAP.items():
+        src_lit = src.replace("'", "''")
+        out = f"replace({out}, '{src_lit}', '{dst}')"
+    return out
+
+
+def fold_text(text: str) -> str:
+    return (text or "").casefold().translate(_FOLD_TABLE)
+
+
+def translit(word: str) -> str:
+    """Латиниця → кирилиця (зворотна до паспортної транслітерації, спрощено)."""
+    for lat, cyr in _TRANSLIT_DIGRAPHS:
+        word = word.replace(lat, cyr)
+    return word.translate(_TRANSLIT_SINGLE)
+
+
+def stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _STEM_MIN:
+            return word[: -len(ending)]
+    return word
+
+
+def folded_match_query(text: str) -> str:
+    """
+    MATCH для згорнутого індексу: кожне слово — префікс основи; латинське
+    слово шукається і як є, і в транслітерації: ("kyiv"* OR "кіів"*).
+    """
+    # апострофи прибираємо до розбиття, щоб "м'ясо" лишилось одним словом
+    words = _WORD_RE.findall(fold_text(text))[:FTS_MAX_TERMS]
+    terms = []
+    for w in words:
+        variants = [stem(w)]
+        if _LATIN_RE.match(w):
+            variants.append(stem(fold_text(translit(w))))
+        variants = list(dict.fromkeys(variants))
+        if len(variants) == 1:
+            terms.append(f'"{variants[0]}"*')
+        else:
+            terms.append("(" + " OR ".join(f'"{v}"*' for v in variants) + ")")
+    # явний AND: неявний між дужковими групами FTS5 не приймає
+    return " AND ".join(terms)
@@ -1,11 +1,34 @@
 # -*- coding: utf-8 -*-
 """
-Виправлена міграція для Agro Marketplace
-Вирішує проблему з UNIQUE constraint
+Версійовані міграції БД Agro Marketplace.
+
+Усі зміни схеми описані тут як впорядкований реєстр MIGRATIONS. migrate()
+виконується один раз при старті процесу (run_bot.main, web_panel create_app):
+застосовані кроки записуються в таблицю schema_version разом з checksum,
+тож якщо версія актуальна — старт обходиться одним SELECT. Хендлери та
+веб-панель можуть вважати схему готовою і не виконують DDL/PRAGMA на запитах.
+
+Новий крок: додати функцію _mNNN_*(cur, verbose) і запис у MIGRATIONS
+з наступним номером версії. Застосовані кроки не редагувати — ні саму
+функцію, ні хелпери, які вона викликає: checksum кроку — хеш SQL, який він
+виконує на порожній БД, і розбіжність з schema_version зупиняє migrate().
+Нова поведінка хелпера — новий параметр/хелпер і новий крок.
 """
+import contextlib
+import hashlib
+import inspect
+import io
+import json
+import logging
 import sqlite3
 import os
-from typing import List, Tuple, Dict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.database.fts import fold_sql
+from src.database.price_stats import aggregate_sql, parse_price, valid_price_sql
+
+logger = logging.getLogger(__name__)
 
 
 # Колонки для users (БЕЗ UNIQUE для telegram_id при ALTER TABLE)
@@ -151,9 +174,1217 @@ def _fix_telegram_id_unique(cur: sqlite3.Cursor) -> None:
         print("  ✅ Дублікати видалено, індекс створено")
 
 
-def migrate(db_path: str, verbose: bool = True) -> None:
+# ══════════════════════ MIGRATION STEPS ══════════════════════
+
+# ══════════════════════ FTS ══════════════════════
+
+# unicode61 згортає регістр для кирилиці; діакритику не прибираємо, щоб
+# й/ї/є не зливались з и/і/е.
+FTS_TOKENIZE = "unicode61 remove_diacritics 0"
+
+# Телефон лише цифрами, повністю і без коду країни 38 — щоб і "380671234567",
+# і "0671234567" знаходили "+38 (067) 123-45-67"
+_PHONE_DIGITS = (
+    "replace(replace(replace(replace(replace(COALESCE({r}.phone, ''),"
+    " ' ', ''), '-', ''), '(', ''), ')', ''), '+', '')"
+)
+PHONE_DIGITS_SQL = (
+    f"{_PHONE_DIGITS} || ' ' || "
+    f"CASE WHEN {_PHONE_DIGITS} LIKE '38%' THEN substr({_PHONE_DIGITS}, 3) ELSE '' END"
+)
+
+
+def _create_fts_index(cur: sqlite3.Cursor, fts: str, table: str,
+                      columns: List[Tuple[str, str]], watch: List[str],
+                      only: Optional[str] = None) -> None:
+    """
+    Безконтентний FTS5-індекс над table з тригерами синхронізації і початковим
+    заповненням. columns — (колонка FTS, SQL-вираз над рядком, {r} → new/old);
+    watch — колонки table, зміна яких переіндексовує рядок; only — умова над
+    рядком ({r}), за якої він потрапляє в індекс (напр. лише активні лоти).
+    """
+    names = ", ".join(name for name, _ in columns)
+
+    def values(r: str) -> str:
+        return ", ".join(expr.format(r=r) for _, expr in columns)
+
+    if only:
+        _create_partial_fts_index(cur, fts, table, names, values, watch, only)
+        return
+
+    cur.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} "
+        f"USING fts5({names}, content='', tokenize='{FTS_TOKENIZE}')"
+    )
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values("new")});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values("old")});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {", ".join(watch)} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values("old")});
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values("new")});
+        END
+    """)
+    cur.execute(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')")
+    cur.execute(f"INSERT INTO {fts}(rowid, {names}) SELECT id, {values(table)} FROM {table}")
+
+
+def _create_partial_fts_index(cur: sqlite3.Cursor, fts: str, table: str, names: str,
+                              values: Callable[[str], str], watch: List[str], only: str) -> None:
+    """Варіант _create_fts_index для підмножини рядків table (умова only)."""
+    cur.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} "
+        f"USING fts5({names}, content='', tokenize='{FTS_TOKENIZE}')"
+    )
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table}
+        WHEN {only.format(r="new")} BEGIN
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values("new")});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table}
+        WHEN {only.format(r="old")} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values("old")});
+        END
+    """)
+    # Обидві дії в одному тригері — порядок delete → insert гарантований
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {", ".join(watch)} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names})
+                SELECT 'delete', old.id, {values("old")} WHERE {only.format(r="old")};
+            INSERT INTO {fts}(rowid, {names})
+                SELECT new.id, {values("new")} WHERE {only.format(r="new")};
+        END
+    """)
+    cur.execute(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')")
+    cur.execute(
+        f"INSERT INTO {fts}(rowid, {names}) "
+        f"SELECT id, {values(table)} FROM {table} WHERE {only.format(r=table)}"
+    )
+
+
+def _m001_baseline(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Базові таблиці (колишня одноразова міграція, толерантна до старих БД)."""
+    # Таблиця users
+    if verbose:
+        print("\n📋 Таблиця users:")
+
+    if not _table_exists(cur, "users"):
+        # Таблиці немає - створюємо з UNIQUE
+        _ensure_table(cur, "users", USER_COLUMNS_CREATE)
+        print("  ✅ Створено нову таблицю users")
+    else:
+        # Таблиця є - додаємо колонки БЕЗ UNIQUE
+        _ensure_columns(cur, "users", USER_COLUMNS_ALTER)
+        # Виправляємо telegram_id через індекс
+        _fix_telegram_id_unique(cur)
+
+    # Таблиця web_admins
+    if verbose:
+        print("\n📋 Таблиця web_admins:")
+    _ensure_table(cur, "web_admins", WEB_ADMINS_COLUMNS)
+    _ensure_columns(cur, "web_admins", WEB_ADMINS_COLUMNS)
+
+    # Таблиця lots
+    if verbose:
+        print("\n📋 Таблиця lots:")
+    _ensure_table(cur, "lots", LOTS_COLUMNS)
+    _ensure_columns(cur, "lots", LOTS_COLUMNS)
+
+    # Таблиця settings
+    if verbose:
+        print("\n📋 Таблиця settings:")
+    _ensure_table(cur, "settings", SETTINGS_COLUMNS)
+
+    # Таблиця user_subscriptions
+    if verbose:
+        print("\n📋 Таблиця user_subscriptions:")
+    _ensure_table(cur, "user_subscriptions", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("user_id", "INTEGER NOT NULL"),
+        ("plan", "TEXT NOT NULL DEFAULT 'free'"),
+        ("started_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("expires_at", "TEXT"),
+        ("is_active", "INTEGER DEFAULT 1"),
+        ("payment_id", "TEXT"),
+    ])
+
+    # Таблиця vehicles
+    if verbose:
+        print("\n📋 Таблиця vehicles:")
+    _ensure_table(cur, "vehicles", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("owner_user_id", "INTEGER NOT NULL"),
+        ("body_type", "TEXT NOT NULL"),
+        ("capacity_tons", "REAL NOT NULL"),
+        ("count_units", "INTEGER NOT NULL DEFAULT 1"),
+        ("base_region", "TEXT NOT NULL"),
+        ("work_regions", "TEXT"),
+        ("status", "TEXT NOT NULL DEFAULT 'available'"),
+        ("available_from", "TEXT"),
+        ("comment", "TEXT"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("updated_at", "TEXT"),
+    ])
+
+    # Таблиця shipments
+    if verbose:
+        print("\n📋 Таблиця shipments:")
+    _ensure_table(cur, "shipments", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("creator_user_id", "INTEGER NOT NULL"),
+        ("cargo_type", "TEXT NOT NULL"),
+        ("volume_tons", "REAL NOT NULL"),
+        ("from_region", "TEXT NOT NULL"),
+        ("from_location", "TEXT"),
+        ("to_region", "TEXT NOT NULL"),
+        ("to_location", "TEXT"),
+        ("date_from", "TEXT"),
+        ("date_to", "TEXT"),
+        ("required_body_types", "TEXT"),
+        ("comment", "TEXT"),
+        ("status", "TEXT NOT NULL DEFAULT 'active'"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("updated_at", "TEXT"),
+    ])
+
+    # Таблиця chat_sessions
+    if verbose:
+        print("\n📋 Таблиця chat_sessions:")
+    _ensure_table(cur, "chat_sessions", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("user1_id", "INTEGER NOT NULL"),
+        ("user2_id", "INTEGER NOT NULL"),
+        ("lot_id", "INTEGER"),
+        ("offer_id", "INTEGER"),
+        ("status", "TEXT NOT NULL DEFAULT 'active'"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("updated_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ])
+
+    # Таблиця chat_messages
+    if verbose:
+        print("\n📋 Таблиця chat_messages:")
+    _ensure_table(cur, "chat_messages", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("session_id", "INTEGER NOT NULL"),
+        ("sender_user_id", "INTEGER NOT NULL"),
+        ("content", "TEXT NOT NULL"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ])
+
+    # Таблиця contacts (з UNIQUE для INSERT OR IGNORE/REPLACE)
+    if verbose:
+        print("\n📋 Таблиця contacts:")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS contacts (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id          INTEGER NOT NULL,
+            contact_user_id  INTEGER NOT NULL,
+            status           TEXT NOT NULL DEFAULT 'pending',
+            created_at       TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, contact_user_id)
+        )
+    """)
+
+    # Таблиця counter_offers
+    if verbose:
+        print("\n📋 Таблиця counter_offers:")
+    _ensure_table(cur, "counter_offers", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("lot_id", "INTEGER NOT NULL"),
+        ("sender_user_id", "INTEGER NOT NULL"),
+        ("offered_price", "REAL NOT NULL"),
+        ("message", "TEXT"),
+        ("status", "TEXT NOT NULL DEFAULT 'pending'"),
+        ("created_at", "TEXT DEFAULT (datetime('now'))"),
+    ])
+
+    # Таблиця payments
+    if verbose:
+        print("\n📋 Таблиця payments:")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id            INTEGER NOT NULL,
+            plan               TEXT,
+            amount             INTEGER NOT NULL DEFAULT 0,
+            currency           TEXT DEFAULT 'UAH',
+            status             TEXT DEFAULT 'pending',
+            provider           TEXT DEFAULT 'manual',
+            provider_payment_id TEXT,
+            payment_method     TEXT,
+            created_at         TEXT DEFAULT CURRENT_TIMESTAMP,
+            paid_at            TEXT
+        )
+    """)
+
+    # Таблиця advertisements
+    if verbose:
+        print("\n📋 Таблиця advertisements:")
+    _ensure_table(cur, "advertisements", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("title", "TEXT NOT NULL"),
+        ("type", "TEXT NOT NULL"),
+        ("content", "TEXT NOT NULL"),
+        ("image_url", "TEXT"),
+        ("button_text", "TEXT"),
+        ("button_url", "TEXT"),
+        ("is_active", "INTEGER DEFAULT 1"),
+        ("show_frequency", "INTEGER DEFAULT 3"),
+        ("views_count", "INTEGER DEFAULT 0"),
+        ("clicks_count", "INTEGER DEFAULT 0"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("updated_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ])
+
+    # Таблиця advertisement_views
+    if verbose:
+        print("\n📋 Таблиця advertisement_views:")
+    _ensure_table(cur, "advertisement_views", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("ad_id", "INTEGER NOT NULL"),
+        ("user_id", "INTEGER NOT NULL"),
+        ("viewed_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("clicked", "INTEGER DEFAULT 0"),
+    ])
+
+
+def _m002_bot_tables(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Таблиці/колонки, які раніше створювали хендлери бота на кожному запиті."""
+    _ensure_columns(cur, "users", [("company_number", "TEXT")])
+    _ensure_columns(cur, "chat_messages", [("message_type", "TEXT")])
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS favorites (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id    INTEGER NOT NULL,
+            lot_id     INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, lot_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS contact_requests (
+            id                INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id        INTEGER NOT NULL,
+            requester_user_id INTEGER NOT NULL,
+            status            TEXT NOT NULL DEFAULT 'pending',
+            created_at        TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bot_runtime_locks (
+            lock_name  TEXT PRIMARY KEY,
+            owner      TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+
+def _m003_indexes(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Індекси для запитів бота і веб-панелі."""
+    for sql in (
+        "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_is_banned ON users(is_banned)",
+        "CREATE INDEX IF NOT EXISTS idx_lots_owner_user_id ON lots(owner_user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_lots_status ON lots(status)",
+        "CREATE INDEX IF NOT EXISTS idx_ads_active ON advertisements(is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_ad_views_user ON advertisement_views(user_id, ad_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cs_u1 ON chat_sessions(user1_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cs_u2 ON chat_sessions(user2_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cm_s ON chat_messages(session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_co_u ON contacts(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_co_c ON contacts(contact_user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_co_lot ON counter_offers(lot_id)",
+        "CREATE INDEX IF NOT EXISTS idx_co_sender ON counter_offers(sender_user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_co_status ON counter_offers(status)",
+    ):
+        cur.execute(sql)
+
+
+def _m004_sync_outbox(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Черга подій web → бот замість sync_events.json + курсори споживачів."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_outbox (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            payload    TEXT NOT NULL DEFAULT '{}',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_cursors (
+            consumer   TEXT PRIMARY KEY,
+            last_id    INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    """)
+
+    # Переносимо необроблені події зі старого JSON-файлу
+    legacy = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "web_panel", "data", "sync_events.json")
+    if os.path.exists(legacy):
+        try:
+            with open(legacy, "r", encoding="utf-8") as fh:
+                events = json.load(fh)
+        except (OSError, ValueError):
+            events = []
+        moved = 0
+        for e in events:
+            if e.get("processed") or not e.get("event_type"):
+                continue
+            cur.execute(
+                "INSERT INTO sync_outbox (event_type, payload) VALUES (?, ?)",
+                (e["event_type"], json.dumps(e.get("data") or {}, ensure_ascii=False)),
+            )
+            moved += 1
+        if verbose:
+            print(f"  ✅ Перенесено {moved} подій з sync_events.json")
+
+
+def _m005_created_at_indexes(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Індекси під діапазонні вибірки по created_at (тижнева статистика дашборду)."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_lots_created_at ON lots(created_at)")
+
+
+
+def _m006_search_fts(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """FTS5-індекси для пошуку веб-панелі: users, shipments, vehicles."""
+    try:
+        cur.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        cur.execute("DROP TABLE temp._fts5_probe")
+    except sqlite3.OperationalError as e:
+        # SQLite без FTS5 — веб-панель лишається на LIKE-пошуку
+        print(f"  ⚠️  FTS5 недоступний: {e}")
+        return
+
+    _create_fts_index(cur, "users_fts", "users", [
+        ("telegram_id", "{r}.telegram_id"),
+        ("username", "{r}.username"),
+        ("full_name", "{r}.full_name"),
+        ("company", "{r}.company"),
+        ("phone", "{r}.phone"),
+        ("phone_digits", PHONE_DIGITS_SQL),
+        ("region", "{r}.region"),
+    ], watch=["telegram_id", "username", "full_name", "company", "phone", "region"])
+
+    _create_fts_index(cur, "shipments_fts", "shipments", [
+        ("cargo_type", "{r}.cargo_type"),
+        ("from_region", "{r}.from_region"),
+        ("from_location", "{r}.from_location"),
+        ("to_region", "{r}.to_region"),
+        ("to_location", "{r}.to_location"),
+        ("comment", "{r}.comment"),
+    ], watch=["cargo_type", "from_region", "from_location", "to_region", "to_location", "comment"])
+
+    _create_fts_index(cur, "vehicles_fts", "vehicles", [
+        ("body_type", "{r}.body_type"),
+        ("base_region", "{r}.base_region"),
+        ("work_regions", "{r}.work_regions"),
+        ("comment", "{r}.comment"),
+    ], watch=["body_type", "base_region", "work_regions", "comment"])
+
+
+def _m007_lots_fts(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """FTS5-індекс активних лотів для пошуку в боті (згорнутий текст, див. fts.fold_sql)."""
+    try:
+        cur.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        cur.execute("DROP TABLE temp._fts5_probe")
+    except sqlite3.OperationalError as e:
+        print(f"  ⚠️  FTS5 недоступний: {e}")
+        return
+
+    _create_fts_index(cur, "lots_fts", "lots", [
+        ("crop", fold_sql("{r}.crop")),
+        ("region", fold_sql("{r}.region")),
+        ("location", fold_sql("{r}.location")),
+        ("comment", fold_sql("{r}.comment")),
+    ], watch=["crop", "region", "location", "comment", "status"],
+        only="{r}.status = 'active'")
+
+
+
+def _m008_lots_browse_indexes(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Часткові індекси активних лотів під фільтри перегляду маркету (keyset по created_at, id)."""
+    for sql in (
+        "CREATE INDEX IF NOT EXISTS idx_lots_browse_t "
+        "ON lots(type, created_at, id, price) WHERE status = 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_lots_browse_tc "
+        "ON lots(type, crop, created_at, id, price) WHERE status = 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_lots_browse_tr "
+        "ON lots(type, region, created_at, id, price) WHERE status = 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_lots_browse_tcr "
+        "ON lots(type, crop, region, created_at, id, price) WHERE status = 'active'",
+    ):
+        cur.execute(sql)
+
+
+# Сусідні області (для оцінки близькості в lot_matches)
+REGION_NEIGHBORS = {
+    "Вінницька": ["Житомирська", "Київська", "Черкаська", "Кіровоградська", "Одеська", "Хмельницька", "Чернівецька"],
+    "Волинська": ["Рівненська", "Львівська"],
+    "Дніпропетровська": ["Полтавська", "Харківська", "Донецька", "Запорізька", "Херсонська", "Миколаївська", "Кіровоградська"],
+    "Донецька": ["Луганська", "Харківська", "Дніпропетровська", "Запорізька"],
+    "Житомирська": ["Рівненська", "Хмельницька", "Вінницька", "Київська"],
+    "Закарпатська": ["Львівська", "Івано-Франківська"],
+    "Запорізька": ["Дніпропетровська", "Донецька", "Херсонська"],
+    "Івано-Франківська": ["Львівська", "Закарпатська", "Чернівецька", "Тернопільська"],
+    "Київська": ["Житомирська", "Вінницька", "Черкаська", "Полтавська", "Чернігівська", "м. Київ"],
+    "Кіровоградська": ["Вінницька", "Черкаська", "Полтавська", "Дніпропетровська", "Миколаївська", "Одеська"],
+    "Луганська": ["Донецька", "Харківська"],
+    "Львівська": ["Волинська", "Рівненська", "Тернопільська", "Івано-Франківська", "Закарпатська"],
+    "Миколаївська": ["Одеська", "Кіровоградська", "Дніпропетровська", "Херсонська"],
+    "Одеська": ["Вінницька", "Кіровоградська", "Миколаївська"],
+    "Полтавська": ["Київська", "Чернігівська", "Сумська", "Харківська", "Дніпропетровська", "Кіровоградська", "Черкаська"],
+    "Рівненська": ["Волинська", "Львівська", "Тернопільська", "Хмельницька", "Житомирська"],
+    "Сумська": ["Чернігівська", "Полтавська", "Харківська"],
+    "Тернопільська": ["Львівська", "Рівненська", "Хмельницька", "Чернівецька", "Івано-Франківська"],
+    "Харківська": ["Сумська", "Полтавська", "Дніпропетровська", "Донецька", "Луганська"],
+    "Херсонська": ["Миколаївська", "Дніпропетровська", "Запорізька"],
+    "Хмельницька": ["Рівненська", "Житомирська", "Вінницька", "Чернівецька", "Тернопільська"],
+    "Черкаська": ["Київська", "Полтавська", "Кіровоградська", "Вінницька"],
+    "Чернівецька": ["Івано-Франківська", "Тернопільська", "Хмельницька", "Вінницька"],
+    "Чернігівська": ["Київська", "Сумська", "Полтавська"],
+    "м. Київ": ["Київська"],
+}
+
+
+def _lot_match_pairs_sql(a: str, price: Optional[str] = None) -> str:
+    """
+    INSERT пар lot_matches для одного лота. a — шаблон доступу до його полів:
+    "new.{}" у тригері, ":{}" (іменовані параметри) при заповненні.
+    price — колонка ціни (з міграції 19 — числова price_value); нечислова
+    або порожня ціна рахується як договірна (15). price=None — SQL кроку 9
+    як він був застосований (текстова price), не змінювати.
+    Кандидати — 200 найновіших активних лотів протилежного типу з тією ж
+    культурою (індекс idx_lots_browse_tc), з них зберігаються 50 найкращих.
+    """
+    A = a.format
+    va = f"COALESCE(NULLIF({A('volume_tons')}, 0), {A('volume')}, 0)"
+    vb = "COALESCE(NULLIF(b.volume_tons, 0), b.volume, 0)"
+    pa, pb = A(price or "price"), f"b.{price or 'price'}"
+    sell_price = f"CASE WHEN {A('type')} = 'sell' THEN {pa} ELSE {pb} END"
+    buy_price = f"CASE WHEN {A('type')} = 'sell' THEN {pb} ELSE {pa} END"
+    if price is None:
+        price_score = f"""CASE WHEN {pa} IS NULL OR {pb} IS NULL THEN 15
+             WHEN {sell_price} <= {buy_price} THEN 30
+             WHEN {buy_price} > 0
+             THEN max(0, 30 - 150.0 * ({sell_price} - {buy_price}) / {buy_price})
+             ELSE 0 END"""
+    else:
+        price_score = f"""CASE WHEN NOT ({valid_price_sql(pa)} AND {valid_price_sql(pb)}) THEN 15
+             WHEN {sell_price} <= {buy_price} THEN 30
+             ELSE max(0, 30 - 150.0 * ({sell_price} - {buy_price}) / {buy_price}) END"""
+    score = f"""CAST(ROUND(
+        CASE WHEN b.region = {A('region')} THEN 40
+             WHEN EXISTS (SELECT 1 FROM region_neighbors rn
+                          WHERE rn.region = {A('region')} AND rn.neighbor = b.region) THEN 20
+             ELSE 0 END
+      + CASE WHEN {va} > 0 AND {vb} > 0 THEN 30.0 * min({va}, {vb}) / max({va}, {vb}) ELSE 0 END
+      + {price_score}
+    ) AS INTEGER)"""
+    candidates = f"""
+        SELECT b.id AS bid, b.owner_user_id AS bowner, {score} AS score
+        FROM (
+            SELECT b.* FROM lots b INDEXED BY idx_lots_browse_tc
+            WHERE {A('status')} = 'active' AND b.status = 'active'
+              AND b.type = CASE {A('type')} WHEN 'sell' THEN 'buy' ELSE 'sell' END
+              AND b.crop = {A('crop')}
+            ORDER BY b.created_at DESC, b.id DESC
+            LIMIT 200
+        ) b
+        WHERE b.owner_user_id != {A('owner_user_id')}
+        ORDER BY score DESC, b.id DESC
+        LIMIT 50
+    """
+    cols = "(lot_id, match_lot_id, owner_user_id, match_owner_user_id, score)"
+    return f"""
+        INSERT OR REPLACE INTO lot_matches {cols}
+            SELECT {A('id')}, bid, {A('owner_user_id')}, bowner, score FROM ({candidates});
+        INSERT OR REPLACE INTO lot_matches {cols}
+            SELECT bid, {A('id')}, bowner, {A('owner_user_id')}, score FROM ({candidates});
+    """
+
+
+def _m009_lot_matches(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    lot_matches — зустрічні пари активних лотів (та сама культура, протилежний
+    тип, різні власники) з оцінкою 0..100: область 40 (сусідня 20), обсяг 30
+    (min/max), ціна 30 (продавець ≤ покупця; 15 якщо договірна). Підтримується
+    тригерами на lots — і з бота, і з веб-панелі. Пара пишеться в обидва боки.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS region_neighbors (
+            region   TEXT NOT NULL,
+            neighbor TEXT NOT NULL,
+            PRIMARY KEY (region, neighbor)
+        ) WITHOUT ROWID
+    """)
+    for region, neighbors in REGION_NEIGHBORS.items():
+        for n in neighbors:
+            cur.execute("INSERT OR IGNORE INTO region_neighbors VALUES (?, ?)", (region, n))
+            cur.execute("INSERT OR IGNORE INTO region_neighbors VALUES (?, ?)", (n, region))
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lot_matches (
+            lot_id              INTEGER NOT NULL,
+            match_lot_id        INTEGER NOT NULL,
+            owner_user_id       INTEGER NOT NULL,
+            match_owner_user_id INTEGER NOT NULL,
+            score               INTEGER NOT NULL,
+            created_at          TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (lot_id, match_lot_id)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_lot_matches_match ON lot_matches(match_lot_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_lot_matches_owner "
+                "ON lot_matches(owner_user_id, score DESC, match_lot_id)")
+
+    delete_pairs = """
+        DELETE FROM lot_matches WHERE lot_id = old.id;
+        DELETE FROM lot_matches WHERE match_lot_id = old.id;
+    """
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lot_matches_ai AFTER INSERT ON lots
+        WHEN new.status = 'active' BEGIN {_lot_match_pairs_sql("new.{}")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lot_matches_au
+        AFTER UPDATE OF status, type, crop, region, volume_tons, volume, price, owner_user_id ON lots
+        BEGIN {delete_pairs} {_lot_match_pairs_sql("new.{}")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lot_matches_ad AFTER DELETE ON lots
+        BEGIN {delete_pairs} END
+    """)
+
+    # Початкове заповнення — той самий SQL, поля лота як іменовані параметри.
+    # Кожен лот рахує свої пари сам, тож зворотний INSERT тут не потрібен.
+    backfill = _lot_match_pairs_sql(":{}").split(";")[0]
+    fields = ("id", "owner_user_id", "type", "crop", "region", "volume_tons", "volume", "price", "status")
+    cur.execute(f"SELECT {', '.join(fields)} FROM lots WHERE status = 'active' ORDER BY id")
+    for row in cur.fetchall():
+        cur.execute(backfill, dict(zip(fields, row)))
+    if verbose:
+        cur.execute("SELECT COUNT(*) FROM lot_matches")
+        print(f"  ✅ lot_matches: {cur.fetchone()[0]} пар")
+
+
+def _m010_standing_queries(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Постійні запити: цінові сповіщення (price_alerts) і збережені фільтри
+    біржі (saved_searches). Тригери кладуть id нового/зміненого активного лота
+    в lot_alert_queue — бот розбирає чергу пачками, тож створення лота (і масовий
+    імпорт з веб-панелі) не чекає перевірки підписок.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS price_alerts (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id         INTEGER NOT NULL,
+            crop            TEXT NOT NULL,
+            region          TEXT,
+            price_threshold REAL NOT NULL,
+            condition       TEXT NOT NULL,
+            active          INTEGER NOT NULL DEFAULT 1,
+            last_triggered  TEXT,
+            created_at      TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_price_alerts_user ON price_alerts(user_id)")
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS saved_searches (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id        INTEGER NOT NULL,
+            lot_type       TEXT NOT NULL,
+            crop           TEXT,
+            region         TEXT,
+            price_min      REAL,
+            price_max      REAL,
+            negotiable     INTEGER NOT NULL DEFAULT 0,
+            active         INTEGER NOT NULL DEFAULT 1,
+            last_triggered TEXT,
+            created_at     TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches(user_id)")
+
+    cur.execute("CREATE TABLE IF NOT EXISTS lot_alert_queue (lot_id INTEGER PRIMARY KEY)")
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS lot_alert_queue_ai AFTER INSERT ON lots
+        WHEN new.status = 'active'
+        BEGIN INSERT OR IGNORE INTO lot_alert_queue(lot_id) VALUES (new.id); END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS lot_alert_queue_au
+        AFTER UPDATE OF status, type, crop, region, price ON lots
+        WHEN new.status = 'active'
+        BEGIN INSERT OR IGNORE INTO lot_alert_queue(lot_id) VALUES (new.id); END
+    """)
+    if verbose:
+        print("  ✅ price_alerts, saved_searches, lot_alert_queue")
+
+
+# Міграція 11 рахувала агрегати по lots.price; з міграції 12 — по price_value
+PRICE_STATS_AGGREGATE_SQL = aggregate_sql("price", indexed_by="idx_lots_browse_tcr")
+
+
+def _price_stats_add_sql(r: str, col: str = "price") -> str:
+    """Додає ціну лота r ("new") до його групи price_stats."""
+    return f"""
+        INSERT INTO price_stats (crop, region, type, cnt, sum_price, min_price, max_price)
+        VALUES ({r}.crop, {r}.region, {r}.type, 1, {r}.{col}, {r}.{col}, {r}.{col})
+        ON CONFLICT (crop, region, type) DO UPDATE SET
+            cnt = cnt + 1,
+            sum_price = sum_price + excluded.sum_price,
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price);
+    """
+
+
+def _price_stats_remove_sql(r: str, col: str = "price") -> str:
+    """
+    Віднімає ціну лота r ("old"). Мінімум/максимум перераховуються з lots лише
+    коли видаляється сама межа — по частковому індексу групи.
+    """
+    group = f"crop = {r}.crop AND region = {r}.region AND type = {r}.type"
+    extreme = (f"SELECT {{}}({col}) FROM lots WHERE status = 'active' AND {group} "
+               f"AND {valid_price_sql(col)}")
+    return f"""
+        UPDATE price_stats SET
+            cnt = cnt - 1,
+            sum_price = sum_price - {r}.{col},
+            min_price = CASE WHEN {r}.{col} <= min_price THEN ({extreme.format("MIN")}) ELSE min_price END,
+            max_price = CASE WHEN {r}.{col} >= max_price THEN ({extreme.format("MAX")}) ELSE max_price END
+        WHERE {group};
+        DELETE FROM price_stats WHERE {group} AND cnt <= 0;
+    """
+
+
+def _m011_price_stats(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    price_stats — count/sum/min/max цін активних лотів по (crop, region, type).
+    Підтримується тригерами на lots; бот періодично звіряє її з lots.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS price_stats (
+            crop      TEXT NOT NULL,
+            region    TEXT NOT NULL,
+            type      TEXT NOT NULL,
+            cnt       INTEGER NOT NULL,
+            sum_price REAL NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            PRIMARY KEY (crop, region, type)
+        ) WITHOUT ROWID
+    """)
+    counted_new = f"new.status = 'active' AND {valid_price_sql('new.price')}"
+    counted_old = f"old.status = 'active' AND {valid_price_sql('old.price')}"
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS price_stats_ai AFTER INSERT ON lots
+        WHEN {counted_new} BEGIN {_price_stats_add_sql("new")} END
+    """)
+    # Зміна лота — два незалежні кроки: прибрати стару ціну, додати нову
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS price_stats_au_old
+        AFTER UPDATE OF status, crop, region, type, price ON lots
+        WHEN {counted_old} BEGIN {_price_stats_remove_sql("old")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS price_stats_au_new
+        AFTER UPDATE OF status, crop, region, type, price ON lots
+        WHEN {counted_new} BEGIN {_price_stats_add_sql("new")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS price_stats_ad AFTER DELETE ON lots
+        WHEN {counted_old} BEGIN {_price_stats_remove_sql("old")} END
+    """)
+
+    cur.execute("DELETE FROM price_stats")
+    cur.execute(f"INSERT INTO price_stats (crop, region, type, cnt, sum_price, min_price, max_price) "
+                f"SELECT * FROM ({PRICE_STATS_AGGREGATE_SQL})")
+    if verbose:
+        cur.execute("SELECT COUNT(*) FROM price_stats")
+        print(f"  ✅ price_stats: {cur.fetchone()[0]} груп")
+
+
+def _m012_price_value(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    lots.price_value (число або NULL) і lots.price_negotiable. Бот пише їх
+    разом з price; для решти записів числова price копіюється тригером.
+    Старі рядки заповнює онлайн-бекфіл lots_price_value (див. BACKFILLS).
+    price_stats з цієї версії рахується по price_value.
+    """
+    _ensure_columns(cur, "lots", [
+        ("price_value", "REAL"),
+        ("price_negotiable", "INTEGER NOT NULL DEFAULT 0"),
+    ])
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_lots_price_value "
+                "ON lots(crop, type, price_value) WHERE status = 'active'")
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lots_price_value_ai AFTER INSERT ON lots
+        WHEN new.price_value IS NULL AND {valid_price_sql('new.price')}
+        BEGIN UPDATE lots SET price_value = new.price WHERE id = new.id; END
+    """)
+    # price змінили без price_value — перерахувати з числової price (текст → NULL)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lots_price_value_au AFTER UPDATE OF price ON lots
+        WHEN new.price_value IS old.price_value
+        BEGIN
+            UPDATE lots SET price_value = CASE WHEN {valid_price_sql('new.price')} THEN new.price END
+            WHERE id = new.id;
+        END
+    """)
+
+    for name in ("price_stats_ai", "price_stats_au_old", "price_stats_au_new", "price_stats_ad"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    counted_new = f"new.status = 'active' AND {valid_price_sql('new.price_value')}"
+    counted_old = f"old.status = 'active' AND {valid_price_sql('old.price_value')}"
+    watch = "status, crop, region, type, price_value"
+    cur.execute(f"""
+        CREATE TRIGGER price_stats_ai AFTER INSERT ON lots
+        WHEN {counted_new} BEGIN {_price_stats_add_sql("new", "price_value")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER price_stats_au_old AFTER UPDATE OF {watch} ON lots
+        WHEN {counted_old} BEGIN {_price_stats_remove_sql("old", "price_value")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER price_stats_au_new AFTER UPDATE OF {watch} ON lots
+        WHEN {counted_new} BEGIN {_price_stats_add_sql("new", "price_value")} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER price_stats_ad AFTER DELETE ON lots
+        WHEN {counted_old} BEGIN {_price_stats_remove_sql("old", "price_value")} END
+    """)
+    # price_value ще порожня — агрегати наповнить бекфіл через тригери
+    cur.execute("DELETE FROM price_stats")
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name    TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            done    INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO schema_backfills (name) VALUES ('lots_price_value')")
+
+
+# Стандартні показники якості з lots.quality_json → віртуальні згенеровані колонки
+QUALITY_COLUMNS: List[Tuple[str, str]] = [
+    ("quality_moisture", "moisture"),  # вологість, %
+    ("quality_trash", "trash"),        # смітна домішка, %
+]
+
+
+def _m013_quality_columns(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    quality_moisture / quality_trash — VIRTUAL-колонки з json_extract(quality_json):
+    значення рахується при читанні, тож ні бекфілу, ні змін у записі лотів.
+    json_valid() захищає від зіпсованого JSON (інакше json_extract кидає помилку).
+    Часткові індекси по активних лотах — для фільтрів «вологість ≤ N%».
+    """
+    existing = {r[1] for r in cur.execute("PRAGMA table_xinfo(lots)").fetchall()}
+    for column, key in QUALITY_COLUMNS:
+        if column in existing:
+            continue
+        cur.execute(
+            f"ALTER TABLE lots ADD COLUMN {column} REAL GENERATED ALWAYS AS ("
+            f"CASE WHEN json_valid(quality_json) "
+            f"THEN CAST(json_extract(quality_json, '$.{key}') AS REAL) END) VIRTUAL"
+        )
+        if verbose:
+            print(f"  ✅ Додано згенеровану колонку lots.{column}")
+    for column, _ in QUALITY_COLUMNS:
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_lots_{column} ON lots(type, crop, {column}) "
+            f"WHERE status = 'active' AND {column} IS NOT NULL"
+        )
+    # Збережені фільтри біржі тепер можуть мати умову якості
+    _ensure_columns(cur, "saved_searches", [("moisture_max", "REAL"), ("trash_max", "REAL")])
+
+
+def _m014_broadcasts(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Розсилки з веб-панелі (форма моделі Broadcast) з курсором last_user_id —
+    перерваний бот продовжує розсилку з місця зупинки. users.bot_blocked —
+    користувач заблокував бота; такі не потрапляють в аудиторію розсилок.
+    """
+    _ensure_table(cur, "broadcasts", [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("admin_user_id", "INTEGER"),
+        ("content", "TEXT NOT NULL"),
+        ("media_type", "TEXT"),
+        ("media_file_id", "TEXT"),
+        ("buttons_json", "TEXT"),
+        ("audience_filter", "TEXT"),
+        ("status", "TEXT NOT NULL DEFAULT 'draft'"),
+        ("total_users", "INTEGER NOT NULL DEFAULT 0"),
+        ("sent_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("failed_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("blocked_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("last_user_id", "INTEGER NOT NULL DEFAULT 0"),
+        ("error", "TEXT"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("started_at", "TEXT"),
+        ("completed_at", "TEXT"),
+    ])
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status)")
+
+    _ensure_columns(cur, "users", [("bot_blocked", "INTEGER NOT NULL DEFAULT 0")])
+    # Фільтри аудиторії; rowid в кінці індексу — keyset по id іде тим самим індексом
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_region ON users(region)")
+
+
+def _m015_chat_session_pairs(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Одна активна сесія на пару учасників і контекст: user1_id < user2_id
+    (впорядковану пару пишуть обидва місця створення сесій), контекст —
+    lot_id (чат з лота) або offer_id (заявка логістики). Дублікати, що вже
+    є, зливає бекфіл chat_sessions_dedup; він же в кінці створює
+    UNIQUE-індекс ux_chat_sessions_pair (до злиття індекс не створиться).
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name    TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            done    INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO schema_backfills (name) VALUES ('chat_sessions_dedup')")
+
+
+def _m016_chat_messages_keyset(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Історія чату сторінками: WHERE session_id = ? AND id < ? ORDER BY id DESC —
+    один діапазон по (session_id, id), вартість не залежить від глибини.
+    idx_cm_s(session_id) покривається новим індексом — прибираємо.
+    """
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages(session_id, id)")
+    cur.execute("DROP INDEX IF EXISTS idx_cm_s")
+
+
+def _m017_chat_messages_media(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """Альбом у чаті — один рядок: message_type='album', file_id медіа в media_json."""
+    _ensure_columns(cur, "chat_messages", [("media_json", "TEXT")])
+
+
+def _m018_ads_targeting(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Реклама: weight — вага при виборі серед активних оголошень,
+    target_roles / target_regions — через кому, порожньо означає всім.
+    """
+    _ensure_columns(cur, "advertisements", [
+        ("weight", "INTEGER NOT NULL DEFAULT 1"),
+        ("target_roles", "TEXT"),
+        ("target_regions", "TEXT"),
+    ])
+
+
+def _m019_lot_matches_price_value(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Цінова складова lot_matches — по price_value (міграція 12) замість
+    текстової price: «5 200 грн» чи «договірна» порівнювались як текст і
+    давали оцінку понад 100. Тригери перестворюються з price_value у списку
+    полів; наявні пари перераховує бекфіл lot_matches_rescore — після
+    lots_price_value, коли числові ціни вже заповнені.
+    """
+    for name in ("lot_matches_ai", "lot_matches_au"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    delete_pairs = """
+        DELETE FROM lot_matches WHERE lot_id = old.id;
+        DELETE FROM lot_matches WHERE match_lot_id = old.id;
+    """
+    pairs = _lot_match_pairs_sql("new.{}", "price_value")
+    cur.execute(f"""
+        CREATE TRIGGER lot_matches_ai AFTER INSERT ON lots
+        WHEN new.status = 'active' BEGIN {pairs} END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER lot_matches_au
+        AFTER UPDATE OF status, type, crop, region, volume_tons, volume, price, price_value,
+                        owner_user_id ON lots
+        BEGIN {delete_pairs} {pairs} END
+    """)
+    cur.execute("INSERT OR IGNORE INTO schema_backfills (name) VALUES ('lot_matches_rescore')")
+
+
+def _m020_price_value_update_trigger(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    lots_price_value_au з міграції 12 спрацьовував і тоді, коли price_value
+    записали разом з price, але значення не змінилось, — і затирав його NULL.
+    Тепер тригер лише копіює числову price у price_value і ніколи не пише
+    NULL; хто змінює price текстом, сам пише price_value/price_negotiable.
+    """
+    cur.execute("DROP TRIGGER IF EXISTS lots_price_value_au")
+    cur.execute(f"""
+        CREATE TRIGGER lots_price_value_au AFTER UPDATE OF price ON lots
+        WHEN {valid_price_sql('new.price')} AND new.price_value IS NOT new.price
+        BEGIN UPDATE lots SET price_value = new.price WHERE id = new.id; END
+    """)
+
+
+def _m021_lot_alert_deferred(cur: sqlite3.Cursor, verbose: bool) -> None:
+    """
+    Лоти, що збіглися з підпискою під час її паузи (ALERT_COOLDOWN): бот
+    надсилає їх одним дайджестом, коли пауза мине, і видаляє звідси.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lot_alert_deferred (
+            kind   TEXT NOT NULL,
+            sub_id INTEGER NOT NULL,
+            lot_id INTEGER NOT NULL,
+            PRIMARY KEY (kind, sub_id, lot_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _m022_lots_browse_price_value(cur: sqlite3.Cursor, verbose: bool) -> None:
     """
-    Виконує міграцію бази даних
+    Індекси перегляду маркету (міграція 8) закінчувались текстовою price, а
+    ціновий діапазон з міграції 12 фільтрується по price_value — запит брав
+    idx_lots_price_value і сортував усі лоти діапазону заради однієї сторінки.
+    Перебудова з price_value: фільтр ціни перевіряється в тому ж індексі, що
+    дає порядок (created_at, id). Назви ті самі — на них посилаються
+    INDEXED BY у тригерах lot_matches.
+    """
+    for name, cols in (
+        ("idx_lots_browse_t", "type"),
+        ("idx_lots_browse_tc", "type, crop"),
+        ("idx_lots_browse_tr", "type, region"),
+        ("idx_lots_browse_tcr", "type, crop, region"),
+    ):
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+        cur.execute(f"CREATE INDEX {name} ON lots({cols}, created_at, id, price_value) "
+                    f"WHERE status = 'active'")
+
+
+# ══════════════════════ ONLINE BACKFILLS ══════════════════════
+# Заповнення великих таблиць після міграції: пачками по BACKFILL_CHUNK_SIZE,
+# кожна у власній короткій транзакції, з курсором у schema_backfills — бот і
+# веб-панель пишуть між пачками, перерваний бекфіл продовжується з місця зупинки.
+
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "1000"))
+
+
+def _bf_lots_price_value(cur: sqlite3.Cursor, last_id: int, size: int) -> Optional[int]:
+    """lots.price → price_value/price_negotiable. Повертає останній id пачки або None."""
+    rows = cur.execute(
+        "SELECT id, price FROM lots WHERE id > ? AND price_value IS NULL ORDER BY id LIMIT ?",
+        (last_id, size),
+    ).fetchall()
+    if not rows:
+        return None
+    updates = []
+    for lot_id, price in rows:
+        value, negotiable = parse_price(price)
+        if value is not None or negotiable:
+            updates.append((value, int(negotiable), lot_id))
+    cur.executemany("UPDATE lots SET price_value = ?, price_negotiable = ? WHERE id = ?", updates)
+    return rows[-1][0]
+
+
+# Ключ сесії — той самий вираз, що в ux_chat_sessions_pair і в ON CONFLICT
+CHAT_SESSION_KEY = "user1_id, user2_id, COALESCE(lot_id, 0), COALESCE(offer_id, 0)"
+
+
+def _bf_chat_sessions_dedup(cur: sqlite3.Cursor, last_id: int, size: int) -> Optional[int]:
+    """
+    Зливає дублікати активних сесій у найстаршу: повідомлення переносяться,
+    дублікат видаляється. Остання (порожня) пачка створює UNIQUE-індекс —
+    у тій самій транзакції, тож новий дублікат між ними з'явитись не може.
+    """
+    ids = cur.execute(
+        "SELECT id FROM chat_sessions WHERE id > ? ORDER BY id LIMIT ?", (last_id, size)
+    ).fetchall()
+    if not ids:
+        cur.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ux_chat_sessions_pair "
+            f"ON chat_sessions({CHAT_SESSION_KEY}) WHERE status = 'active'"
+        )
+        return None
+    upper = ids[-1][0]
+    dups = cur.execute(
+        """
+        SELECT d.id, MIN(k.id)
+        FROM chat_sessions d
+        JOIN chat_sessions k
+          ON k.user1_id = d.user1_id AND k.user2_id = d.user2_id
+         AND COALESCE(k.lot_id, 0) = COALESCE(d.lot_id, 0)
+         AND COALESCE(k.offer_id, 0) = COALESCE(d.offer_id, 0)
+         AND k.status = 'active' AND k.id < d.id
+        WHERE d.id > ? AND d.id <= ? AND d.status = 'active'
+        GROUP BY d.id
+        """,
+        (last_id, upper),
+    ).fetchall()
+    if dups:
+        pairs = [(keeper, dup) for dup, keeper in dups]
+        cur.executemany("UPDATE chat_messages SET session_id = ? WHERE session_id = ?", pairs)
+        if "chat_session_id" in _table_info(cur, "contact_requests"):
+            cur.executemany(
+                "UPDATE OR IGNORE contact_requests SET chat_session_id = ? WHERE chat_session_id = ?", pairs
+            )
+        cur.executemany("DELETE FROM chat_sessions WHERE id = ?", [(dup,) for dup, _ in dups])
+    return upper
+
+
+_LOT_MATCH_FIELDS = ("id", "owner_user_id", "type", "crop", "region", "volume_tons", "volume",
+                     "price_value", "status")
+
+
+def _bf_lot_matches_rescore(cur: sqlite3.Cursor, last_id: int, size: int) -> Optional[int]:
+    """Перераховує пари активних лотів по price_value (як початкове заповнення в міграції 9)."""
+    rows = cur.execute(
+        f"SELECT {', '.join(_LOT_MATCH_FIELDS)} FROM lots WHERE id > ? AND status = 'active' "
+        f"ORDER BY id LIMIT ?",
+        (last_id, size),
+    ).fetchall()
+    if not rows:
+        return None
+    insert = _lot_match_pairs_sql(":{}", "price_value").split(";")[0]
+    for row in rows:
+        cur.execute("DELETE FROM lot_matches WHERE lot_id = ?", (row[0],))
+        cur.execute(insert, dict(zip(_LOT_MATCH_FIELDS, row)))
+    return rows[-1][0]
+
+
+@dataclass(frozen=True)
+class Backfill:
+    name: str
+    version: int  # потрібна версія схеми
+    run_chunk: Callable[[sqlite3.Cursor, int, int], Optional[int]]
+
+
+BACKFILLS: List["Backfill"] = [
+    Backfill("lots_price_value", 12, _bf_lots_price_value),
+    Backfill("chat_sessions_dedup", 15, _bf_chat_sessions_dedup),
+    # Після lots_price_value: оцінки рахуються по вже заповненій price_value
+    Backfill("lot_matches_rescore", 19, _bf_lot_matches_rescore),
+]
+
+
+def run_backfills(conn: sqlite3.Connection, verbose: bool = True) -> None:
+    """Доганяє незавершені бекфіли (з'єднання в режимі isolation_level=None)."""
+    applied = _applied_versions(conn)
+    cur = conn.cursor()
+    for bf in BACKFILLS:
+        if bf.version not in applied:
+            continue
+        total = 0
+        while True:
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                state = cur.execute(
+                    "SELECT last_id, done FROM schema_backfills WHERE name = ?", (bf.name,)
+                ).fetchone()
+                if not state or state[1]:
+                    cur.execute("COMMIT")
+                    break
+                last_id = bf.run_chunk(cur, state[0], BACKFILL_CHUNK_SIZE)
+                if last_id is None:
+                    cur.execute("UPDATE schema_backfills SET done = 1 WHERE name = ?", (bf.name,))
+                else:
+                    cur.execute("UPDATE schema_backfills SET last_id = ? WHERE name = ?", (last_id, bf.name))
+                    total += 1
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            if last_id is None:
+                if verbose:
+                    print(f"  ✅ Бекфіл {bf.name}: завершено ({total} пачок)")
+                break
+
+
+# ══════════════════════ REGISTRY ══════════════════════
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Cursor, bool], None]
+
+    @property
+    def source_checksum(self) -> str:
+        """Хеш тексту функції кроку — формат checksum у schema_version до рендереного SQL."""
+        return hashlib.sha256(inspect.getsource(self.apply).encode("utf-8")).hexdigest()[:16]
+
+
+class MigrationChecksumError(RuntimeError):
+    """Застосований крок тепер виконує інший SQL, ніж був записаний у schema_version."""
+
+
+def rendered_checksums(migrations: List["Migration"]) -> Dict[int, str]:
+    """
+    Хеш SQL, який виконує кожен крок на порожній БД в пам'яті після попередніх
+    кроків. На відміну від тексту функції кроку, ловить і зміни в хелперах, які
+    він викликає (_lot_match_pairs_sql, _price_stats_*_sql, aggregate_sql …).
+    """
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    statements: List[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        cur = conn.cursor()
+        checksums = {}
+        for m in migrations:
+            statements.clear()
+            with contextlib.redirect_stdout(io.StringIO()):  # _ensure_* друкують завжди
+                m.apply(cur, False)
+            checksums[m.version] = hashlib.sha256("\n".join(statements).encode("utf-8")).hexdigest()[:16]
+        return checksums
+    finally:
+        conn.close()
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _m001_baseline),
+    Migration(2, "bot_tables", _m002_bot_tables),
+    Migration(3, "indexes", _m003_indexes),
+    Migration(4, "sync_outbox", _m004_sync_outbox),
+    Migration(5, "created_at_indexes", _m005_created_at_indexes),
+    Migration(6, "search_fts", _m006_search_fts),
+    Migration(7, "lots_fts", _m007_lots_fts),
+    Migration(8, "lots_browse_indexes", _m008_lots_browse_indexes),
+    Migration(9, "lot_matches", _m009_lot_matches),
+    Migration(10, "standing_queries", _m010_standing_queries),
+    Migration(11, "price_stats", _m011_price_stats),
+    Migration(12, "price_value", _m012_price_value),
+    Migration(13, "quality_columns", _m013_quality_columns),
+    Migration(14, "broadcasts", _m014_broadcasts),
+    Migration(15, "chat_session_pairs", _m015_chat_session_pairs),
+    Migration(16, "chat_messages_keyset", _m016_chat_messages_keyset),
+    Migration(17, "chat_messages_media", _m017_chat_messages_media),
+    Migration(18, "ads_targeting", _m018_ads_targeting),
+    Migration(19, "lot_matches_price_value", _m019_lot_matches_price_value),
+    Migration(20, "price_value_update_trigger", _m020_price_value_update_trigger),
+    Migration(21, "lot_alert_deferred", _m021_lot_alert_deferred),
+    Migration(22, "lots_browse_price_value", _m022_lots_browse_price_value),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _applied_versions(conn: sqlite3.Connection) -> Dict[int, str]:
+    rows = conn.execute("SELECT version, checksum FROM schema_version").fetchall()
+    return {int(v): c for v, c in rows}
+
+
+def migrate(db_path: str, verbose: bool = True) -> int:
+    """
+    Застосовує відсутні кроки з MIGRATIONS. Повертає поточну версію схеми.
 
     Args:
         db_path: Шлях до файлу бази даних
@@ -164,236 +1395,83 @@ def migrate(db_path: str, verbose: bool = True) -> None:
     if db_dir:
         os.makedirs(db_dir, exist_ok=True)
 
-    if verbose:
-        print(f"🔧 Міграція БД: {db_path}")
-
-    conn = sqlite3.connect(db_path)
+    # isolation_level=None — транзакціями керуємо явно (BEGIN IMMEDIATE),
+    # щоб бот і веб-панель, стартуючи одночасно, не застосували крок двічі
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
     try:
-        # PRAGMA для швидкодії та безпечної паралельної роботи
+        # WAL — властивість файлу БД, достатньо встановити один раз при старті
         try:
             conn.execute("PRAGMA journal_mode=WAL")
             conn.execute("PRAGMA synchronous=NORMAL")
         except Exception:
             pass
 
-        cur = conn.cursor()
-        total_added = 0
-
-        # Таблиця users
-        if verbose:
-            print("\n📋 Таблиця users:")
-
-        if not _table_exists(cur, "users"):
-            # Таблиці немає - створюємо з UNIQUE
-            _ensure_table(cur, "users", USER_COLUMNS_CREATE)
-            print("  ✅ Створено нову таблицю users")
-        else:
-            # Таблиця є - додаємо колонки БЕЗ UNIQUE
-            total_added += _ensure_columns(cur, "users", USER_COLUMNS_ALTER)
-            # Виправляємо telegram_id через індекс
-            _fix_telegram_id_unique(cur)
-
-        # Таблиця web_admins
-        if verbose:
-            print("\n📋 Таблиця web_admins:")
-        _ensure_table(cur, "web_admins", WEB_ADMINS_COLUMNS)
-        total_added += _ensure_columns(cur, "web_admins", WEB_ADMINS_COLUMNS)
-
-        # Таблиця lots
-        if verbose:
-            print("\n📋 Таблиця lots:")
-        _ensure_table(cur, "lots", LOTS_COLUMNS)
-        total_added += _ensure_columns(cur, "lots", LOTS_COLUMNS)
-
-        # Таблиця settings
-        if verbose:
-            print("\n📋 Таблиця settings:")
-        _ensure_table(cur, "settings", SETTINGS_COLUMNS)
-
-        # Таблиця user_subscriptions
-        if verbose:
-            print("\n📋 Таблиця user_subscriptions:")
-        _ensure_table(cur, "user_subscriptions", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("user_id", "INTEGER NOT NULL"),
-            ("plan", "TEXT NOT NULL DEFAULT 'free'"),
-            ("started_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-            ("expires_at", "TEXT"),
-            ("is_active", "INTEGER DEFAULT 1"),
-            ("payment_id", "TEXT"),
-        ])
-
-        # Таблиця vehicles
-        if verbose:
-            print("\n📋 Таблиця vehicles:")
-        _ensure_table(cur, "vehicles", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("owner_user_id", "INTEGER NOT NULL"),
-            ("body_type", "TEXT NOT NULL"),
-            ("capacity_tons", "REAL NOT NULL"),
-            ("count_units", "INTEGER NOT NULL DEFAULT 1"),
-            ("base_region", "TEXT NOT NULL"),
-            ("work_regions", "TEXT"),
-            ("status", "TEXT NOT NULL DEFAULT 'available'"),
-            ("available_from", "TEXT"),
-            ("comment", "TEXT"),
-            ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-            ("updated_at", "TEXT"),
-        ])
-
-        # Таблиця shipments
-        if verbose:
-            print("\n📋 Таблиця shipments:")
-        _ensure_table(cur, "shipments", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("creator_user_id", "INTEGER NOT NULL"),
-            ("cargo_type", "TEXT NOT NULL"),
-            ("volume_tons", "REAL NOT NULL"),
-            ("from_region", "TEXT NOT NULL"),
-            ("from_location", "TEXT"),
-            ("to_region", "TEXT NOT NULL"),
-            ("to_location", "TEXT"),
-            ("date_from", "TEXT"),
-            ("date_to", "TEXT"),
-            ("required_body_types", "TEXT"),
-            ("comment", "TEXT"),
-            ("status", "TEXT NOT NULL DEFAULT 'active'"),
-            ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-            ("updated_at", "TEXT"),
-        ])
-
-        # Таблиця chat_sessions
-        if verbose:
-            print("\n📋 Таблиця chat_sessions:")
-        _ensure_table(cur, "chat_sessions", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("user1_id", "INTEGER NOT NULL"),
-            ("user2_id", "INTEGER NOT NULL"),
-            ("lot_id", "INTEGER"),
-            ("offer_id", "INTEGER"),
-            ("status", "TEXT NOT NULL DEFAULT 'active'"),
-            ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-            ("updated_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-        ])
-
-        # Таблиця chat_messages
-        if verbose:
-            print("\n📋 Таблиця chat_messages:")
-        _ensure_table(cur, "chat_messages", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("session_id", "INTEGER NOT NULL"),
-            ("sender_user_id", "INTEGER NOT NULL"),
-            ("content", "TEXT NOT NULL"),
-            ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-        ])
-
-        # Таблиця contacts (з UNIQUE для INSERT OR IGNORE/REPLACE)
-        if verbose:
-            print("\n📋 Таблиця contacts:")
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS contacts (
-                id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id          INTEGER NOT NULL,
-                contact_user_id  INTEGER NOT NULL,
-                status           TEXT NOT NULL DEFAULT 'pending',
-                created_at       TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, contact_user_id)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version    INTEGER PRIMARY KEY,
+                name       TEXT NOT NULL,
+                checksum   TEXT NOT NULL,
+                applied_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
         """)
 
-        # Таблиця counter_offers
-        if verbose:
-            print("\n📋 Таблиця counter_offers:")
-        _ensure_table(cur, "counter_offers", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("lot_id", "INTEGER NOT NULL"),
-            ("sender_user_id", "INTEGER NOT NULL"),
-            ("offered_price", "REAL NOT NULL"),
-            ("message", "TEXT"),
-            ("status", "TEXT NOT NULL DEFAULT 'pending'"),
-            ("created_at", "TEXT DEFAULT (datetime('now'))"),
-        ])
-
-        # Таблиця payments
-        if verbose:
-            print("\n📋 Таблиця payments:")
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id                 INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id            INTEGER NOT NULL,
-                plan               TEXT,
-                amount             INTEGER NOT NULL DEFAULT 0,
-                currency           TEXT DEFAULT 'UAH',
-                status             TEXT DEFAULT 'pending',
-                provider           TEXT DEFAULT 'manual',
-                provider_payment_id TEXT,
-                payment_method     TEXT,
-                created_at         TEXT DEFAULT CURRENT_TIMESTAMP,
-                paid_at            TEXT
+        checksums = rendered_checksums(MIGRATIONS)
+        applied = _applied_versions(conn)
+        changed = []
+        for m in MIGRATIONS:
+            stored = applied.get(m.version)
+            if stored is None or stored == checksums[m.version]:
+                continue
+            if stored == m.source_checksum:
+                # checksum старого формату (текст функції) — крок не змінювався
+                conn.execute("UPDATE schema_version SET checksum = ? WHERE version = ?",
+                             (checksums[m.version], m.version))
+                continue
+            changed.append(f"{m.version} ({m.name}): {stored} != {checksums[m.version]}")
+        if changed:
+            raise MigrationChecksumError(
+                "Застосовані міграції змінились — додайте новий крок замість редагування: "
+                + "; ".join(changed)
             )
-        """)
 
-        # Таблиця advertisements
-        if verbose:
-            print("\n📋 Таблиця advertisements:")
-        _ensure_table(cur, "advertisements", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("title", "TEXT NOT NULL"),
-            ("type", "TEXT NOT NULL"),
-            ("content", "TEXT NOT NULL"),
-            ("image_url", "TEXT"),
-            ("button_text", "TEXT"),
-            ("button_url", "TEXT"),
-            ("is_active", "INTEGER DEFAULT 1"),
-            ("show_frequency", "INTEGER DEFAULT 3"),
-            ("views_count", "INTEGER DEFAULT 0"),
-            ("clicks_count", "INTEGER DEFAULT 0"),
-            ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-            ("updated_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-        ])
-
-        # Таблиця advertisement_views
-        if verbose:
-            print("\n📋 Таблиця advertisement_views:")
-        _ensure_table(cur, "advertisement_views", [
-            ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
-            ("ad_id", "INTEGER NOT NULL"),
-            ("user_id", "INTEGER NOT NULL"),
-            ("viewed_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
-            ("clicked", "INTEGER DEFAULT 0"),
-        ])
+        pending = [m for m in MIGRATIONS if m.version not in applied]
+        if not pending:
+            run_backfills(conn, verbose)
+            if verbose:
+                print(f"✅ Схема БД актуальна (версія {LATEST_VERSION})")
+            return LATEST_VERSION
 
+        if verbose:
+            print(f"🔧 Міграція БД: {db_path}")
 
-        # Індекси для швидкої роботи (бот менше гальмує)
-        try:
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)")
-        except Exception:
-            pass
-        try:
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_users_is_banned ON users(is_banned)")
-        except Exception:
-            pass
-        try:
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_lots_owner_user_id ON lots(owner_user_id)")
-        except Exception:
-            pass
-        try:
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_lots_status ON lots(status)")
-        except Exception:
-            pass
-        try:
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_ads_active ON advertisements(is_active)")
-        except Exception:
-            pass
-
-        conn.commit()
+        cur = conn.cursor()
+        for m in pending:
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                # Інший процес міг застосувати крок, поки ми чекали на блокування
+                done = cur.execute(
+                    "SELECT 1 FROM schema_version WHERE version = ?", (m.version,)
+                ).fetchone()
+                if not done:
+                    if verbose:
+                        print(f"\n▶️  {m.version:03d}_{m.name}")
+                    m.apply(cur, verbose)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, name, checksum) VALUES (?, ?, ?)",
+                        (m.version, m.name, checksums[m.version]),
+                    )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
 
+        run_backfills(conn, verbose)
         if verbose:
-            print(f"\n✅ Міграція завершена! Додано {total_added} колонок")
+            print(f"\n✅ Міграція завершена! Версія схеми: {LATEST_VERSION}")
+        return LATEST_VERSION
 
     except Exception as e:
         print(f"❌ Помилка міграції: {e}")
-        conn.rollback()
         raise
     finally:
         conn.close()
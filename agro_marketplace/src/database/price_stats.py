@@ -0,0 +1,77 @@
+"""
+Ціни лотів: розбір введеної ціни і SQL агрегатів price_stats — спільне для
+міграцій, бота і веб-панелі.
+
+lots.price історично вільний текст («5200», «5 200 грн», «договірна»), тому
+числове значення зберігається окремо в lots.price_value (NULL — ціни немає),
+а lots.price_negotiable позначає «договірну» (міграція 12). price_stats
+зберігає по (crop, region, type) кількість, суму, мінімум і максимум
+price_value активних лотів.
+"""
+import re
+from typing import Optional, Tuple
+
+NEGOTIABLE_WORDS = ("догов", "торг")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_price(value) -> Tuple[Optional[float], bool]:
+    """
+    (числова ціна або None, чи «договірна»).
+    5200 → (5200.0, False); "5 200 грн" → (5200.0, False); "договірна" → (None, True).
+    """
+    if value is None:
+        return None, False
+    if isinstance(value, (int, float)):
+        return (float(value), False) if value > 0 else (None, False)
+    text = str(value).strip().lower()
+    if not text:
+        return None, False
+    if any(w in text for w in NEGOTIABLE_WORDS):
+        return None, True
+    # Пробіли — роздільники тисяч, кома — десяткова
+    match = _NUMBER.search(re.sub(r"\s+", "", text).replace(",", "."))
+    if not match:
+        return None, False
+    number = float(match.group())
+    return (number, False) if number > 0 else (None, False)
+
+
+def valid_price_sql(expr: str) -> str:
+    """Умова «expr — додатна числова ціна»."""
+    return f"(typeof({expr}) IN ('integer', 'real') AND {expr} > 0)"
+
+
+def aggregate_sql(column: str = "price_value", indexed_by: Optional[str] = None) -> str:
+    """Повний перерахунок price_stats з lots — початкове заповнення і звірка."""
+    source = f"lots INDEXED BY {indexed_by}" if indexed_by else "lots"
+    return f"""
+    SELECT crop, region, type, COUNT(*) AS cnt, SUM({column}) AS sum_price,
+           MIN({column}) AS min_price, MAX({column}) AS max_price
+    FROM {source}
+    WHERE status = 'active' AND {valid_price_sql(column)}
+    GROUP BY type, crop, region
+"""
+
+
+AGGREGATE_SQL = aggregate_sql("price_value")
+
+# Зведення по культурах для «📈 Ціни» — O(кількості груп), а не лотів
+CROP_SUMMARY_SQL = """
+    SELECT crop, SUM(cnt) AS count, SUM(sum_price) / SUM(cnt) AS avg_price,
+           MIN(min_price) AS min_price, MAX(max_price) AS max_price
+    FROM price_stats
+    GROUP BY crop
+    ORDER BY count DESC
+    LIMIT ?
+"""
+
+# Те саме з розбивкою продаж/купівля — для дашборду
+CROP_TYPE_SUMMARY_SQL = """
+    SELECT crop, type, SUM(cnt) AS count, SUM(sum_price) / SUM(cnt) AS avg_price,
+           MIN(min_price) AS min_price, MAX(max_price) AS max_price
+    FROM price_stats
+    GROUP BY crop, type
+    ORDER BY count DESC
+    LIMIT ?
+"""
@@ -2,19 +2,17 @@
 """
 Agro Marketplace — Admin Web Panel
 ✅ Синхронізація з ботом через спільну SQLite БД + JSON-файл подій
-✅ Бот отримує сповіщення про бан/розбан/зміну лота через FileBasedSync
+✅ Бот отримує сповіщення про бан/розбан/зміну лота через SyncOutbox (таблиця sync_outbox)
 ✅ Єдиний context_processor, правильне закриття з'єднань
 """
 
-import csv
-import datetime
+import json
 import logging
-from io import StringIO
 from pathlib import Path
 
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, flash, jsonify, Response,
+    url_for, flash, jsonify,
 )
 from flask_login import (
     LoginManager, login_user, logout_user,
@@ -24,23 +22,35 @@ from flask_login import (
 from config.settings import FLASK_SECRET, ADMIN_USER, ADMIN_PASS, DB_PATH
 from .db import get_conn, init_schema, get_setting, set_setting
 from .auth import AdminUser, check_login
-
-# Імпорт FileBasedSync для відправки подій боту
+from .stats import dashboard_stats, invalidate as invalidate_stats
+from .exports import csv_export_response
+from .pagination import Page, keyset_page, invalidate_counts
+from src.database.fts import fts_match_query
+from src.database.audience import compile_audience, count_sql
+from config.constants import ROLES
+
+# Імпорт SyncOutbox для відправки подій боту
 try:
-    from src.bot.services.sync_service import FileBasedSync
+    from src.bot.services.sync_service import SyncOutbox
 except ImportError:
     # Fallback якщо запускається не з кореня проекту
     try:
         import sys
         sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
-        from src.bot.services.sync_service import FileBasedSync
+        from src.bot.services.sync_service import SyncOutbox
     except ImportError:
-        class FileBasedSync:
+        class SyncOutbox:
             """Заглушка якщо sync_service недоступний"""
             @classmethod
             def write_event(cls, *a, **kw): pass
             @classmethod
-            def read_unprocessed_events(cls): return []
+            def read_pending(cls, *a, **kw): return []
+            @classmethod
+            def processed_count(cls, *a, **kw): return 0
+            @classmethod
+            def skip_pending(cls, *a, **kw): pass
+            @staticmethod
+            def notify(): pass
 
 logger = logging.getLogger(__name__)
 
@@ -122,66 +132,15 @@ def create_app() -> Flask:
     def dashboard():
         conn = get_conn()
         try:
-            stats = {"users": 0, "lots": 0, "active_lots": 0, "banned": 0}
-
-            if _has_table(conn, "users"):
-                try:
-                    stats["users"] = conn.execute("SELECT COUNT(*) AS c FROM users").fetchone()["c"]
-                    if _has_col(conn, "users", "is_banned"):
-                        stats["banned"] = conn.execute(
-                            "SELECT COUNT(*) AS c FROM users WHERE is_banned=1"
-                        ).fetchone()["c"]
-                except Exception:
-                    pass
-
-            if _has_table(conn, "lots"):
-                try:
-                    stats["lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots").fetchone()["c"]
-                    cols = _table_cols(conn, "lots")
-                    if "status" in cols:
-                        stats["active_lots"] = conn.execute(
-                            "SELECT COUNT(*) AS c FROM lots WHERE status IN ('active','open','published')"
-                        ).fetchone()["c"]
-                    elif "is_active" in cols:
-                        stats["active_lots"] = conn.execute(
-                            "SELECT COUNT(*) AS c FROM lots WHERE is_active=1"
-                        ).fetchone()["c"]
-                except Exception:
-                    pass
-
-            weekly_data = {"labels": [], "new_users": [0] * 7, "new_lots": [0] * 7}
-            for i in range(6, -1, -1):
-                d = datetime.datetime.now() - datetime.timedelta(days=i)
-                weekly_data["labels"].append(["Пн","Вт","Ср","Чт","Пт","Сб","Нд"][d.weekday()])
-
-            if _has_table(conn, "users") and _has_col(conn, "users", "created_at"):
-                try:
-                    for i in range(6, -1, -1):
-                        row = conn.execute(
-                            "SELECT COUNT(*) AS c FROM users WHERE date(created_at)=date('now','-'||?||' days')", (i,)
-                        ).fetchone()
-                        weekly_data["new_users"][6 - i] = row["c"] if row else 0
-                except Exception:
-                    pass
-
-            if _has_table(conn, "lots") and _has_col(conn, "lots", "created_at"):
-                try:
-                    for i in range(6, -1, -1):
-                        row = conn.execute(
-                            "SELECT COUNT(*) AS c FROM lots WHERE date(created_at)=date('now','-'||?||' days')", (i,)
-                        ).fetchone()
-                        weekly_data["new_lots"][6 - i] = row["c"] if row else 0
-                except Exception:
-                    pass
-
-            recent_lots = []
-            if _has_table(conn, "lots"):
-                try:
-                    recent_lots = conn.execute("SELECT * FROM lots ORDER BY id DESC LIMIT 4").fetchall()
-                except Exception:
-                    pass
-
-            return render_template("dashboard.html", stats=stats, weekly_data=weekly_data, recent_lots=recent_lots)
+            data = dashboard_stats(conn)
+            recent_lots = conn.execute("SELECT * FROM lots ORDER BY id DESC LIMIT 4").fetchall()
+            return render_template(
+                "dashboard.html",
+                stats=data["stats"],
+                weekly_data=data["weekly_data"],
+                prices=data["prices"],
+                recent_lots=recent_lots,
+            )
         finally:
             conn.close()
 
@@ -193,10 +152,12 @@ def create_app() -> Flask:
         conn = get_conn()
         try:
             if not _has_table(conn, "users"):
-                return render_template("users.html", rows=[], q=q)
+                return render_template("users.html", rows=[], q=q, page=Page())
             cols = _table_cols(conn, "users")
-            where, params = [], []
-            if q:
+            where, params, fts = [], [], None
+            if q and _has_table(conn, "users_fts"):
+                fts = ("users_fts", fts_match_query(q)) if fts_match_query(q) else None
+            elif q:
                 search = []
                 if "telegram_id" in cols:
                     search.append("CAST(telegram_id AS TEXT) LIKE ?"); params.append(f"%{q}%")
@@ -206,12 +167,8 @@ def create_app() -> Flask:
                     search.append("LOWER(COALESCE(full_name,'')) LIKE LOWER(?)"); params.append(f"%{q}%")
                 if search:
                     where.append(f"({' OR '.join(search)})")
-            sql = "SELECT * FROM users"
-            if where:
-                sql += " WHERE " + " AND ".join(where)
-            sql += " ORDER BY id DESC LIMIT 300"
-            rows = conn.execute(sql, tuple(params)).fetchall()
-            return render_template("users.html", rows=rows, q=q)
+            page = keyset_page(conn, "*", "users", where, params, fts=fts)
+            return render_template("users.html", rows=page.rows, q=q, page=page)
         finally:
             conn.close()
 
@@ -219,23 +176,13 @@ def create_app() -> Flask:
     @login_required
     def users_export():
         conn = get_conn()
-        try:
-            if not _has_table(conn, "users"):
-                flash("Таблиця не знайдена", "danger")
-                return redirect(url_for("users_page"))
-            users = conn.execute("SELECT * FROM users ORDER BY id DESC").fetchall()
-        finally:
+        if not _has_table(conn, "users"):
             conn.close()
-        output = StringIO()
-        if users:
-            writer = csv.DictWriter(output, fieldnames=list(users[0].keys()))
-            writer.writeheader()
-            for u in users:
-                writer.writerow(dict(u))
-        output.seek(0)
-        return Response(output.getvalue(), mimetype="text/csv",
-                        headers={"Content-Disposition": "attachment;filename=users_export.csv",
-                                 "Content-Type": "text/csv; charset=utf-8"})
+            flash("Таблиця не знайдена", "danger")
+            return redirect(url_for("users_page"))
+        # З'єднання закриє генератор після віддачі останньої пачки
+        return csv_export_response(conn, "users", _table_cols(conn, "users"), request.args,
+                                   "users_export.csv")
 
     @app.get("/users/<int:user_id>")
     @login_required
@@ -310,7 +257,7 @@ def create_app() -> Flask:
     @app.post("/users/<int:user_id>/ban")
     @login_required
     def user_ban(user_id: int):
-        """Бан користувача + сповіщення бота через FileBasedSync"""
+        """Бан користувача + сповіщення бота через SyncOutbox"""
         conn = get_conn()
         try:
             if not _has_table(conn, "users") or not _has_col(conn, "users", "is_banned"):
@@ -322,15 +269,17 @@ def create_app() -> Flask:
             telegram_id = user["telegram_id"] if user else None
 
             conn.execute("UPDATE users SET is_banned=1 WHERE id=?", (user_id,))
-            conn.commit()
-            flash("Користувача забанено ✅", "success")
-
-            # Відправляємо подію боту — він сповістить користувача в Telegram
+            # Подія для бота — в тій самій транзакції, що й зміна статусу
             if telegram_id:
-                FileBasedSync.write_event("user_banned", {
+                SyncOutbox.write_event("user_banned", {
                     "user_id": user_id,
                     "telegram_id": telegram_id,
-                })
+                }, conn=conn)
+            conn.commit()
+            SyncOutbox.notify()
+            invalidate_stats()
+            flash("Користувача забанено ✅", "success")
+            if telegram_id:
                 logger.info("Sync event 'user_banned' sent for telegram_id=%s", telegram_id)
 
         except Exception as e:
@@ -356,14 +305,17 @@ def create_app() -> Flask:
             telegram_id = user["telegram_id"] if user else None
 
             conn.execute("UPDATE users SET is_banned=0 WHERE id=?", (user_id,))
-            conn.commit()
-            flash("Користувача розбанено ✅", "success")
-
+            # Подія для бота — в тій самій транзакції, що й зміна статусу
             if telegram_id:
-                FileBasedSync.write_event("user_unbanned", {
+                SyncOutbox.write_event("user_unbanned", {
                     "user_id": user_id,
                     "telegram_id": telegram_id,
-                })
+                }, conn=conn)
+            conn.commit()
+            SyncOutbox.notify()
+            invalidate_stats()
+            flash("Користувача розбанено ✅", "success")
+            if telegram_id:
                 logger.info("Sync event 'user_unbanned' sent for telegram_id=%s", telegram_id)
 
         except Exception as e:
@@ -383,16 +335,14 @@ def create_app() -> Flask:
         conn = get_conn()
         try:
             if not _has_table(conn, "lots"):
-                return render_template("lots.html", rows=[], status=status_filter, cols=[])
+                return render_template("lots.html", rows=[], status=status_filter, cols=[], page=Page())
             cols = _table_cols(conn, "lots")
-            sql = "SELECT * FROM lots"
-            params = []
+            where, params = [], []
             if status_filter and "status" in cols:
-                sql += " WHERE status=?"
+                where.append("status=?")
                 params.append(status_filter)
-            sql += " ORDER BY id DESC LIMIT 500"
-            rows = conn.execute(sql, tuple(params)).fetchall()
-            return render_template("lots.html", rows=rows, status=status_filter, cols=cols)
+            page = keyset_page(conn, "*", "lots", where, params)
+            return render_template("lots.html", rows=page.rows, status=status_filter, cols=cols, page=page)
         finally:
             conn.close()
 
@@ -400,24 +350,12 @@ def create_app() -> Flask:
     @login_required
     def lots_export():
         conn = get_conn()
-        try:
-            if not _has_table(conn, "lots"):
-                flash("Таблиця не знайдена", "danger")
-                return redirect(url_for("lots_page"))
-            lots = conn.execute("SELECT * FROM lots ORDER BY id DESC").fetchall()
-        finally:
+        if not _has_table(conn, "lots") or not conn.execute("SELECT 1 FROM lots LIMIT 1").fetchone():
             conn.close()
-        if not lots:
             flash("Немає лотів для експорту", "warning")
             return redirect(url_for("lots_page"))
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=list(lots[0].keys()))
-        writer.writeheader()
-        for lot in lots:
-            writer.writerow(dict(lot))
-        output.seek(0)
-        return Response(output.getvalue(), mimetype="text/csv",
-                        headers={"Content-Disposition": "attachment;filename=lots_export.csv"})
+        return csv_export_response(conn, "lots", _table_cols(conn, "lots"), request.args,
+                                   "lots_export.csv")
 
     @app.get("/lots/<int:lot_id>")
     @login_required
@@ -440,7 +378,7 @@ def create_app() -> Flask:
         return render_template("lot_detail.html", lot=lot, owner=owner, cols=cols_lots)
 
     def _notify_lot_status(conn, lot_id: int, new_status: str):
-        """Відправляє sync-подію боту при зміні статусу лота"""
+        """Додає sync-подію для бота в поточну транзакцію (commit робить викликач)"""
         try:
             if _has_table(conn, "users"):
                 row = conn.execute("""
@@ -449,11 +387,11 @@ def create_app() -> Flask:
                     WHERE l.id=?
                 """, (lot_id,)).fetchone()
                 if row and row["telegram_id"]:
-                    FileBasedSync.write_event("lot_status_changed", {
+                    SyncOutbox.write_event("lot_status_changed", {
                         "lot_id": lot_id,
                         "new_status": new_status,
                         "owner_telegram_id": row["telegram_id"],
-                    })
+                    }, conn=conn)
         except Exception as e:
             logger.error("Failed to send lot sync event: %s", e)
 
@@ -465,8 +403,11 @@ def create_app() -> Flask:
         try:
             if _has_table(conn, "lots") and _has_col(conn, "lots", "status"):
                 conn.execute("UPDATE lots SET status=? WHERE id=?", (new_status, lot_id))
-                conn.commit()
                 _notify_lot_status(conn, lot_id, new_status)
+                conn.commit()
+                SyncOutbox.notify()
+                invalidate_stats()
+                invalidate_counts()
                 flash(f"Статус лота #{lot_id} змінено на '{new_status}' ✅", "success")
             else:
                 flash("Неможливо змінити статус ❌", "danger")
@@ -487,8 +428,11 @@ def create_app() -> Flask:
                     conn.execute("UPDATE lots SET is_closed=1 WHERE id=?", (lot_id,))
                 elif "is_active" in cols:
                     conn.execute("UPDATE lots SET is_active=0 WHERE id=?", (lot_id,))
-                conn.commit()
                 _notify_lot_status(conn, lot_id, "closed")
+                conn.commit()
+                SyncOutbox.notify()
+                invalidate_stats()
+                invalidate_counts()
                 flash(f"Лот #{lot_id} закрито ✅", "success")
         finally:
             conn.close()
@@ -507,8 +451,11 @@ def create_app() -> Flask:
                     conn.execute("UPDATE lots SET is_closed=0 WHERE id=?", (lot_id,))
                 elif "is_active" in cols:
                     conn.execute("UPDATE lots SET is_active=1 WHERE id=?", (lot_id,))
-                conn.commit()
                 _notify_lot_status(conn, lot_id, "active")
+                conn.commit()
+                SyncOutbox.notify()
+                invalidate_stats()
+                invalidate_counts()
                 flash(f"Лот #{lot_id} активовано ✅", "success")
         finally:
             conn.close()
@@ -521,17 +468,18 @@ def create_app() -> Flask:
         conn = get_conn()
         try:
             if not _has_table(conn, "contacts"):
-                return render_template("contacts.html", contacts=[])
-            contacts = conn.execute("""
-                SELECT c.id, c.user_id, c.contact_user_id, c.status, c.created_at,
-                       u1.full_name as user_name, u1.username as user_username, u1.telegram_id as user_telegram_id,
-                       u2.full_name as contact_name, u2.username as contact_username, u2.telegram_id as contact_telegram_id
-                FROM contacts c
+                return render_template("contacts.html", contacts=[], page=Page())
+            page = keyset_page(
+                conn,
+                """c.id, c.user_id, c.contact_user_id, c.status, c.created_at,
+                   u1.full_name as user_name, u1.username as user_username, u1.telegram_id as user_telegram_id,
+                   u2.full_name as contact_name, u2.username as contact_username, u2.telegram_id as contact_telegram_id""",
+                """contacts c
                 LEFT JOIN users u1 ON c.user_id=u1.id
-                LEFT JOIN users u2 ON c.contact_user_id=u2.id
-                ORDER BY c.created_at DESC LIMIT 500
-            """).fetchall()
-            return render_template("contacts.html", contacts=contacts)
+                LEFT JOIN users u2 ON c.contact_user_id=u2.id""",
+                id_col="c.id",
+            )
+            return render_template("contacts.html", contacts=page.rows, page=page)
         finally:
             conn.close()
 
@@ -556,17 +504,23 @@ def create_app() -> Flask:
             set_setting(key, request.form.get(key, ""))
         set_setting("auto_moderation", "1" if request.form.get("auto_moderation") else "0")
         # Сповіщаємо бота про зміну налаштувань
-        FileBasedSync.write_event("settings_changed", {"changed": True})
+        SyncOutbox.write_event("settings_changed", {"changed": True})
         flash("Налаштування збережено ✅", "success")
         return redirect(url_for("settings_page"))
 
     # -------- Реклама --------
+    # Кожна зміна пише подію ads_changed — бот перечитує індекс реклами (services/ad_index.py)
+    def _ad_targets(raw) -> str:
+        """'farmer, buyer,' → 'farmer,buyer' (порожньо — без таргетингу)."""
+        return ",".join(dict.fromkeys(p.strip() for p in (raw or "").split(",") if p.strip()))
+
     @app.get("/advertisements")
     @login_required
     def advertisements_page():
         conn = get_conn()
         try:
-            ads = conn.execute("SELECT * FROM advertisements ORDER BY created_at DESC").fetchall()
+            # dict — шаблон серіалізує оголошення в JSON для модалки редагування
+            ads = [dict(r) for r in conn.execute("SELECT * FROM advertisements ORDER BY created_at DESC")]
             return render_template("advertisements.html", ads=ads)
         except Exception as e:
             logger.error("Advertisements error: %s", e)
@@ -586,6 +540,9 @@ def create_app() -> Flask:
         button_url     = request.form.get("button_url", "").strip()
         show_frequency = int(request.form.get("show_frequency", 3))
         is_active      = 1 if request.form.get("is_active") else 0
+        weight         = max(1, int(request.form.get("weight") or 1))
+        target_roles   = _ad_targets(request.form.get("target_roles"))
+        target_regions = _ad_targets(request.form.get("target_regions"))
 
         if not title or not content:
             flash("Назва та текст обов'язкові!", "danger")
@@ -595,10 +552,14 @@ def create_app() -> Flask:
         try:
             conn.execute("""
                 INSERT INTO advertisements
-                (title, type, content, image_url, button_text, button_url, show_frequency, is_active)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (title, ad_type, content, image_url, button_text, button_url, show_frequency, is_active))
+                (title, type, content, image_url, button_text, button_url, show_frequency, is_active,
+                 weight, target_roles, target_regions)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (title, ad_type, content, image_url, button_text, button_url, show_frequency, is_active,
+                  weight, target_roles, target_regions))
+            SyncOutbox.write_event("ads_changed", {}, conn=conn)
             conn.commit()
+            SyncOutbox.notify()
             flash("✅ Оголошення створено!", "success")
         except Exception as e:
             logger.error("Error creating ad: %s", e)
@@ -619,6 +580,9 @@ def create_app() -> Flask:
         button_url     = request.form.get("button_url", "").strip()
         show_frequency = int(request.form.get("show_frequency", 3))
         is_active      = 1 if request.form.get("is_active") else 0
+        weight         = max(1, int(request.form.get("weight") or 1))
+        target_roles   = _ad_targets(request.form.get("target_roles"))
+        target_regions = _ad_targets(request.form.get("target_regions"))
 
         if not title or not content:
             flash("Назва та текст обов'язкові!", "danger")
@@ -629,11 +593,14 @@ def create_app() -> Flask:
             conn.execute("""
                 UPDATE advertisements
                 SET title=?, type=?, content=?, image_url=?, button_text=?, button_url=?,
-                    show_frequency=?, is_active=?, updated_at=CURRENT_TIMESTAMP
+                    show_frequency=?, is_active=?, weight=?, target_roles=?, target_regions=?,
+                    updated_at=CURRENT_TIMESTAMP
                 WHERE id=?
             """, (title, ad_type, content, image_url, button_text, button_url,
-                  show_frequency, is_active, ad_id))
+                  show_frequency, is_active, weight, target_roles, target_regions, ad_id))
+            SyncOutbox.write_event("ads_changed", {"ad_id": ad_id}, conn=conn)
             conn.commit()
+            SyncOutbox.notify()
             flash("✅ Оголошення оновлено!", "success")
         except Exception as e:
             logger.error("Error editing ad: %s", e)
@@ -653,7 +620,9 @@ def create_app() -> Flask:
                 SET is_active=CASE WHEN is_active=1 THEN 0 ELSE 1 END, updated_at=CURRENT_TIMESTAMP
                 WHERE id=?
             """, (ad_id,))
+            SyncOutbox.write_event("ads_changed", {"ad_id": ad_id}, conn=conn)
             conn.commit()
+            SyncOutbox.notify()
             flash("✅ Статус оголошення змінено", "success")
         except Exception as e:
             flash(f"Помилка: {e}", "danger")
@@ -669,7 +638,9 @@ def create_app() -> Flask:
         try:
             conn.execute("DELETE FROM advertisement_views WHERE ad_id=?", (ad_id,))
             conn.execute("DELETE FROM advertisements WHERE id=?", (ad_id,))
+            SyncOutbox.write_event("ads_changed", {"ad_id": ad_id}, conn=conn)
             conn.commit()
+            SyncOutbox.notify()
             flash("✅ Оголошення видалено", "success")
         except Exception as e:
             flash(f"Помилка: {e}", "danger")
@@ -678,17 +649,150 @@ def create_app() -> Flask:
             conn.close()
         return redirect(url_for("advertisements_page"))
 
+    # -------- Розсилки --------
+    # Відправку виконує бот (services/broadcasts.py); панель створює, запускає,
+    # ставить на паузу і показує прогрес з лічильників у broadcasts.
+    @app.get("/broadcasts")
+    @login_required
+    def broadcasts_page():
+        conn = get_conn()
+        try:
+            rows = conn.execute("SELECT * FROM broadcasts ORDER BY id DESC LIMIT 50").fetchall()
+            return render_template("broadcasts.html", broadcasts=rows, roles=ROLES)
+        except Exception as e:
+            logger.error("Broadcasts error: %s", e)
+            flash(f"Помилка: {e}", "danger")
+            return render_template("broadcasts.html", broadcasts=[], roles=ROLES)
+        finally:
+            conn.close()
+
+    @app.post("/broadcasts/create")
+    @login_required
+    def create_broadcast():
+        content       = request.form.get("content", "").strip()
+        media_type    = request.form.get("media_type", "").strip()
+        media_file_id = request.form.get("media_file_id", "").strip()
+        button_text   = request.form.get("button_text", "").strip()
+        button_url    = request.form.get("button_url", "").strip()
+
+        audience = {
+            "roles":   request.form.getlist("roles"),
+            "regions": [r.strip() for r in request.form.get("regions", "").split(",") if r.strip()],
+            "plans":   request.form.getlist("plans"),
+            "registered_after": request.form.get("registered_after", "").strip(),
+        }
+        audience = {k: v for k, v in audience.items() if v}
+
+        if not content:
+            flash("Текст розсилки обов'язковий!", "danger")
+            return redirect(url_for("broadcasts_page"))
+        if media_type and (not media_file_id or len(content) > 1024):
+            flash("Для медіа потрібні file_id/URL і підпис до 1024 символів", "danger")
+            return redirect(url_for("broadcasts_page"))
+        buttons = [{"text": button_text, "url": button_url}] if button_text and button_url else []
+
+        conn = get_conn()
+        try:
+            where, params = compile_audience(audience)
+            total = conn.execute(count_sql(where), params).fetchone()[0]
+            conn.execute("""
+                INSERT INTO broadcasts
+                (admin_user_id, content, media_type, media_file_id, buttons_json, audience_filter, status, total_users)
+                VALUES (NULL, ?, ?, ?, ?, ?, 'draft', ?)
+            """, (content, media_type or None, media_file_id or None,
+                  json.dumps(buttons, ensure_ascii=False) if buttons else None,
+                  json.dumps(audience, ensure_ascii=False), total))
+            conn.commit()
+            flash(f"✅ Розсилку створено — отримувачів: {total}", "success")
+        except ValueError as e:
+            flash(f"Некоректний фільтр аудиторії: {e}", "danger")
+        except Exception as e:
+            logger.error("Error creating broadcast: %s", e)
+            flash(f"Помилка: {e}", "danger")
+            conn.rollback()
+        finally:
+            conn.close()
+        return redirect(url_for("broadcasts_page"))
+
+    @app.post("/broadcasts/<int:bid>/start")
+    @login_required
+    def start_broadcast(bid: int):
+        """Старт або продовження після паузи — бот продовжить з last_user_id"""
+        conn = get_conn()
+        try:
+            cur = conn.execute(
+                "UPDATE broadcasts SET status='sending' WHERE id=? AND status IN ('draft', 'paused')", (bid,)
+            )
+            if cur.rowcount:
+                SyncOutbox.write_event("broadcast_started", {"broadcast_id": bid}, conn=conn)
+            conn.commit()
+            if cur.rowcount:
+                SyncOutbox.notify()
+                flash("▶️ Розсилку запущено", "success")
+            else:
+                flash("Розсилку неможливо запустити в поточному статусі", "warning")
+        except Exception as e:
+            flash(f"Помилка: {e}", "danger")
+            conn.rollback()
+        finally:
+            conn.close()
+        return redirect(url_for("broadcasts_page"))
+
+    @app.post("/broadcasts/<int:bid>/pause")
+    @login_required
+    def pause_broadcast(bid: int):
+        conn = get_conn()
+        try:
+            conn.execute("UPDATE broadcasts SET status='paused' WHERE id=? AND status='sending'", (bid,))
+            conn.commit()
+            flash("⏸ Розсилку буде зупинено за кілька секунд", "success")
+        except Exception as e:
+            flash(f"Помилка: {e}", "danger")
+            conn.rollback()
+        finally:
+            conn.close()
+        return redirect(url_for("broadcasts_page"))
+
+    @app.post("/broadcasts/<int:bid>/delete")
+    @login_required
+    def delete_broadcast(bid: int):
+        conn = get_conn()
+        try:
+            cur = conn.execute("DELETE FROM broadcasts WHERE id=? AND status != 'sending'", (bid,))
+            conn.commit()
+            if cur.rowcount:
+                flash("✅ Розсилку видалено", "success")
+            else:
+                flash("Спочатку поставте розсилку на паузу", "warning")
+        except Exception as e:
+            flash(f"Помилка: {e}", "danger")
+            conn.rollback()
+        finally:
+            conn.close()
+        return redirect(url_for("broadcasts_page"))
+
+    @app.get("/api/broadcasts")
+    @login_required
+    def api_broadcasts():
+        """Прогрес розсилок для автооновлення сторінки"""
+        conn = get_conn()
+        try:
+            rows = conn.execute("""
+                SELECT id, status, total_users, sent_count, failed_count, blocked_count
+                FROM broadcasts ORDER BY id DESC LIMIT 50
+            """).fetchall()
+            return jsonify([dict(r) for r in rows])
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            conn.close()
+
     @app.post("/sync/clear")
     @login_required
     def sync_clear():
         try:
-            FileBasedSync.write_event("__clear__", {})
-            # Очищаємо файл подій
-            import json
-            from pathlib import Path
-            events_file = Path("sync_events.json")
-            if events_file.exists():
-                events_file.write_text("[]", encoding="utf-8")
+            # Позначаємо всі поточні події обробленими (бот їх пропустить)
+            SyncOutbox.skip_pending()
             flash("✅ Список подій очищено", "success")
         except Exception as e:
             flash(f"Помилка: {e}", "danger")
@@ -707,8 +811,13 @@ def create_app() -> Flask:
                 stats["lots_count"] = conn.execute("SELECT COUNT(*) AS c FROM lots").fetchone()["c"]
         finally:
             conn.close()
-        unprocessed = FileBasedSync.read_unprocessed_events()
-        return render_template("sync.html", unprocessed_events=unprocessed, total_processed=0, stats=stats)
+        unprocessed = SyncOutbox.read_pending()
+        return render_template(
+            "sync.html",
+            unprocessed_events=unprocessed,
+            total_processed=SyncOutbox.processed_count(),
+            stats=stats,
+        )
 
     # -------- API --------
     @app.get("/api/ping")
@@ -774,36 +883,37 @@ def create_app() -> Flask:
             stats = _log_get_stats(conn)
             shipments = []
             vehicles = []
+            page = Page()
 
             if tab == "shipments" and _has_table(conn, "shipments"):
                 conditions = []
                 params = []
-                if q:
+                fts = None
+                if q and _has_table(conn, "shipments_fts"):
+                    fts = ("shipments_fts", fts_match_query(q)) if fts_match_query(q) else None
+                elif q:
                     conditions.append("(cargo_type LIKE ? OR from_region LIKE ? OR to_region LIKE ? OR comment LIKE ?)")
                     params.extend([f"%{q}%"] * 4)
                 if status_filter:
                     conditions.append("status=?")
                     params.append(status_filter)
-                where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
-                shipments = conn.execute(
-                    f"SELECT * FROM shipments{where} ORDER BY id DESC LIMIT 200",
-                    tuple(params)
-                ).fetchall()
+                page = keyset_page(conn, "*", "shipments", conditions, params, fts=fts)
+                shipments = page.rows
 
             elif tab == "vehicles" and _has_table(conn, "vehicles"):
                 conditions = []
                 params = []
-                if q:
+                fts = None
+                if q and _has_table(conn, "vehicles_fts"):
+                    fts = ("vehicles_fts", fts_match_query(q)) if fts_match_query(q) else None
+                elif q:
                     conditions.append("(base_region LIKE ? OR body_type LIKE ? OR comment LIKE ?)")
                     params.extend([f"%{q}%"] * 3)
                 if status_filter:
                     conditions.append("status=?")
                     params.append(status_filter)
-                where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
-                vehicles = conn.execute(
-                    f"SELECT * FROM vehicles{where} ORDER BY id DESC LIMIT 200",
-                    tuple(params)
-                ).fetchall()
+                page = keyset_page(conn, "*", "vehicles", conditions, params, fts=fts)
+                vehicles = page.rows
 
         finally:
             conn.close()
@@ -816,6 +926,7 @@ def create_app() -> Flask:
             stats=stats,
             shipments=shipments,
             vehicles=vehicles,
+            page=page,
         )
 
     # --- Shipment status change ---
@@ -963,17 +1074,25 @@ def create_app() -> Flask:
 
 # ============ HELPERS ============
 
+# Схема фіксується міграціями при старті (create_app → init_schema),
+# тому інтроспекцію достатньо виконати раз на процес.
+_SCHEMA_COLS: dict[str, list] = {}
+
+
 def _has_table(conn, table: str) -> bool:
-    return bool(conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)
-    ).fetchone())
+    return bool(_table_cols(conn, table))
 
 
 def _table_cols(conn, table: str) -> list:
-    try:
-        return [r["name"] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
-    except Exception:
-        return []
+    cols = _SCHEMA_COLS.get(table)
+    if cols is None:
+        try:
+            cols = [r["name"] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        except Exception:
+            return []
+        if cols:
+            _SCHEMA_COLS[table] = cols
+    return cols
 
 
 def _has_col(conn, table: str, col: str) -> bool:
@@ -4,6 +4,7 @@
 import sqlite3
 from pathlib import Path
 from config.settings import DB_PATH
+from src.database.migrate import migrate
 
 
 def get_conn() -> sqlite3.Connection:
@@ -11,65 +12,13 @@ def get_conn() -> sqlite3.Connection:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")  # безпечно для multi-process
+    # journal_mode=WAL зберігається у файлі БД — його встановлює migrate() при старті
     return conn
 
 
 def init_schema() -> None:
-    """Ініціалізація схеми БД (таблиці settings, web_admins, advertisements)"""
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            key   TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        )
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS web_admins (
-            id            INTEGER PRIMARY KEY AUTOINCREMENT,
-            username      TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            email         TEXT,
-            is_active     INTEGER DEFAULT 1,
-            last_login    TEXT,
-            created_at    TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS advertisements (
-            id             INTEGER PRIMARY KEY AUTOINCREMENT,
-            title          TEXT NOT NULL,
-            type           TEXT NOT NULL DEFAULT 'text',
-            content        TEXT NOT NULL,
-            image_url      TEXT,
-            button_text    TEXT,
-            button_url     TEXT,
-            is_active      INTEGER DEFAULT 1,
-            show_frequency INTEGER DEFAULT 3,
-            views_count    INTEGER DEFAULT 0,
-            clicks_count   INTEGER DEFAULT 0,
-            created_at     TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at     TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS advertisement_views (
-            id         INTEGER PRIMARY KEY AUTOINCREMENT,
-            ad_id      INTEGER NOT NULL,
-            user_id    INTEGER NOT NULL,
-            viewed_at  TEXT DEFAULT CURRENT_TIMESTAMP,
-            clicked    INTEGER DEFAULT 0,
-            FOREIGN KEY (ad_id) REFERENCES advertisements(id)
-        )
-    """)
-
-    conn.commit()
-    conn.close()
+    """Ініціалізація схеми БД — спільний реєстр міграцій (src/database/migrate.py)"""
+    migrate(str(DB_PATH), verbose=False)
 
 
 def get_setting(key: str, default: str = "") -> str:
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковий CSV-експорт для веб-панелі.
+
+Рядки читаються fetchmany() пачками по EXPORT_CHUNK_SIZE і одразу віддаються
+клієнту, тож пам'ять не залежить від розміру таблиці, а перший байт
+надсилається відразу. Підтримується:
+  ?columns=id,crop,price      — вибір колонок (лише наявні в таблиці)
+  ?status=&crop=&region=...   — фільтри (див. EXPORT_FILTERS)
+  ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD — діапазон по created_at
+  ?gzip=1                     — стиснення на льоту (файл .csv.gz)
+"""
+
+import csv
+import datetime
+import sqlite3
+import zlib
+from io import StringIO
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from flask import Response, stream_with_context
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Параметр запиту → колонка таблиці (рівність)
+EXPORT_FILTERS = {
+    "lots": {"status": "status", "crop": "crop", "region": "region", "type": "type"},
+    "users": {"role": "role", "region": "region", "banned": "is_banned"},
+}
+
+
+def _parse_date(value: str) -> Optional[datetime.date]:
+    try:
+        return datetime.date.fromisoformat((value or "").strip())
+    except ValueError:
+        return None
+
+
+def build_filters(table: str, args, cols: List[str]) -> Tuple[str, list]:
+    """WHERE-умова і параметри з аргументів запиту."""
+    where, params = [], []
+    for arg, col in EXPORT_FILTERS.get(table, {}).items():
+        value = (args.get(arg) or "").strip()
+        if value and col in cols:
+            where.append(f"{col} = ?")
+            params.append(value)
+
+    if "created_at" in cols:
+        date_from = _parse_date(args.get("date_from"))
+        date_to = _parse_date(args.get("date_to"))
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(date_from.isoformat())
+        if date_to:
+            where.append("created_at < ?")
+            params.append((date_to + datetime.timedelta(days=1)).isoformat())
+
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def select_columns(args, cols: List[str]) -> List[str]:
+    """Колонки з ?columns=a,b,c у порядку запиту; якщо не задано — всі."""
+    wanted = [c.strip() for c in (args.get("columns") or "").split(",") if c.strip()]
+    chosen = [c for c in wanted if c in cols]
+    return chosen or list(cols)
+
+
+def _iter_csv(conn: sqlite3.Connection, sql: str, params: list, columns: List[str]) -> Iterator[bytes]:
+    """Генерує CSV пачками; закриває з'єднання після завершення/обриву."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    try:
+        writer.writerow(columns)
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            writer.writerows(tuple(r) for r in rows)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+        tail = buf.getvalue()
+        if tail:
+            yield tail.encode("utf-8")
+    finally:
+        conn.close()
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 → gzip-заголовок
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def csv_export_response(conn: sqlite3.Connection, table: str, cols: List[str], args,
+                        filename: str) -> Response:
+    """
+    Потокова відповідь з CSV таблиці table. З'єднання conn переходить
+    у власність генератора і закривається ним.
+    """
+    columns = select_columns(args, cols)
+    where, params = build_filters(table, args, cols)
+    sql = f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY id DESC"
+
+    body = _iter_csv(conn, sql, params, columns)
+    if args.get("gzip") in ("1", "true", "yes"):
+        body = _gzip(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    else:
+        mimetype = "text/csv"
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment;filename={filename}",
+            "Content-Type": f"{mimetype}; charset=utf-8" if mimetype == "text/csv" else mimetype,
+        },
+    )
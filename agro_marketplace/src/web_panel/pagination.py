@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Keyset-пагінація списків веб-панелі.
+
+Сторінки йдуть по id DESC: «далі» (старіші) — ?before=<id останнього рядка>,
+«назад» (новіші) — ?after=<id першого рядка>. Запит завжди
+WHERE id < ? ORDER BY id DESC LIMIT n+1 по первинному ключу, тому час
+відповіді не залежить від глибини (на відміну від OFFSET).
+Розмір сторінки — ?per_page= (WEB_PAGE_SIZE за замовчуванням, не більше
+WEB_PAGE_SIZE_MAX). Загальна кількість рахується COUNT(*) і кешується в процесі
+на WEB_PAGE_COUNT_TTL секунд — це оцінка, а не точне значення.
+Повнотекстовий фільтр (fts=) без інших умов виконується як
+rowid < ? ORDER BY rowid DESC LIMIT всередині FTS5 — без матеріалізації всіх збігів.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple
+
+from flask import request, url_for
+
+PAGE_SIZE = int(os.getenv("WEB_PAGE_SIZE", "50"))
+PAGE_SIZE_MAX = int(os.getenv("WEB_PAGE_SIZE_MAX", "200"))
+COUNT_TTL = float(os.getenv("WEB_PAGE_COUNT_TTL", "60"))
+COUNT_CACHE_SIZE = 256
+
+_count_lock = threading.Lock()
+_count_cache: dict = {}  # (sql, params) -> (expires_at, total)
+
+
+@dataclass
+class Page:
+    rows: List[sqlite3.Row] = field(default_factory=list)
+    size: int = PAGE_SIZE
+    total: Optional[int] = None
+    next_url: Optional[str] = None  # старіші
+    prev_url: Optional[str] = None  # новіші
+    first_url: Optional[str] = None
+
+
+def page_size(args) -> int:
+    try:
+        size = int(args.get("per_page") or PAGE_SIZE)
+    except (TypeError, ValueError):
+        size = PAGE_SIZE
+    return max(1, min(size, PAGE_SIZE_MAX))
+
+
+def _cursor(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _page_url(**cursor) -> str:
+    args = {k: v for k, v in request.args.items() if k not in ("before", "after")}
+    args.update(cursor)
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def invalidate_counts() -> None:
+    with _count_lock:
+        _count_cache.clear()
+
+
+def estimate_total(conn: sqlite3.Connection, sql: str, params: Sequence[Any]) -> int:
+    """COUNT(*) з кешем на COUNT_TTL — однакові фільтри не перераховуються."""
+    key = (sql, tuple(params))
+    now = time.monotonic()
+    with _count_lock:
+        item = _count_cache.get(key)
+        if item and now < item[0]:
+            return item[1]
+    total = conn.execute(sql, tuple(params)).fetchone()[0]
+    with _count_lock:
+        if len(_count_cache) >= COUNT_CACHE_SIZE:
+            _count_cache.clear()
+        _count_cache[key] = (now + COUNT_TTL, total)
+    return total
+
+
+def keyset_page(conn: sqlite3.Connection, columns: str, from_sql: str,
+                where: Sequence[str] = (), params: Sequence[Any] = (),
+                args=None, id_col: str = "id", with_total: bool = True,
+                fts: Optional[Tuple[str, str]] = None) -> Page:
+    """
+    Одна сторінка SELECT {columns} FROM {from_sql} WHERE {where...} по id_col DESC.
+    Курсори беруться з args (?before= / ?after=), id рядка — з колонки "id".
+    fts=(таблиця FTS5, рядок MATCH) — додатковий повнотекстовий фільтр.
+    """
+    args = args if args is not None else request.args
+    size = page_size(args)
+    before, after = _cursor(args.get("before")), _cursor(args.get("after"))
+
+    conds, p = list(where), list(params)
+    if fts and not conds:
+        return _fts_page(conn, columns, from_sql, fts, size, before, after, id_col, with_total)
+    if fts:
+        conds.append(f"{id_col} IN (SELECT rowid FROM {fts[0]} WHERE {fts[0]} MATCH ?)")
+        p.append(fts[1])
+    base_where = (" WHERE " + " AND ".join(conds)) if conds else ""
+    base_params = list(p)
+    if after is not None:
+        conds.append(f"{id_col} > ?")
+        p.append(after)
+        order = "ASC"
+    else:
+        if before is not None:
+            conds.append(f"{id_col} < ?")
+            p.append(before)
+        order = "DESC"
+    sql = f"SELECT {columns} FROM {from_sql}"
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += f" ORDER BY {id_col} {order} LIMIT ?"
+
+    rows = conn.execute(sql, (*p, size + 1)).fetchall()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if after is not None:
+        rows.reverse()
+
+    page = Page(rows=rows, size=size)
+    if with_total:
+        page.total = estimate_total(conn, f"SELECT COUNT(*) FROM {from_sql}{base_where}", base_params)
+    return _with_links(page, rows, has_more, before, after)
+
+
+def _fts_page(conn, columns, from_sql, fts, size, before, after, id_col, with_total) -> Page:
+    table, match = fts
+    inner, p = f"SELECT rowid FROM {table} WHERE {table} MATCH ?", [match]
+    if after is not None:
+        inner += " AND rowid > ? ORDER BY rowid ASC"
+        p.append(after)
+        order = "ASC"
+    else:
+        if before is not None:
+            inner += " AND rowid < ?"
+            p.append(before)
+        inner += " ORDER BY rowid DESC"
+        order = "DESC"
+    sql = (f"SELECT {columns} FROM {from_sql} WHERE {id_col} IN ({inner} LIMIT ?) "
+           f"ORDER BY {id_col} {order}")
+    rows = conn.execute(sql, (*p, size + 1)).fetchall()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if after is not None:
+        rows.reverse()
+
+    page = Page(rows=rows, size=size)
+    if with_total:
+        page.total = estimate_total(conn, f"SELECT COUNT(*) FROM {table} WHERE {table} MATCH ?", [match])
+    return _with_links(page, rows, has_more, before, after)
+
+
+def _with_links(page: Page, rows, has_more: bool, before, after) -> Page:
+    paged = before is not None or after is not None
+    if rows:
+        older = has_more if after is None else True
+        newer = before is not None or (after is not None and has_more)
+        if older:
+            page.next_url = _page_url(before=rows[-1]["id"])
+        if newer:
+            page.prev_url = _page_url(after=rows[0]["id"])
+    if paged:
+        page.first_url = _page_url()
+    return page
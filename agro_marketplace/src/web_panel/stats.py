@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Статистика для дашборду веб-панелі.
+
+Лічильники рахуються одним агрегатним запитом на таблицю, тижнева гістограма —
+одним GROUP BY з діапазонним предикатом по created_at (використовує індекс,
+на відміну від date(created_at)=...). Ціни по культурах беруться з
+price_stats, яку підтримують тригери на lots. Результат кешується в процесі на
+DASHBOARD_STATS_TTL секунд; дії адміна, що змінюють дані, скидають кеш через
+invalidate().
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+from src.database.price_stats import CROP_TYPE_SUMMARY_SQL
+
+STATS_TTL = float(os.getenv("DASHBOARD_STATS_TTL", "30"))
+
+WEEKDAY_LABELS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
+ACTIVE_LOT_STATUSES = ("active", "open", "published")
+
+_lock = threading.Lock()
+_cache = {"expires_at": 0.0, "value": None}
+
+
+def invalidate() -> None:
+    """Скидає кеш — наступний запит дашборду перерахує статистику."""
+    with _lock:
+        _cache["expires_at"] = 0.0
+
+
+def _weekly_counts(conn: sqlite3.Connection, table: str, days: list) -> list:
+    """Кількість нових рядків по днях за останні 7 днів (UTC), один запит."""
+    rows = conn.execute(
+        f"""
+        SELECT substr(created_at, 1, 10) AS d, COUNT(*) AS c
+        FROM {table}
+        WHERE created_at >= ?
+        GROUP BY d
+        """,
+        (days[0].isoformat(),),
+    ).fetchall()
+    by_day = {r["d"]: r["c"] for r in rows}
+    return [by_day.get(d.isoformat(), 0) for d in days]
+
+
+def _price_rows(conn: sqlite3.Connection, limit: int = 12) -> list:
+    try:
+        return [dict(r) for r in conn.execute(CROP_TYPE_SUMMARY_SQL, (limit,)).fetchall()]
+    except sqlite3.OperationalError:
+        # Міграція 11 ще не застосована
+        return []
+
+
+def _compute(conn: sqlite3.Connection) -> dict:
+    placeholders = ",".join("?" * len(ACTIVE_LOT_STATUSES))
+
+    u = conn.execute(
+        "SELECT COUNT(*) AS total, COALESCE(SUM(is_banned = 1), 0) AS banned FROM users"
+    ).fetchone()
+    lt = conn.execute(
+        f"SELECT COUNT(*) AS total, COALESCE(SUM(status IN ({placeholders})), 0) AS active FROM lots",
+        ACTIVE_LOT_STATUSES,
+    ).fetchone()
+
+    today = datetime.datetime.utcnow().date()
+    days = [today - datetime.timedelta(days=i) for i in range(6, -1, -1)]
+
+    return {
+        "stats": {
+            "users": u["total"],
+            "lots": lt["total"],
+            "active_lots": lt["active"],
+            "banned": u["banned"],
+        },
+        "weekly_data": {
+            "labels": [WEEKDAY_LABELS[d.weekday()] for d in days],
+            "new_users": _weekly_counts(conn, "users", days),
+            "new_lots": _weekly_counts(conn, "lots", days),
+        },
+        "prices": _price_rows(conn),
+    }
+
+
+def dashboard_stats(conn: sqlite3.Connection) -> dict:
+    """Повертає {"stats": ..., "weekly_data": ..., "prices": ...} з кешу або перераховує."""
+    now = time.monotonic()
+    with _lock:
+        if _cache["value"] is not None and now < _cache["expires_at"]:
+            return _cache["value"]
+    value = _compute(conn)
+    with _lock:
+        _cache["value"] = value
+        _cache["expires_at"] = now + STATS_TTL
+    return value
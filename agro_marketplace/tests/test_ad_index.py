@@ -0,0 +1,81 @@
+import random
+from collections import Counter
+
+import pytest
+
+from src.bot.services.ad_index import AdIndex, AliasTable, parse_targets
+
+
+def ad(id, weight=1, frequency=3, roles=None, regions=None):
+    return {"id": id, "weight": weight, "show_frequency": frequency,
+            "target_roles": roles, "target_regions": regions}
+
+
+def shares(counter, n):
+    return {k: v / n for k, v in counter.items()}
+
+
+@pytest.mark.parametrize("weights", [[1], [1, 1], [1, 3], [5, 1, 2, 0.5], [10] * 7])
+def test_alias_table_follows_weights(weights):
+    rng = random.Random(1)
+    table = AliasTable(weights)
+    n = 40000
+    got = shares(Counter(table.sample(rng) for _ in range(n)), n)
+    total = sum(weights)
+    for i, w in enumerate(weights):
+        assert got.get(i, 0) == pytest.approx(w / total, abs=0.015)
+
+
+def test_pick_only_from_ads_with_reached_frequency():
+    index = AdIndex()
+    index.load_rows([ad(1, frequency=3), ad(2, frequency=10)])
+    assert index.threshold == 3
+    rng = random.Random(2)
+    assert index.pick(2, rng=rng) is None
+    assert {index.pick(3, rng=rng).id for _ in range(200)} == {1}
+    n = 20000
+    got = shares(Counter(index.pick(10, rng=rng).id for _ in range(n)), n)
+    assert got[1] == pytest.approx(0.5, abs=0.02)
+    assert got[2] == pytest.approx(0.5, abs=0.02)
+
+
+def test_pick_weights_hold_within_eligible_set():
+    index = AdIndex()
+    index.load_rows([ad(1, weight=1), ad(2, weight=3), ad(3, weight=100, frequency=50)])
+    rng = random.Random(3)
+    n = 20000
+    got = shares(Counter(index.pick(5, rng=rng).id for _ in range(n)), n)
+    assert set(got) == {1, 2}
+    assert got[2] == pytest.approx(0.75, abs=0.02)
+
+
+def test_pick_targeting():
+    index = AdIndex()
+    index.load_rows([
+        ad(1),
+        ad(2, roles="farmer, buyer"),
+        ad(3, regions="Київська"),
+        ad(4, roles="logistic", regions="Одеська"),
+    ])
+    rng = random.Random(4)
+
+    def seen(role, region):
+        return {index.pick(3, role, region, rng=rng).id for _ in range(400)}
+
+    assert seen("farmer", "Київська") == {1, 2, 3}
+    assert seen("logistic", "Одеська") == {1, 4}
+    assert seen(None, None) == {1}
+
+
+def test_no_eligible_ads():
+    index = AdIndex()
+    index.load_rows([ad(1, roles="buyer"), ad(2, weight=0)])
+    assert index.pick(100, "farmer", None) is None
+    index.load_rows([])
+    assert index.threshold is None
+    assert index.pick(100) is None
+
+
+def test_parse_targets():
+    assert parse_targets(" farmer, ,buyer ") == frozenset({"farmer", "buyer"})
+    assert parse_targets(None) == frozenset()
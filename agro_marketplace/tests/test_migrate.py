@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+import src.database.migrate as M
+
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT type, name, tbl_name, sql FROM sqlite_master ORDER BY type, name"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def _migrate_to(monkeypatch, path, version):
+    steps = [m for m in M.MIGRATIONS if m.version <= version]
+    with monkeypatch.context() as mp:
+        mp.setattr(M, "MIGRATIONS", steps)
+        mp.setattr(M, "LATEST_VERSION", version)
+        M.migrate(str(path), verbose=False)
+
+
+@pytest.mark.parametrize("old_version", [1, 8, 9, 11, 12, 15, 18])
+def test_upgraded_schema_matches_fresh(tmp_path, monkeypatch, old_version):
+    fresh = tmp_path / "fresh.db"
+    old = tmp_path / "old.db"
+    M.migrate(str(fresh), verbose=False)
+
+    _migrate_to(monkeypatch, old, old_version)
+    conn = sqlite3.connect(old)
+    conn.execute("INSERT INTO users (telegram_id) VALUES (1), (2)")
+    conn.execute("INSERT INTO lots (owner_user_id, type, crop, region, price, status) "
+                 "VALUES (1, 'sell', 'Пшениця', 'Київська', '5 200 грн', 'active'), "
+                 "(2, 'buy', 'Пшениця', 'Київська', 5000, 'active')")
+    conn.commit()
+    conn.close()
+    assert M.migrate(str(old), verbose=False) == M.LATEST_VERSION
+
+    assert _schema(old) == _schema(fresh)
+
+
+def test_checksum_covers_helpers(tmp_path, monkeypatch):
+    path = tmp_path / "db.sqlite"
+    M.migrate(str(path), verbose=False)
+    # Крок 9 не змінюється, змінюється лише хелпер, який він викликає
+    pairs_sql = M._lot_match_pairs_sql
+    monkeypatch.setattr(M, "_lot_match_pairs_sql",
+                        lambda a, price=None: pairs_sql(a, price).replace("LIMIT 50", "LIMIT 40"))
+    with pytest.raises(M.MigrationChecksumError, match="9 \\(lot_matches\\)"):
+        M.migrate(str(path), verbose=False)
+
+
+def test_legacy_source_checksums_are_upgraded(tmp_path):
+    path = tmp_path / "db.sqlite"
+    M.migrate(str(path), verbose=False)
+    conn = sqlite3.connect(path)
+    for m in M.MIGRATIONS:
+        conn.execute("UPDATE schema_version SET checksum = ? WHERE version = ?", (m.source_checksum, m.version))
+    conn.commit()
+    conn.close()
+
+    M.migrate(str(path), verbose=False)
+
+    expected = M.rendered_checksums(M.MIGRATIONS)
+    conn = sqlite3.connect(path)
+    stored = dict(conn.execute("SELECT version, checksum FROM schema_version").fetchall())
+    conn.close()
+    assert stored == expected
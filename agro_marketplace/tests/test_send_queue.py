@@ -0,0 +1,35 @@
+import asyncio
+
+from aiogram.exceptions import TelegramNetworkError
+
+from src.bot.services.send_queue import SendQueue
+
+
+class FlakyBot:
+    """Перша відправка «A» падає з мережевою помилкою, решта проходить."""
+
+    def __init__(self):
+        self.delivered = []
+        self.failed = False
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if text == "A" and not self.failed:
+            self.failed = True
+            raise TelegramNetworkError(method=None, message="connection reset")
+        self.delivered.append(text)
+
+
+def test_retry_keeps_order_within_chat():
+    async def scenario():
+        queue = SendQueue(global_rate=100, per_chat_rate=100, per_chat_burst=10)
+        bot = FlakyBot()
+        await queue.start(bot)
+        for text in ("A", "B", "C"):
+            queue.send_message(42, text)
+        await asyncio.wait_for(queue._idle.wait(), 10)
+        await queue.stop()
+        return bot.delivered, queue.stats()
+
+    delivered, stats = asyncio.run(scenario())
+    assert delivered == ["A", "B", "C"]
+    assert stats["retried"] == 1 and stats["failed"] == 0
@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+from src.bot.services.standing_queries import ALERT, SEARCH, IntervalTree, StandingQueryIndex
+
+
+def alert(id, threshold, condition, crop="Пшениця", region=None):
+    return {"id": id, "user_id": 100 + id, "crop": crop, "region": region,
+            "price_threshold": threshold, "condition": condition, "last_triggered": None}
+
+
+def search(id, lot_type="sell", crop="Пшениця", region=None, price_min=None, price_max=None,
+           negotiable=0, moisture_max=None, trash_max=None):
+    return {"id": id, "user_id": 100 + id, "lot_type": lot_type, "crop": crop, "region": region,
+            "price_min": price_min, "price_max": price_max, "negotiable": negotiable,
+            "moisture_max": moisture_max, "trash_max": trash_max, "last_triggered": None}
+
+
+def lot(price, type="sell", crop="Пшениця", region="Київська", moisture=None, trash=None):
+    return {"type": type, "crop": crop, "region": region, "price": price,
+            "quality_moisture": moisture, "quality_trash": trash}
+
+
+def hits(index, lot_):
+    return sorted((s.kind, s.id) for s in index.match(lot_))
+
+
+def test_below_alert_fires_at_or_under_threshold():
+    index = StandingQueryIndex()
+    index.add_alert(alert(1, 5000, "below"))
+    index.add_alert(alert(2, 5000, "below", region="Київська"))
+    index.add_alert(alert(3, 5000, "below", region="Одеська"))
+    assert hits(index, lot(4999)) == [(ALERT, 1), (ALERT, 2)]
+    assert hits(index, lot(5000)) == [(ALERT, 1), (ALERT, 2)]
+    assert hits(index, lot(5001)) == []
+    # «нижче» стежить за пропозиціями продажу
+    assert hits(index, lot(4000, type="buy")) == []
+
+
+def test_above_alert_fires_at_or_over_threshold():
+    index = StandingQueryIndex()
+    index.add_alert(alert(1, 5000, "above"))
+    index.add_alert(alert(2, 6000, "above"))
+    assert hits(index, lot(4999, type="buy")) == []
+    assert hits(index, lot(5000, type="buy")) == [(ALERT, 1)]
+    assert hits(index, lot(6500, type="buy")) == [(ALERT, 1), (ALERT, 2)]
+    assert hits(index, lot(6500, type="sell")) == []
+
+
+def test_alerts_ignore_negotiable_lots():
+    index = StandingQueryIndex()
+    index.add_alert(alert(1, 5000, "below"))
+    assert hits(index, lot(None)) == []
+
+
+def test_search_range_includes_min_and_excludes_max():
+    index = StandingQueryIndex()
+    index.add_search(search(1, price_min=4000, price_max=5000))
+    index.add_search(search(2, price_min=4000))
+    index.add_search(search(3, price_max=5000))
+    assert hits(index, lot(3999)) == [(SEARCH, 3)]
+    assert hits(index, lot(4000)) == [(SEARCH, 1), (SEARCH, 2), (SEARCH, 3)]
+    assert hits(index, lot(4999.5)) == [(SEARCH, 1), (SEARCH, 2), (SEARCH, 3)]
+    assert hits(index, lot(5000)) == [(SEARCH, 2)]
+
+
+def test_search_any_price_and_negotiable():
+    index = StandingQueryIndex()
+    index.add_search(search(1))                              # будь-яка ціна
+    index.add_search(search(2, negotiable=1))                # лише договірна
+    index.add_search(search(3, price_min=1000))
+    index.add_search(search(4, crop=None, region="Київська"))
+    assert hits(index, lot(None)) == [(SEARCH, 1), (SEARCH, 2), (SEARCH, 4)]
+    assert hits(index, lot(1500)) == [(SEARCH, 1), (SEARCH, 3), (SEARCH, 4)]
+    assert hits(index, lot(1500, region="Одеська")) == [(SEARCH, 1), (SEARCH, 3)]
+    assert hits(index, lot(1500, type="buy")) == []
+
+
+def test_search_quality_limits():
+    index = StandingQueryIndex()
+    index.add_search(search(1, moisture_max=14))
+    index.add_search(search(2, trash_max=2))
+    index.add_search(search(3))
+    assert hits(index, lot(5000, moisture=14, trash=1)) == [(SEARCH, 1), (SEARCH, 2), (SEARCH, 3)]
+    assert hits(index, lot(5000, moisture=14.5, trash=3)) == [(SEARCH, 3)]
+    # Показник не вказано — умову не виконано
+    assert hits(index, lot(5000)) == [(SEARCH, 3)]
+
+
+def test_removed_and_added_subscriptions():
+    index = StandingQueryIndex()
+    index.add_search(search(1, price_min=4000, price_max=5000))
+    assert hits(index, lot(4500)) == [(SEARCH, 1)]
+    index.remove(SEARCH, 1)
+    index.add_search(search(2, price_min=4400, price_max=4600))
+    assert hits(index, lot(4500)) == [(SEARCH, 2)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interval_tree_matches_brute_force(seed):
+    rng = random.Random(seed)
+    inf = float("inf")
+    intervals = []
+    for i in range(300):
+        low = rng.choice([-inf, rng.randrange(0, 100)])
+        high = rng.choice([inf, (low if low != -inf else 0) + rng.randrange(1, 40)])
+        intervals.append((low, high, i))
+    tree = IntervalTree(intervals)
+    for x in [rng.uniform(-10, 150) for _ in range(200)] + list(range(0, 141)):
+        expected = sorted(i for low, high, i in intervals if low <= x < high)
+        assert sorted(tree.stab(x)) == expected